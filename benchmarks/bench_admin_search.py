@@ -0,0 +1,107 @@
+"""Time the admin search (first page) against the old ``ILIKE`` full scan.
+
+Seeds a temporary SQLite file with bulk ``INSERT`` statements (the FTS
+triggers fire for every row), then times a few typical queries.  Usage::
+
+    python -m benchmarks.bench_admin_search --licenses 1000000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import String, cast, insert, or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.user import User
+from server.services import admin_service
+
+CHUNK = 20_000
+
+
+async def seed(engine, count: int) -> list:
+    sample = []
+    async with engine.begin() as conn:
+        for start in range(0, count, CHUNK):
+            ids = range(start + 1, min(start + CHUNK, count) + 1)
+            keys = [str(uuid.uuid4()) for _ in ids]
+            await conn.execute(
+                insert(User), [{"id": i, "telegram_id": 100_000_000 + i} for i in ids]
+            )
+            await conn.execute(
+                insert(License),
+                [
+                    {"id": i, "user_id": i, "license_key": key, "is_active": i % 3 != 0}
+                    for i, key in zip(ids, keys)
+                ],
+            )
+            sample.append((keys[0], 100_000_000 + ids[0]))
+    return sample
+
+
+async def timed(session_factory, query, rounds: int) -> float:
+    samples = []
+    async with session_factory() as db:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            (await db.execute(query)).all()
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def run(count: int, rounds: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        started = time.perf_counter()
+        sample = await seed(engine, count)
+        print(f"seeded {count} licenses in {time.perf_counter() - started:.1f} s")
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        key, telegram_id = sample[len(sample) // 2]
+        queries = {
+            "full key": key,
+            "key fragment": key[9:18],
+            "telegram id": str(telegram_id),
+            "short fragment": key[:3],  # тысячи совпадений, худший случай для индекса
+        }
+        for label, q in queries.items():
+            page = admin_service.order_licenses(admin_service.license_list_query(q=q)).limit(
+                admin_service.ADMIN_PAGE_SIZE
+            )
+            old = (
+                select(License, User)
+                .join(User)
+                .filter(
+                    or_(
+                        License.license_key.ilike(f"%{q}%"),
+                        cast(User.telegram_id, String).ilike(f"%{q}%"),
+                    )
+                )
+                .order_by(License.id)
+                .limit(admin_service.ADMIN_PAGE_SIZE)
+            )
+            new_ms = await timed(session_factory, page, rounds)
+            old_ms = await timed(session_factory, old, rounds)
+            print(f"{label:14}: indexed {new_ms:8.2f} ms | ILIKE scan {old_ms:8.2f} ms")
+
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--licenses", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.licenses, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
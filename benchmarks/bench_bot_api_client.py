@@ -0,0 +1,102 @@
+"""Bot → API call latency: a new ``httpx.AsyncClient`` per press vs. the shared client.
+
+Sends ``--requests`` ``create_payment`` calls from ``--concurrency`` tasks,
+first the way ``subscribe_license`` used to (client created and closed per
+call), then through one :class:`telegram_bot.api_client.ApiClient`.  By
+default the target is a stub endpoint served by uvicorn in this process; pass
+``--url`` to measure against a deployed API (with TLS the handshake saved per
+call is much larger).  Usage::
+
+    python -m benchmarks.bench_bot_api_client --requests 2000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import socket
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from telegram_bot.api_client import ApiClient
+
+stub = FastAPI()
+
+
+@stub.post("/api/create_payment")
+async def create_payment():
+    return {"confirmation_url": "https://yookassa.example/confirm"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(mode: str, url: str, requests: int, concurrency: int) -> tuple:
+    shared = ApiClient(url) if mode == "shared" else None
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def press(n: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            if shared is not None:
+                response = await shared.create_payment(n)
+            else:
+                async with httpx.AsyncClient(timeout=15.0) as client:
+                    response = await client.post(
+                        f"{url}/api/create_payment", json={"telegram_id": n}
+                    )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(press(n) for n in range(requests)))
+    elapsed = time.perf_counter() - started
+    if shared is not None:
+        await shared.aclose()
+
+    latencies.sort()
+    return (
+        requests / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.95)] * 1000,
+    )
+
+
+async def bench(args) -> None:
+    server = None
+    url = args.url
+    if not url:
+        port = free_port()
+        server = uvicorn.Server(
+            uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning")
+        )
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        url = f"http://127.0.0.1:{port}"
+
+    for mode in ("per-call", "shared"):
+        rate, p50, p95 = await run(mode, url, args.requests, args.concurrency)
+        print(f"{mode:9}: {rate:7.0f} calls/s  p50={p50:6.1f} ms  p95={p95:6.1f} ms")
+
+    if server is not None:
+        server.should_exit = True
+        await serving
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--url", default="")
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare N single ``GET /api/check_license`` calls with one ``POST /api/check_licenses``.
+
+Runs against a temporary SQLite file with the status cache disabled, so both
+variants hit the database.  Usage::
+
+    python -m benchmarks.bench_check_licenses --licenses 200 --rounds 5
+"""
+
+import argparse
+import asyncio
+import datetime
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.user import User
+import server.api.license_router as license_router
+from server.services.license_cache import license_status_cache
+
+
+async def seed(session_factory, count: int) -> list:
+    keys = [f"bench-{i:06d}" for i in range(count)]
+    until = datetime.datetime.utcnow() + datetime.timedelta(days=30)
+    async with session_factory() as db:
+        for i, key in enumerate(keys):
+            user = User(telegram_id=10_000 + i)
+            db.add_all(
+                [user, License(license_key=key, user=user, is_active=True, next_charge_at=until)]
+            )
+        await db.commit()
+    return keys
+
+
+async def run(count: int, rounds: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        keys = await seed(session_factory, count)
+
+        license_router.SessionLocal = session_factory
+        license_status_cache.ttl = 0  # меряем базу, а не кэш
+
+        app = FastAPI()
+        app.include_router(license_router.router, prefix="/api")
+        transport = httpx.ASGITransport(app=app)
+
+        singles, batches = [], []
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(rounds):
+                started = time.perf_counter()
+                await asyncio.gather(
+                    *(client.get("/api/check_license", params={"license_key": k}) for k in keys)
+                )
+                singles.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                response = await client.post("/api/check_licenses", json={"license_keys": keys})
+                batches.append(time.perf_counter() - started)
+                assert len(response.json()["results"]) == count
+
+        await engine.dispose()
+
+    single_ms = statistics.median(singles) * 1000
+    batch_ms = statistics.median(batches) * 1000
+    print(f"{count} x GET /api/check_license : {single_ms:8.1f} ms (median of {rounds})")
+    print(f"1 x POST /api/check_licenses   : {batch_ms:8.1f} ms (median of {rounds})")
+    print(f"speedup                        : {single_ms / batch_ms:8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--licenses", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.licenses, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Mixed reads and writes from two processes against one SQLite file, per profile.
+
+Each process plays one side of the deployment (API and bot): a pool of
+asyncio tasks that mostly look up licenses, sometimes write (an outbox row
+plus a license update, in one transaction) and occasionally stream the whole
+license table the way the admin export does.  The run is repeated for the
+``default`` and ``production`` profiles of :func:`server.db.session.build_engine`.
+Usage::
+
+    python -m benchmarks.bench_sqlite_profile --seconds 10 --tasks 8 --write-ratio 0.2
+"""
+
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server.db.base_class import Base
+from server.db.session import build_engine
+from server.models.license import License
+from server.models.outbox import TelegramOutbox
+from server.models.user import User
+
+LICENSES = 20000
+
+
+async def seed(url: str) -> None:
+    engine = build_engine(url, profile="default")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    until = datetime.datetime.utcnow() + datetime.timedelta(days=30)
+    async with session_factory() as db:
+        for i in range(LICENSES):
+            user = User(telegram_id=10_000 + i)
+            db.add_all([user, License(license_key=f"k{i}", user=user, is_active=True, next_charge_at=until)])
+        await db.commit()
+    await engine.dispose()
+
+
+async def worker_process(
+    url: str, profile: str, seconds: float, tasks: int, write_ratio: float, scan_ratio: float
+):
+    engine = build_engine(url, profile=profile)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    stats = {"reads": 0, "writes": 0, "scans": 0, "locked": 0, "read": [], "write": []}
+    deadline = time.perf_counter() + seconds
+
+    async def loop():
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            key = f"k{rng.randrange(LICENSES)}"
+            roll = rng.random()
+            kind = "write" if roll < write_ratio else "read"
+            started = time.perf_counter()
+            try:
+                async with session_factory() as db:
+                    if roll >= 1 - scan_ratio:
+                        # Как потоковая выгрузка: курсор открыт, пока строки уходят клиенту
+                        result = await db.stream(
+                            select(License.license_key).execution_options(yield_per=500)
+                        )
+                        async for _ in result.partitions():
+                            await asyncio.sleep(0.001)
+                        stats["scans"] += 1
+                        continue
+                    if kind == "write":
+                        db.add(TelegramOutbox(chat_id=1, text="bench"))
+                        await db.execute(
+                            update(License)
+                            .where(License.license_key == key)
+                            .values(valid_until=datetime.datetime.utcnow())
+                        )
+                        await db.commit()
+                        stats["writes"] += 1
+                    else:
+                        await db.execute(
+                            select(License, User.telegram_id)
+                            .join(User)
+                            .where(License.license_key == key)
+                        )
+                        stats["reads"] += 1
+            except OperationalError as exc:
+                if "locked" not in str(exc):
+                    raise
+                stats["locked"] += 1
+            stats[kind].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(loop() for _ in range(tasks)))
+    await engine.dispose()
+    return stats
+
+
+def _run_worker(args, queue) -> None:
+    queue.put(asyncio.run(worker_process(*args)))
+
+
+def _percentile(samples, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 if samples else 0.0
+
+
+def run_profile(
+    profile: str, seconds: float, tasks: int, write_ratio: float, scan_ratio: float
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        asyncio.run(seed(url))
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        procs = [
+            ctx.Process(
+                target=_run_worker,
+                args=((url, profile, seconds, tasks, write_ratio, scan_ratio), queue),
+            )
+            for _ in range(2)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    totals = {key: sum(r[key] for r in results) for key in ("reads", "writes", "scans", "locked")}
+    for kind in ("read", "write"):
+        samples = [x for r in results for x in r[kind]]
+        totals[f"{kind}_p50"] = _percentile(samples, 0.5)
+        totals[f"{kind}_p99"] = _percentile(samples, 0.99)
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--scan-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    for profile in ("default", "production"):
+        r = run_profile(profile, args.seconds, args.tasks, args.write_ratio, args.scan_ratio)
+        print(
+            f"{profile:10}: reads={r['reads'] / args.seconds:6.0f}/s "
+            f"writes={r['writes'] / args.seconds:5.0f}/s scans={r['scans']} "
+            f"locked={r['locked']} | read p50/p99 {r['read_p50']:.1f}/{r['read_p99']:.1f} ms "
+            f"| write p50/p99 {r['write_p50']:.1f}/{r['write_p99']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Update-to-reply latency of the bot behind ``/telegram/webhook``, without Telegram.
+
+Replays the recorded updates in ``benchmarks/telegram_updates.json``
+(``/start``, then menu buttons) for ``--users`` distinct users against the
+FastAPI webhook route.  The bot runs its real handlers on a temporary SQLite
+database; Bot API calls are answered locally by
+:class:`telegram_bot.harness.RecordingRequest`.  Reported per update: how
+long the route took to accept it, and how long until the bot's first call
+back to the user.  Each Bot API call is delayed by ``--api-latency-ms`` to
+stand in for the round trip to Telegram.  The run is repeated with updates
+handled one at a time and with ``--concurrent-updates`` workers.  Usage::
+
+    python -m benchmarks.bench_telegram_webhook --users 50 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+
+UPDATES = Path(__file__).with_name("telegram_updates.json")
+SECRET = "bench-secret"
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return tuple(
+        samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 for p in (0.5, 0.95, 0.99)
+    )
+
+
+async def run(mode: str, users: int, concurrency: int, workers: int, latency: float, offset: int):
+    from fastapi import FastAPI
+    from telegram.ext import ApplicationBuilder
+
+    from telegram_bot import webhook
+    from telegram_bot.bot import TOKEN, build_application
+    from telegram_bot.harness import RecordingRequest, for_user, replay
+
+    recorder = RecordingRequest(latency=latency)
+    application = build_application(
+        ApplicationBuilder()
+        .token(TOKEN)
+        .request(recorder)
+        .get_updates_request(recorder)
+        .updater(None),
+        concurrent_updates=workers,
+    )
+    webhook.telegram_webhook.secret = SECRET
+    await webhook.telegram_webhook.start(application)
+
+    app = FastAPI()
+    app.include_router(webhook.router)
+    recorded = json.loads(UPDATES.read_text(encoding="utf-8"))
+    updates = [
+        for_user(update, offset + user, offset + user * len(recorded) + n)
+        for user in range(users)
+        for n, update in enumerate(recorded)
+    ]
+    try:
+        # Последовательный режим копит очередь: ответа можно ждать долго
+        timings = await replay(
+            app, recorder, updates, SECRET, concurrency=concurrency, reply_timeout=600
+        )
+    finally:
+        await webhook.telegram_webhook.stop()
+
+    accept = _percentiles([a for a, _ in timings])
+    reply = _percentiles([r for _, r in timings])
+    print(f"{mode} ({len(timings)} updates, {len(recorder.calls)} bot API calls)")
+    print("  accept : p50={:6.1f} ms  p95={:6.1f} ms  p99={:6.1f} ms".format(*accept))
+    print("  reply  : p50={:6.1f} ms  p95={:6.1f} ms  p99={:6.1f} ms".format(*reply))
+
+
+async def bench(args) -> None:
+    from server.db.base import Base
+    from server.db.session import engine
+    from server.db.write_coalescer import write_coalescer
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    latency = args.api_latency_ms / 1000
+    try:
+        await run("sequential", args.users, args.concurrency, 1, latency, 100_000)
+        await run(
+            f"concurrent x{args.concurrent_updates}",
+            args.users,
+            args.concurrency,
+            args.concurrent_updates,
+            latency,
+            1_000_000,
+        )
+    finally:
+        await write_coalescer.stop()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--api-latency-ms", type=float, default=50)
+    parser.add_argument("--concurrent-updates", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # База задаётся до импорта server.db.session
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
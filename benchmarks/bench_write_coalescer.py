@@ -0,0 +1,97 @@
+"""Burst of webhook writes: one commit per request vs. the group commit.
+
+Stores ``--requests`` YooKassa ``payment.succeeded`` events from
+``--concurrency`` concurrent tasks into a temporary SQLite file (production
+profile, WAL), first with a session and commit per request as before, then
+through :class:`server.db.write_coalescer.WriteCoalescer`.  Usage::
+
+    python -m benchmarks.bench_write_coalescer --requests 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server.db.base_class import Base
+from server.db.session import build_engine
+from server.db.write_coalescer import WriteCoalescer
+from server.services import payment_service
+
+
+def event(n: int) -> dict:
+    return {
+        "event": "payment.succeeded",
+        "object": {
+            "id": f"bench-{n}",
+            "status": "succeeded",
+            "amount": {"value": "49.00", "currency": "RUB"},
+        },
+    }
+
+
+async def run(mode: str, requests: int, concurrency: int, window_ms: float) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        coalescer = WriteCoalescer(session_factory, window=window_ms / 1000)
+        latencies = []
+        numbers = iter(range(requests))
+
+        async def direct(n):
+            async with session_factory() as db:
+                await payment_service.record_webhook_event(db, event(n), 10_000 + n)
+                await db.commit()
+
+        async def coalesced(n):
+            await coalescer.submit(
+                lambda db: payment_service.record_webhook_event(db, event(n), 10_000 + n)
+            )
+
+        write = direct if mode == "per-request" else coalesced
+
+        async def client():
+            for n in numbers:
+                started = time.perf_counter()
+                await write(n)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await coalescer.stop()
+        await engine.dispose()
+
+    latencies.sort()
+    return (
+        requests / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000,
+        coalescer.commits or requests,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--window-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    for mode in ("per-request", "coalesced"):
+        rate, p50, p99, commits = asyncio.run(
+            run(mode, args.requests, args.concurrency, args.window_ms)
+        )
+        print(
+            f"{mode:12}: {rate:7.0f} writes/s  commits={commits:5d}  "
+            f"p50={p50:6.1f} ms  p99={p99:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
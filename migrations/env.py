@@ -1,3 +1,4 @@
+import asyncio
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -6,6 +7,8 @@ from server.db.base import Base
 from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -22,8 +25,14 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from server.db.base import Base
+from server.db.search import include_object
+from server.db.session import normalize_url
 target_metadata = Base.metadata
 
+# DATABASE_URL приложения важнее sqlalchemy.url из alembic.ini (например, Postgres на проде)
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", normalize_url(os.environ["DATABASE_URL"]))
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -47,6 +56,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -55,6 +65,31 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Run migrations through an async driver (asyncpg, aiosqlite)."""
+    connectable = async_engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode.
 
@@ -62,6 +97,10 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    if make_url(config.get_main_option("sqlalchemy.url")).get_dialect().is_async:
+        asyncio.run(run_async_migrations())
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -69,12 +108,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        do_run_migrations(connection)
 
 
 if context.is_offline_mode():
@@ -0,0 +1,39 @@
+"""lease revocations
+
+Revision ID: 3b9c1f0a7d21
+Revises: 746f450ca045
+Create Date: 2026-10-18 10:02:11.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1f0a7d21'
+down_revision: Union[str, Sequence[str], None] = '746f450ca045'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lease_revocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('license_key', sa.String(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_lease_revocations_id'), 'lease_revocations', ['id'], unique=False)
+    op.create_index(op.f('ix_lease_revocations_license_key'), 'lease_revocations', ['license_key'], unique=False)
+    op.create_index(op.f('ix_lease_revocations_revoked_at'), 'lease_revocations', ['revoked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_lease_revocations_revoked_at'), table_name='lease_revocations')
+    op.drop_index(op.f('ix_lease_revocations_license_key'), table_name='lease_revocations')
+    op.drop_index(op.f('ix_lease_revocations_id'), table_name='lease_revocations')
+    op.drop_table('lease_revocations')
@@ -0,0 +1,28 @@
+"""licenses next_charge_at index
+
+Revision ID: 5d0b7e93a2c4
+Revises: c71e5b3a9f08
+Create Date: 2026-10-18 14:02:51.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0b7e93a2c4'
+down_revision: Union[str, Sequence[str], None] = 'c71e5b3a9f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_licenses_next_charge_at_id', 'licenses', ['next_charge_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_licenses_next_charge_at_id', table_name='licenses')
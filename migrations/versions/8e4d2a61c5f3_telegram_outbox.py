@@ -0,0 +1,46 @@
+"""telegram outbox
+
+Revision ID: 8e4d2a61c5f3
+Revises: 3b9c1f0a7d21
+Create Date: 2026-10-18 11:24:37.905112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4d2a61c5f3'
+down_revision: Union[str, Sequence[str], None] = '3b9c1f0a7d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('telegram_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('not_before', sa.DateTime(), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_telegram_outbox_chat_id'), 'telegram_outbox', ['chat_id'], unique=False)
+    op.create_index(op.f('ix_telegram_outbox_id'), 'telegram_outbox', ['id'], unique=False)
+    op.create_index('ix_telegram_outbox_status_not_before', 'telegram_outbox', ['status', 'not_before'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_telegram_outbox_status_not_before', table_name='telegram_outbox')
+    op.drop_index(op.f('ix_telegram_outbox_id'), table_name='telegram_outbox')
+    op.drop_index(op.f('ix_telegram_outbox_chat_id'), table_name='telegram_outbox')
+    op.drop_table('telegram_outbox')
@@ -0,0 +1,68 @@
+"""license search index
+
+Revision ID: a4f81c2d6e97
+Revises: 5d0b7e93a2c4
+Create Date: 2026-10-18 15:10:12.640281
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f81c2d6e97'
+down_revision: Union[str, Sequence[str], None] = '5d0b7e93a2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # FTS5 trigram-индекс существует только в SQLite (см. server/db/search.py)
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS license_search "
+        "USING fts5(license_key, telegram_id, tokenize='trigram')"
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS licenses_search_ai AFTER INSERT ON licenses BEGIN
+        INSERT INTO license_search(rowid, license_key, telegram_id)
+        SELECT new.id, new.license_key, (SELECT telegram_id FROM users WHERE id = new.user_id);
+    END"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS licenses_search_au
+        AFTER UPDATE OF license_key, user_id ON licenses BEGIN
+        DELETE FROM license_search WHERE rowid = old.id;
+        INSERT INTO license_search(rowid, license_key, telegram_id)
+        SELECT new.id, new.license_key, (SELECT telegram_id FROM users WHERE id = new.user_id);
+    END"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS licenses_search_ad AFTER DELETE ON licenses BEGIN
+        DELETE FROM license_search WHERE rowid = old.id;
+    END"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF telegram_id ON users BEGIN
+        UPDATE license_search SET telegram_id = new.telegram_id
+        WHERE rowid IN (SELECT id FROM licenses WHERE user_id = new.id);
+    END"""
+    )
+    op.execute(
+        "INSERT INTO license_search(rowid, license_key, telegram_id) "
+        "SELECT licenses.id, licenses.license_key, users.telegram_id "
+        "FROM licenses JOIN users ON users.id = licenses.user_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('licenses_search_ai', 'licenses_search_au', 'licenses_search_ad', 'users_search_au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS license_search")
@@ -0,0 +1,117 @@
+"""payment paid_at
+
+Revision ID: a7c2d94e3b15
+Revises: d5a3c7e81f26
+Create Date: 2026-10-18 23:52:19.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c2d94e3b15'
+down_revision: Union[str, Sequence[str], None] = 'd5a3c7e81f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Копия server/db/rollup.py на момент миграции
+DAY = {'sqlite': "date({})", 'postgresql': "to_char({}, 'YYYY-MM-DD')"}
+
+
+def _bump(metric, bucket, value, amount="0", when="TRUE"):
+    return (
+        "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+        f"SELECT {metric}, {bucket}, {value}, {amount} WHERE {when} "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET "
+        "value = stats_rollup.value + excluded.value, "
+        "amount = stats_rollup.amount + excluded.amount;"
+    )
+
+
+def _paid_day(row):
+    return f"coalesce({row}.paid_at, {row}.created_at)"
+
+
+def _created_day(row):
+    return f"{row}.created_at"
+
+
+def _payment(moment):
+    def contribution(row, sign, day):
+        return _bump(
+            "'payments_succeeded'", day.format(moment(row)), sign,
+            amount=f"{sign} * coalesce({row}.amount_value, 0)",
+            when=f"{row}.status = 'succeeded'",
+        )
+    return contribution
+
+
+def _install(dialect, columns, contribution):
+    day = DAY[dialect]
+    if dialect == 'sqlite':
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS payments_stats_{suffix}")
+        op.execute(
+            "CREATE TRIGGER payments_stats_ai AFTER INSERT ON payments BEGIN "
+            f"{contribution('new', '1', day)} END"
+        )
+        op.execute(
+            f"CREATE TRIGGER payments_stats_au AFTER UPDATE OF {columns} ON payments "
+            f"BEGIN {contribution('old', '-1', day)} {contribution('new', '1', day)} END"
+        )
+        op.execute(
+            "CREATE TRIGGER payments_stats_ad AFTER DELETE ON payments BEGIN "
+            f"{contribution('old', '-1', day)} END"
+        )
+    else:
+        op.execute(
+            "CREATE OR REPLACE FUNCTION payments_stats() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN {contribution('OLD', '-1', day)} END IF; "
+            f"IF TG_OP <> 'DELETE' THEN {contribution('NEW', '1', day)} END IF; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        op.execute("DROP TRIGGER IF EXISTS payments_stats ON payments")
+        op.execute(
+            f"CREATE TRIGGER payments_stats AFTER INSERT OR DELETE OR UPDATE OF {columns} "
+            "ON payments FOR EACH ROW EXECUTE FUNCTION payments_stats()"
+        )
+
+
+def _rebuild_revenue(dialect, moment):
+    op.execute("DELETE FROM stats_rollup WHERE metric = 'payments_succeeded'")
+    op.execute(
+        "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+        f"SELECT 'payments_succeeded', {DAY[dialect].format(moment('payments'))}, count(*), "
+        "coalesce(sum(amount_value), 0) FROM payments WHERE status = 'succeeded' GROUP BY 2"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('payments', sa.Column('paid_at', sa.DateTime(), nullable=True))
+
+    dialect = op.get_bind().dialect.name
+    # Точного времени оплаты у старых строк нет: ближе всего момент обработки
+    op.execute(
+        "UPDATE payments SET paid_at = coalesce(processed_at, created_at) "
+        "WHERE status = 'succeeded'"
+    )
+    if dialect not in DAY:
+        return
+    _install(dialect, 'status, amount_value, created_at, paid_at', _payment(_paid_day))
+    _rebuild_revenue(dialect, _paid_day)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect in DAY:
+        # Триггеры не должны ссылаться на удаляемую колонку
+        _install(dialect, 'status, amount_value, created_at', _payment(_created_day))
+        _rebuild_revenue(dialect, _created_day)
+    # Без batch-режима: пересоздание payments потеряло бы её триггеры
+    op.drop_column('payments', 'paid_at')
@@ -0,0 +1,51 @@
+"""render events
+
+Revision ID: b6e1d4f07a32
+Revises: f3a9d2c86b14
+Create Date: 2026-10-18 19:36:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d4f07a32'
+down_revision: Union[str, Sequence[str], None] = 'f3a9d2c86b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('render_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('license_key', sa.String(length=64), nullable=False),
+    sa.Column('scene', sa.String(length=255), nullable=True),
+    sa.Column('camera', sa.String(length=255), nullable=True),
+    sa.Column('event', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_render_events_created_at', 'render_events', ['created_at'], unique=False)
+    op.create_table('render_rollup',
+    sa.Column('period', sa.String(length=4), nullable=False),
+    sa.Column('bucket', sa.String(length=13), nullable=False),
+    sa.Column('license_key', sa.String(length=64), nullable=False),
+    sa.Column('scene', sa.String(length=255), nullable=False),
+    sa.Column('started', sa.Integer(), nullable=False),
+    sa.Column('finished', sa.Integer(), nullable=False),
+    sa.Column('render_seconds', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'bucket', 'license_key', 'scene')
+    )
+    op.create_index('ix_render_rollup_period_license_bucket', 'render_rollup', ['period', 'license_key', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_render_rollup_period_license_bucket', table_name='render_rollup')
+    op.drop_table('render_rollup')
+    op.drop_index('ix_render_events_created_at', table_name='render_events')
+    op.drop_table('render_events')
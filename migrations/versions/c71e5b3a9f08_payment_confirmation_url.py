@@ -0,0 +1,29 @@
+"""payment confirmation url
+
+Revision ID: c71e5b3a9f08
+Revises: 8e4d2a61c5f3
+Create Date: 2026-10-18 12:47:09.331584
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71e5b3a9f08'
+down_revision: Union[str, Sequence[str], None] = '8e4d2a61c5f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('payments', sa.Column('confirmation_url', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('confirmation_url')
@@ -0,0 +1,33 @@
+"""telegram media
+
+Revision ID: c84f2e19b7d5
+Revises: b6e1d4f07a32
+Create Date: 2026-10-18 20:14:53.207641
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c84f2e19b7d5'
+down_revision: Union[str, Sequence[str], None] = 'b6e1d4f07a32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('telegram_media',
+    sa.Column('key', sa.String(length=128), nullable=False),
+    sa.Column('file_id', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('telegram_media')
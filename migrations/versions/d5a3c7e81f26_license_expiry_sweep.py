@@ -0,0 +1,33 @@
+"""license expiry sweep
+
+Revision ID: d5a3c7e81f26
+Revises: c84f2e19b7d5
+Create Date: 2026-10-18 23:14:07.526381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a3c7e81f26'
+down_revision: Union[str, Sequence[str], None] = 'c84f2e19b7d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('licenses', sa.Column('reminded_for', sa.DateTime(), nullable=True))
+    op.add_column('licenses', sa.Column('reminder_days', sa.Integer(), nullable=True))
+    op.create_index('ix_licenses_is_active_next_charge_at', 'licenses', ['is_active', 'next_charge_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_licenses_is_active_next_charge_at', table_name='licenses')
+    # Без batch-режима: пересоздание licenses ломает триггеры поиска и сводок
+    op.drop_column('licenses', 'reminder_days')
+    op.drop_column('licenses', 'reminded_for')
@@ -0,0 +1,120 @@
+"""stats rollup
+
+Revision ID: e2c7a9b4f150
+Revises: a4f81c2d6e97
+Create Date: 2026-10-18 16:31:08.224719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c7a9b4f150'
+down_revision: Union[str, Sequence[str], None] = 'a4f81c2d6e97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Копия server/db/rollup.py на момент миграции
+def _bump(metric, bucket, value, amount="0", when="1"):
+    return (
+        "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+        f"SELECT {metric}, {bucket}, {value}, {amount} WHERE {when} "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET "
+        "value = value + excluded.value, amount = amount + excluded.amount;"
+    )
+
+
+def _license(row, sign):
+    status = f"CASE WHEN {row}.is_active THEN 'licenses_active' ELSE 'licenses_inactive' END"
+    return _bump(status, "''", sign) + _bump(
+        "'licenses_expiring'", f"date({row}.next_charge_at)", sign,
+        when=f"{row}.is_active AND {row}.next_charge_at IS NOT NULL",
+    )
+
+
+def _user(row, sign):
+    return (
+        _bump("'users_new'", f"date({row}.created_at)", sign, when=f"{row}.created_at IS NOT NULL")
+        + _bump("'referrals'", "''", sign, when=f"{row}.referred_by_id IS NOT NULL")
+        + _bump(
+            "'referrals_converted'", "''", sign,
+            when=f"{row}.referred_by_id IS NOT NULL AND {row}.referral_bonus_claimed",
+        )
+    )
+
+
+def _payment(row, sign):
+    return _bump(
+        "'payments_succeeded'", f"date({row}.created_at)", sign,
+        amount=f"{sign} * coalesce({row}.amount_value, 0)",
+        when=f"{row}.status = 'succeeded'",
+    )
+
+
+TRIGGERS = (
+    ("licenses", "is_active, next_charge_at", _license),
+    ("users", "created_at, referred_by_id, referral_bonus_claimed", _user),
+    ("payments", "status, amount_value, created_at", _payment),
+)
+
+REBUILD = (
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT CASE WHEN is_active THEN 'licenses_active' ELSE 'licenses_inactive' END, '', count(*), 0 "
+    "FROM licenses GROUP BY 1",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'licenses_expiring', date(next_charge_at), count(*), 0 FROM licenses "
+    "WHERE is_active AND next_charge_at IS NOT NULL GROUP BY 2",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'referrals', '', count(*), 0 FROM users WHERE referred_by_id IS NOT NULL",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'referrals_converted', '', count(*), 0 FROM users "
+    "WHERE referred_by_id IS NOT NULL AND referral_bonus_claimed",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'payments_succeeded', date(created_at), count(*), coalesce(sum(amount_value), 0) "
+    "FROM payments WHERE status = 'succeeded' GROUP BY 2",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_rollup',
+    sa.Column('metric', sa.String(length=32), nullable=False),
+    sa.Column('bucket', sa.String(length=10), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'bucket')
+    )
+    op.add_column('users', sa.Column('created_at', sa.DateTime(), nullable=True))
+
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in REBUILD:
+        op.execute(statement)
+    for table, columns, contribution in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_stats_ai AFTER INSERT ON {table} BEGIN "
+            f"{contribution('new', '1')} END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_stats_au AFTER UPDATE OF {columns} ON {table} "
+            f"BEGIN {contribution('old', '-1')} {contribution('new', '1')} END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_stats_ad AFTER DELETE ON {table} BEGIN "
+            f"{contribution('old', '-1')} END"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        for table, _, _ in TRIGGERS:
+            for suffix in ('ai', 'au', 'ad'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_{suffix}")
+    # Без batch-режима: пересоздание users сломало бы триггеры license_search
+    op.drop_column('users', 'created_at')
+    op.drop_table('stats_rollup')
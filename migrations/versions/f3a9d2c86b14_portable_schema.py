@@ -0,0 +1,147 @@
+"""portable schema
+
+Revision ID: f3a9d2c86b14
+Revises: e2c7a9b4f150
+Create Date: 2026-10-18 18:02:41.903517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c86b14'
+down_revision: Union[str, Sequence[str], None] = 'e2c7a9b4f150'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Копия server/db/rollup.py на момент миграции
+def _bump(metric, bucket, value, amount="0", when="TRUE"):
+    return (
+        "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+        f"SELECT {metric}, {bucket}, {value}, {amount} WHERE {when} "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET "
+        "value = stats_rollup.value + excluded.value, "
+        "amount = stats_rollup.amount + excluded.amount;"
+    )
+
+
+def _license(row, sign, day):
+    status = f"CASE WHEN {row}.is_active THEN 'licenses_active' ELSE 'licenses_inactive' END"
+    return _bump(status, "''", sign) + _bump(
+        "'licenses_expiring'", day.format(f"{row}.next_charge_at"), sign,
+        when=f"{row}.is_active AND {row}.next_charge_at IS NOT NULL",
+    )
+
+
+def _user(row, sign, day):
+    return (
+        _bump("'users_new'", day.format(f"{row}.created_at"), sign,
+              when=f"{row}.created_at IS NOT NULL")
+        + _bump("'referrals'", "''", sign, when=f"{row}.referred_by_id IS NOT NULL")
+        + _bump(
+            "'referrals_converted'", "''", sign,
+            when=f"{row}.referred_by_id IS NOT NULL AND {row}.referral_bonus_claimed",
+        )
+    )
+
+
+def _payment(row, sign, day):
+    return _bump(
+        "'payments_succeeded'", day.format(f"{row}.created_at"), sign,
+        amount=f"{sign} * coalesce({row}.amount_value, 0)",
+        when=f"{row}.status = 'succeeded'",
+    )
+
+
+TRIGGERS = (
+    ("licenses", "is_active, next_charge_at", _license),
+    ("users", "created_at, referred_by_id, referral_bonus_claimed", _user),
+    ("payments", "status, amount_value, created_at", _payment),
+)
+
+PG_DAY = "to_char({}, 'YYYY-MM-DD')"
+
+PG_REBUILD = (
+    "DELETE FROM stats_rollup",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT CASE WHEN is_active THEN 'licenses_active' ELSE 'licenses_inactive' END, '', count(*), 0 "
+    "FROM licenses GROUP BY 1",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'licenses_expiring', to_char(next_charge_at, 'YYYY-MM-DD'), count(*), 0 FROM licenses "
+    "WHERE is_active AND next_charge_at IS NOT NULL GROUP BY 2",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'users_new', to_char(created_at, 'YYYY-MM-DD'), count(*), 0 FROM users "
+    "WHERE created_at IS NOT NULL GROUP BY 2",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'referrals', '', count(*), 0 FROM users WHERE referred_by_id IS NOT NULL",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'referrals_converted', '', count(*), 0 FROM users "
+    "WHERE referred_by_id IS NOT NULL AND referral_bonus_claimed",
+    "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+    "SELECT 'payments_succeeded', to_char(created_at, 'YYYY-MM-DD'), count(*), "
+    "coalesce(sum(amount_value), 0) FROM payments WHERE status = 'succeeded' GROUP BY 2",
+)
+
+
+def _sqlite_payment_triggers():
+    # batch-режим пересоздаёт payments вместе с её триггерами — ставим их заново
+    day = "date({})"
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS payments_stats_ai AFTER INSERT ON payments BEGIN "
+        f"{_payment('new', '1', day)} END",
+        f"CREATE TRIGGER IF NOT EXISTS payments_stats_au "
+        f"AFTER UPDATE OF status, amount_value, created_at ON payments "
+        f"BEGIN {_payment('old', '-1', day)} {_payment('new', '1', day)} END",
+        f"CREATE TRIGGER IF NOT EXISTS payments_stats_ad AFTER DELETE ON payments BEGIN "
+        f"{_payment('old', '-1', day)} END",
+    )
+
+
+def _alter_telegram_id(dialect, type_, existing_type):
+    if dialect == 'sqlite':
+        with op.batch_alter_table('payments', schema=None) as batch_op:
+            batch_op.alter_column('telegram_id', existing_type=existing_type, type_=type_,
+                                  existing_nullable=False)
+        for statement in _sqlite_payment_triggers():
+            op.execute(statement)
+    else:
+        op.alter_column('payments', 'telegram_id', existing_type=existing_type, type_=type_,
+                        existing_nullable=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    # Telegram ID не помещаются в 32 бита
+    _alter_telegram_id(dialect, sa.BigInteger(), sa.INTEGER())
+
+    if dialect != 'postgresql':
+        return
+    for table, columns, contribution in TRIGGERS:
+        op.execute(
+            f"CREATE OR REPLACE FUNCTION {table}_stats() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN {contribution('OLD', '-1', PG_DAY)} END IF; "
+            f"IF TG_OP <> 'DELETE' THEN {contribution('NEW', '1', PG_DAY)} END IF; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stats ON {table}")
+        op.execute(
+            f"CREATE TRIGGER {table}_stats AFTER INSERT OR DELETE OR UPDATE OF {columns} "
+            f"ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_stats()"
+        )
+    for statement in PG_REBUILD:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, _, _ in TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_stats ON {table}")
+            op.execute(f"DROP FUNCTION IF EXISTS {table}_stats()")
+    _alter_telegram_id(dialect, sa.INTEGER(), sa.BigInteger())
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, HTTPException, Request, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import os
 import datetime
 import uuid
+from urllib.parse import urlencode
 
 # All datetime operations use UTC to avoid timezone-related bugs.
-from server.db.session import SessionLocal
+from server.db.session import ReadSessionLocal, SessionLocal
+from server.db.write_coalescer import write_coalescer
 from server.models.license import License
 from server.models.user import User
+from server.services import (
+    admin_service,
+    export_service,
+    lease_service,
+    license_cache,
+    render_events,
+    stats_service,
+)
 from starlette.status import HTTP_303_SEE_OTHER
-from sqlalchemy import cast, delete, func, or_, select, String
+from sqlalchemy import delete, select
 
 
 admin_router = APIRouter()
@@ -18,33 +28,29 @@ admin_router = APIRouter()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+def _page_url(path: str, **params) -> str:
+    query = urlencode({k: v for k, v in params.items() if v not in (None, "")})
+    return f"{path}?{query}" if query else path
+
+
 @admin_router.get("/admin", response_class=HTMLResponse)
 async def admin_dashboard(
-    request: Request, status: str = "", sort: str = "", q: str = ""
+    request: Request,
+    status: str = "",
+    sort: str = "",
+    q: str = "",
+    after: str = "",
+    per_page: int = 0,
+    notice: str = "",
 ):
-    async with SessionLocal() as db:
-        licenses_query = select(License, User).join(User)
-
-        if q:
-            licenses_query = licenses_query.filter(
-                or_(
-                    License.license_key.ilike(f"%{q}%"),
-                    cast(User.telegram_id, String).ilike(f"%{q}%"),
-                )
-            )
-
-        if status == "active":
-            licenses_query = licenses_query.filter(License.is_active.is_(True))
-        elif status == "inactive":
-            licenses_query = licenses_query.filter(License.is_active.is_(False))
-
-        if sort == "next_charge_at_asc":
-            licenses_query = licenses_query.order_by(License.next_charge_at.asc())
-        elif sort == "next_charge_at_desc":
-            licenses_query = licenses_query.order_by(License.next_charge_at.desc())
-
-        result = await db.execute(licenses_query)
-        rows = result.all()
+    if sort not in admin_service.LICENSE_SORTS:
+        sort = ""
+    limit = admin_service.page_size(per_page)
+    async with ReadSessionLocal() as db:
+        rows, next_cursor = await admin_service.list_licenses(
+            db, status=status, sort=sort, q=q, after=after, limit=limit
+        )
+        counts = await admin_service.get_counts(db)
 
     enriched_licenses = []
     for lic, user in rows:
@@ -57,23 +63,164 @@ async def admin_dashboard(
             }
         )
 
+    # per_page передаём дальше, только если он задан явно
+    page_params = {"status": status, "sort": sort, "q": q, "per_page": per_page or None}
     return templates.TemplateResponse(
         "index.html",
         {
             "request": request,
             "licenses": enriched_licenses,
+            "counts": counts,
             "selected_status": status,
             "selected_sort": sort,
             "q": q,
+            "notice": notice,
+            "next_url": _page_url("/admin", after=next_cursor, **page_params)
+            if next_cursor
+            else None,
+            "first_url": _page_url("/admin", **page_params) if after else None,
+            "export_urls": {
+                label: _page_url(
+                    "/admin/export/licenses", status=status, sort=sort, q=q, **params
+                )
+                for label, params in (
+                    ("CSV", {"format": "csv"}),
+                    ("NDJSON", {"format": "ndjson"}),
+                    ("CSV.gz", {"format": "csv", "gzip": 1}),
+                )
+            },
         },
     )
 
 
+@admin_router.get("/admin/stats", response_class=HTMLResponse)
+async def admin_stats(request: Request):
+    async with ReadSessionLocal() as db:
+        stats = await stats_service.get_dashboard(db)
+    return templates.TemplateResponse("stats.html", {"request": request, "stats": stats})
+
+
+@admin_router.get("/admin/renders", response_class=HTMLResponse)
+async def admin_renders(request: Request):
+    # Только готовые сводки из render_rollup, сырые события не читаем
+    async with ReadSessionLocal() as db:
+        renders = await render_events.admin_summary(db)
+    return templates.TemplateResponse("renders.html", {"request": request, "renders": renders})
+
+
+@admin_router.get("/admin/export/{entity}")
+async def export_rows(
+    entity: str,
+    format: str = "csv",
+    gzip: bool = False,
+    status: str = "",
+    sort: str = "",
+    q: str = "",
+):
+    """Выгрузка таблицы целиком в CSV/NDJSON потоком, с теми же фильтрами, что и список."""
+    if format not in export_service.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    if entity == "licenses":
+        if sort not in admin_service.LICENSE_SORTS:
+            sort = ""
+
+        def build_query(dialect_name):
+            return export_service.licenses_query(status, sort, q, dialect_name)
+
+    elif entity == "users":
+
+        def build_query(dialect_name):
+            return export_service.users_query()
+
+    elif entity == "payments":
+
+        def build_query(dialect_name):
+            return export_service.payments_query(status)
+
+    else:
+        raise HTTPException(status_code=404, detail="Unknown export")
+
+    return StreamingResponse(
+        export_service.stream_rows(build_query, format, gzip, session_factory=ReadSessionLocal),
+        media_type="application/gzip" if gzip else export_service.FORMATS[format],
+        headers=export_service.export_headers(entity, format, gzip),
+    )
+
+
+BULK_ACTIONS = {
+    "extend": "Продлено лицензий",
+    "reduce": "Сокращено лицензий",
+    "delete": "Удалено лицензий",
+}
+
+
+@admin_router.post("/admin/bulk/{action}")
+async def bulk_action(
+    request: Request,
+    action: str,
+    license_keys: str = Form(""),
+    status: str = Form(""),
+    q: str = Form(""),
+    expires_within_days: str = Form(""),
+    days: int = Form(30),
+    apply_to_filter: bool = Form(False),
+    all_licenses: bool = Form(False),
+):
+    """Массовое продление/сокращение/удаление одним SQL-запросом.
+
+    Лицензии выбираются списком ключей (через пробел/перенос строки) и/или
+    теми же фильтрами, что и на главной странице.  Без ключей действие
+    применяется к фильтрам только при ``apply_to_filter=1``, а без ключей и
+    фильтров — ко всем лицензиям только при ``all_licenses=1``.
+    """
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=404, detail="Unknown bulk action")
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be positive")
+    keys = license_keys.split()
+    # Пустое поле формы приходит строкой ""
+    try:
+        within = int(expires_within_days) if expires_within_days.strip() else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="expires_within_days must be a number")
+    # Статус и поиск форма берёт из текущей вкладки — одних фильтров без явного
+    # согласия недостаточно, иначе пустой список ключей задел бы всю вкладку
+    filtered = bool(status or q.strip() or within is not None)
+    if not keys:
+        if filtered and not apply_to_filter:
+            raise HTTPException(
+                status_code=400, detail="List license keys or set apply_to_filter=1"
+            )
+        if not filtered and not all_licenses:
+            raise HTTPException(status_code=400, detail="Select licenses or set all_licenses=1")
+
+    async with SessionLocal() as db:
+        selection = admin_service.bulk_selection(
+            keys, status, q, within, db.bind.dialect.name
+        )
+        if action == "delete":
+            affected = await admin_service.bulk_delete(db, selection)
+        else:
+            shift = days if action == "extend" else -days
+            affected = await admin_service.bulk_shift_days(db, selection, shift)
+        await db.commit()
+    license_cache.invalidate(*affected)
+    admin_service.invalidate_counts()
+
+    if "application/json" in request.headers.get("accept", ""):
+        return {"action": action, "affected": len(affected)}
+    notice = f"{BULK_ACTIONS[action]}: {len(affected)}"
+    return RedirectResponse(url=_page_url("/admin", notice=notice), status_code=303)
+
+
 @admin_router.post("/admin/delete")
 async def delete_license(license_key: str = Form(...)):
     async with SessionLocal() as db:
         await db.execute(delete(License).filter_by(license_key=license_key))
+        await lease_service.revoke(db, license_key)
         await db.commit()
+    license_cache.invalidate(license_key)
+    admin_service.invalidate_counts()
 
     return RedirectResponse(url="/admin", status_code=303)
 
@@ -87,7 +234,10 @@ async def reduce_license(license_key: str = Form(...)):
         if license and license.next_charge_at:
             license.next_charge_at -= datetime.timedelta(days=30)
             license.valid_until = license.next_charge_at
+            await lease_service.revoke(db, license_key)
             await db.commit()
+    license_cache.invalidate(license_key)
+    admin_service.invalidate_counts()
 
     return RedirectResponse(url="/admin", status_code=303)
 
@@ -95,30 +245,30 @@ async def reduce_license(license_key: str = Form(...)):
 @admin_router.post("/admin/extend")
 async def extend_license(license_key: str = Form(...)):
     """Extend the validity of a license by 30 days."""
-    async with SessionLocal() as db:
+
+    async def extend(db):
         result = await db.execute(select(License).filter_by(license_key=license_key))
         license = result.scalars().first()
         if license:
-            base = (license.next_charge_at or datetime.datetime.utcnow()).replace(
-                tzinfo=datetime.timezone.utc
-            )
+            # Колонки без часового пояса: храним наивное UTC (asyncpg не примет aware)
+            base = license.next_charge_at or datetime.datetime.utcnow()
             license.next_charge_at = base + datetime.timedelta(days=30)
             license.valid_until = license.next_charge_at
             license.is_active = True
-            await db.commit()
+
+    await write_coalescer.submit(extend)
+    license_cache.invalidate(license_key)
+    admin_service.invalidate_counts()
 
     return RedirectResponse(url="/admin", status_code=303)
 
 
 @admin_router.get("/admin/users", response_class=HTMLResponse)
-async def admin_users(request: Request):
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(User, func.count(License.id).label("license_count"))
-            .outerjoin(License)
-            .group_by(User.id)
-        )
-        rows = result.all()
+async def admin_users(request: Request, after: str = "", per_page: int = 0):
+    limit = admin_service.page_size(per_page)
+    async with ReadSessionLocal() as db:
+        rows, next_cursor = await admin_service.list_users(db, after=after, limit=limit)
+        counts = await admin_service.get_counts(db)
 
     user_data = [
         {
@@ -129,8 +279,18 @@ async def admin_users(request: Request):
         for user, license_count in rows
     ]
 
+    page_params = {"per_page": per_page or None}
     return templates.TemplateResponse(
-        "users.html", {"request": request, "users": user_data}
+        "users.html",
+        {
+            "request": request,
+            "users": user_data,
+            "counts": counts,
+            "next_url": _page_url("/admin/users", after=next_cursor, **page_params)
+            if next_cursor
+            else None,
+            "first_url": _page_url("/admin/users", **page_params) if after else None,
+        },
     )
 
 
@@ -140,45 +300,55 @@ async def delete_user(user_id: int = Form(...)):
         result = await db.execute(select(User).filter_by(id=user_id))
         user = result.scalars().first()
         if user:
+            result = await db.execute(
+                select(License.license_key).filter_by(user_id=user.id)
+            )
+            license_keys = result.scalars().all()
             await db.delete(user)
+            await lease_service.revoke(db, *license_keys)
             await db.commit()
+            license_cache.invalidate(*license_keys)
+            admin_service.invalidate_counts()
 
     return RedirectResponse(url="/admin/users", status_code=HTTP_303_SEE_OTHER)
 
 
 @admin_router.post("/admin/create")
 async def create_license(telegram_id: int = Form(...), days: int = Form(...)):
-    async with SessionLocal() as db:
+    license_key = str(uuid.uuid4())
+    next_charge_at = datetime.datetime.utcnow() + datetime.timedelta(days=days)
+
+    async def create(db):
         result = await db.execute(select(User).filter_by(telegram_id=telegram_id))
         user = result.scalars().first()
         if not user:
             user = User(telegram_id=telegram_id)
             db.add(user)
-            await db.commit()
-            await db.refresh(user)
-
-        license_key = str(uuid.uuid4())
-        next_charge_at = datetime.datetime.utcnow().replace(
-            tzinfo=datetime.timezone.utc
-        ) + datetime.timedelta(days=days)
+            await db.flush()
 
         result = await db.execute(select(License).filter_by(user_id=user.id))
         existing = result.scalars().first()
         if existing:
+            old_key = existing.license_key
+            await lease_service.revoke(db, old_key)
             existing.license_key = license_key
             existing.next_charge_at = next_charge_at
             existing.valid_until = next_charge_at
             existing.is_active = True
-        else:
-            new_license = License(
+            return old_key
+        db.add(
+            License(
                 license_key=license_key,
                 next_charge_at=next_charge_at,
                 valid_until=next_charge_at,
                 is_active=True,
                 user_id=user.id,
             )
-            db.add(new_license)
+        )
+        return None
 
-        await db.commit()
+    old_key = await write_coalescer.submit(create)
+    license_cache.invalidate(old_key, license_key)
+    admin_service.invalidate_counts()
 
     return RedirectResponse(url="/admin", status_code=303)
@@ -1,12 +1,29 @@
+import os
+import time
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from server.db.session import SessionLocal
-from server.services import license_service, user_service
+from server.db.session import ReadSessionLocal, SessionLocal
+from server.services import lease_service, license_service, user_service
+from server.services.license_cache import license_status_cache
 
 router = APIRouter()
 
+# Максимальное число ключей в одном запросе /check_licenses
+LICENSE_BATCH_MAX_SIZE = int(os.getenv("LICENSE_BATCH_MAX_SIZE", "500"))
+
+
+class LicenseBatch(BaseModel):
+    license_keys: List[str]
+
+
+class LeaseToken(BaseModel):
+    lease: str
+
 
 async def get_db():
     async with SessionLocal() as db:
@@ -26,20 +43,115 @@ async def create_license(
 
 
 @router.get("/check_license")
-async def check_license(license_key: str, db: AsyncSession = Depends(get_db)):
-    license = await license_service.get_license_by_key(db, license_key)
-    if license is None:
-        return {"status": "not_found", "valid": False}
-    if not license.is_active or (
-        license.next_charge_at and license.next_charge_at <= datetime.utcnow()
-    ):
-        return {"status": "inactive", "valid": False}
-    days_left = 0
-    if license.next_charge_at:
-        days_left = (license.next_charge_at - datetime.utcnow()).days
+async def check_license(license_key: str):
+    cached = license_status_cache.get(license_key)
+    if cached is not None:
+        return cached
+
+    # Сессию открываем только на промахе кэша; чтение — с реплики, если она есть
+    async with ReadSessionLocal() as db:
+        license = await license_service.get_license_by_key(db, license_key)
+    payload = license_service.license_status(
+        license, license.user.telegram_id if license else None
+    )
+    license_status_cache.set(
+        license_key,
+        payload,
+        valid_until=license.next_charge_at if payload["valid"] else None,
+    )
+    return payload
+
+
+@router.post("/check_licenses")
+async def check_licenses(batch: LicenseBatch):
+    """Validate many license keys at once; returns ``{"results": {key: payload}}``."""
+    keys = list(dict.fromkeys(batch.license_keys))
+    if len(keys) > LICENSE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many license keys (max {LICENSE_BATCH_MAX_SIZE})",
+        )
+
+    results = {}
+    missing = []
+    for key in keys:
+        cached = license_status_cache.get(key)
+        if cached is None:
+            missing.append(key)
+        else:
+            results[key] = cached
+
+    if missing:
+        async with ReadSessionLocal() as db:
+            found = await license_service.get_licenses_by_keys(db, missing)
+        for key in missing:
+            license, telegram_id = found.get(key, (None, None))
+            payload = license_service.license_status(license, telegram_id)
+            license_status_cache.set(
+                key,
+                payload,
+                valid_until=license.next_charge_at if payload["valid"] else None,
+            )
+            results[key] = payload
+
+    return {"results": results}
+
+
+def _lease_unavailable(exc: lease_service.LeaseConfigError) -> HTTPException:
+    # Сервер не настроен — узел может повторить позже или работать по check_license
+    return HTTPException(status_code=503, detail=str(exc))
+
+
+@router.get("/license_lease")
+async def license_lease(license_key: str):
+    """Issue a signed offline lease so render nodes can skip per-frame checks."""
+    async with SessionLocal() as db:
+        license = await license_service.get_license_by_key(db, license_key)
+    telegram_id = license.user.telegram_id if license else None
+    payload = license_service.license_status(license, telegram_id)
+    if payload["valid"]:
+        try:
+            lease = lease_service.issue_lease(license_key, telegram_id, license.next_charge_at)
+        except lease_service.LeaseConfigError as exc:
+            raise _lease_unavailable(exc)
+        payload.update(lease)
+    return payload
+
+
+@router.post("/verify_lease")
+async def verify_lease(token: LeaseToken):
+    try:
+        claims = lease_service.decode_lease(token.lease)
+    except lease_service.LeaseConfigError as exc:
+        raise _lease_unavailable(exc)
+    if claims is None:
+        return {"valid": False}
+    async with SessionLocal() as db:
+        if await lease_service.is_revoked(db, claims):
+            return {"valid": False, "status": "revoked"}
     return {
-        "status": "active",
         "valid": True,
-        "user_id": license.user.telegram_id,
-        "days_left": days_left,
+        "license_key": claims["k"],
+        "user_id": claims["u"],
+        "expires_at": claims["exp"],
     }
+
+
+@router.get("/lease_revocations")
+async def lease_revocations(since: int = 0):
+    """License keys whose leases were revoked after ``since`` (unix seconds)."""
+    try:
+        if since < 0:
+            raise ValueError(since)
+        since_at = datetime.utcfromtimestamp(since)
+    except (ValueError, OverflowError, OSError):
+        raise HTTPException(status_code=400, detail="since must be a unix timestamp")
+    async with SessionLocal() as db:
+        revoked = await lease_service.get_revocations(db, since_at)
+    return {"now": int(time.time()), "revoked": revoked}
+
+
+@router.get("/check_license/cache_stats")
+async def check_license_cache_stats():
+    """Hit/miss counters of the in-process license status cache."""
+    return license_status_cache.stats()
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from telegram_bot.outbox import notification_worker
+
+router = APIRouter()
+
+
+@router.get("/notifications/metrics")
+async def notification_metrics():
+    """Depth of the Telegram outbox and send-latency statistics."""
+    return await notification_worker.metrics()
@@ -1,24 +1,18 @@
 # server/api/payment_router.py
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Request, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any
-from yookassa import Configuration, Payment
+from typing import Dict, Any, Optional
 from uuid import uuid4
 import os
+import asyncio
 import logging
+import weakref
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-from sqlalchemy import select
 
 from server.db.session import SessionLocal
-from server.models.user import User
-from server.models.license import License
-from server.services.referral_service import (
-    claim_referral_bonuses,
-    BONUS_DAYS_PER_REFERRAL,
-)
-from telegram_bot.notify import send_telegram_message
+from server.db.write_coalescer import write_coalescer
+from server.services import payment_service, yookassa_client
 
 load_dotenv()
 
@@ -29,6 +23,10 @@ PLAN_PRICE = os.getenv("PLAN_PRICE_RUB", "49.00")
 RETURN_URL = os.getenv("PAYMENT_RETURN_URL", "https://t.me/Ano3D_bot")
 
 
+# Блокировка на пользователя: параллельные нажатия не создают два платежа
+_payment_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
 # ---------- МОДЕЛИ для красивого Swagger (используются только в create_payment) ----------
 class YooKassaObject(BaseModel):
     id: str
@@ -40,21 +38,6 @@ class YooKassaWebhookModel(BaseModel):
     object: YooKassaObject
 
 
-def _configure_yookassa_or_raise():
-    shop_id = os.getenv("YOOKASSA_SHOP_ID")
-    secret_key = os.getenv("YOOKASSA_SECRET_KEY")
-    if not shop_id or not secret_key:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "YOOKASSA credentials are not configured "
-                "(set YOOKASSA_SHOP_ID and YOOKASSA_SECRET_KEY)."
-            ),
-        )
-    Configuration.account_id = shop_id
-    Configuration.secret_key = secret_key
-
-
 # ---------- СОЗДАНИЕ ПЛАТЕЖА ----------
 @router.post("/api/create_payment")
 async def create_payment(request: Request):
@@ -64,14 +47,49 @@ async def create_payment(request: Request):
     {
       "telegram_id": 123456789,
       "email": "user@example.com",  # опционально (для чека)
-      "phone": "+79991234567"       # опционально (для чека)
+      "phone": "+79991234567",      # опционально (для чека)
+      "idempotence_key": "..."      # опционально: один ключ на повторы одного запроса
     }
     """
     body = await request.json()
     telegram_id = body.get("telegram_id")
     if not telegram_id:
         raise HTTPException(status_code=400, detail="telegram_id is required")
+    idempotence_key = body.get("idempotence_key")
+    if idempotence_key is not None and not (
+        isinstance(idempotence_key, str) and 0 < len(idempotence_key) <= 64
+    ):
+        # Ограничение ЮKassa на Idempotence-Key
+        raise HTTPException(status_code=400, detail="idempotence_key must be 1-64 characters")
+    try:
+        return await create_payment_link(int(telegram_id), body)
+    except yookassa_client.YooKassaConfigError as e:
+        # Магазин не настроен — платёж не создан, можно повторить позже
+        raise HTTPException(status_code=503, detail=str(e))
+    except yookassa_client.YooKassaError as e:
+        raise HTTPException(status_code=502, detail=f"YooKassa error: {e}")
+
 
+async def create_payment_link(telegram_id: int, body: Optional[Dict[str, Any]] = None):
+    """Ссылка на оплату для пользователя; бот в одном процессе с API вызывает её напрямую.
+
+    Ошибки ЮKassa выходят как YooKassaConfigError / YooKassaError, в HTTP их переводит
+    create_payment.
+    """
+    body = body or {}
+    lock = _payment_locks.get(telegram_id)
+    if lock is None:
+        lock = _payment_locks[telegram_id] = asyncio.Lock()
+    async with lock:
+        # Пока прошлый платёж ещё ожидает оплаты — отдаём ту же ссылку
+        async with SessionLocal() as db:
+            existing = await payment_service.find_reusable_payment(db, telegram_id)
+        if existing:
+            return {"confirmation_url": existing.confirmation_url}
+        return await _create_new_payment(telegram_id, body)
+
+
+async def _create_new_payment(telegram_id: int, body: Dict[str, Any]):
     # email/phone для чека (54-ФЗ): достаточно одного из них
     customer_email = (body.get("email") or "").strip()
     customer_phone = (body.get("phone") or "").strip()
@@ -79,9 +97,10 @@ async def create_payment(request: Request):
         # Для MVP подставим заглушку, лучше спрашивать у пользователя в боте
         customer_email = "test@example.com"
 
-    _configure_yookassa_or_raise()
+    client = yookassa_client.get_client()
 
-    payment_id = str(uuid4())
+    # Ключ клиента повторяется во всех его попытках — ЮKassa вернёт тот же платёж
+    payment_id = body.get("idempotence_key") or str(uuid4())
 
     receipt_customer: Dict[str, Any] = {}
     if customer_email:
@@ -90,7 +109,7 @@ async def create_payment(request: Request):
         receipt_customer["phone"] = customer_phone
 
     try:
-        payment = Payment.create(
+        payment = await client.create_payment(
             {
                 "amount": {"value": PLAN_PRICE, "currency": "RUB"},
                 "confirmation": {"type": "redirect", "return_url": RETURN_URL},
@@ -115,111 +134,52 @@ async def create_payment(request: Request):
             },
             payment_id,
         )
-        return {"confirmation_url": payment.confirmation.confirmation_url}
+    except yookassa_client.YooKassaError:
+        logging.exception("YooKassa create payment failed")
+        raise
 
-    except Exception as e:
-        logging.exception("YooKassa Payment.create failed")
-        raise HTTPException(status_code=502, detail=f"YooKassa error: {e}")
+    try:
+        await write_coalescer.submit(
+            lambda db: payment_service.record_created_payment(db, payment, telegram_id)
+        )
+    except Exception:
+        # Ссылку всё равно отдаём — просто не сможем её переиспользовать
+        logging.exception("Не удалось сохранить созданный платёж %s", payment.get("id"))
+    return {"confirmation_url": payment["confirmation"]["confirmation_url"]}
 
 
 # ---------- ВЕБХУК ОТ ЮКАССЫ ----------
 @router.post("/api/yookassa_webhook")
-async def yookassa_webhook(payload: Dict[str, Any]):
+async def yookassa_webhook(payload: Dict[str, Any], background_tasks: BackgroundTasks):
     """
-    Принимаем СЫРОЙ payload, чтобы видеть любые события и быстро диагностировать.
-    Сразу логируем и отправляем 'пинг' пользователю (если есть metadata.telegram_id).
-    Затем при event='payment.succeeded' активируем/продлеваем лицензию.
+    Принимаем СЫРОЙ payload и сразу сохраняем событие в payments
+    (payment_id — ключ идемпотентности), после чего отвечаем 200.
+    Продление лицензии, реферальные бонусы и уведомления выполняются в фоне.
     """
     try:
         logging.info(f"[WEBHOOK RAW] {payload}")
     except Exception:
         pass
 
-    event = payload.get("event")
+    event = payload.get("event") or ""
     obj = payload.get("object", {}) or {}
     meta = obj.get("metadata", {}) or {}
     telegram_id = meta.get("telegram_id")
 
-    # Быстрый пинг — понять, что вебхук вообще дошёл
-    if telegram_id:
-        try:
-            await send_telegram_message(
-                chat_id=int(telegram_id),
-                text=f"🔔 Вебхук получен: {event}",
-            )
-        except Exception:
-            pass
-
-    # Обрабатываем только успешный платёж
-    if event != "payment.succeeded":
+    if not event.startswith("payment.") or not obj.get("id"):
         # Возвращаем 200, чтобы ЮKassa не ретраила бесконечно
         return {"status": f"ignored: {event}"}
 
     if not telegram_id:
-        raise HTTPException(status_code=400, detail="No telegram_id in metadata")
-
-    now = datetime.utcnow()
-
-    async with SessionLocal() as db:
-        # ищем пользователя
-        result = await db.execute(select(User).filter_by(telegram_id=int(telegram_id)))
-        user = result.scalars().first()
-        if not user:
-            user = User(telegram_id=int(telegram_id))
-            db.add(user)
-            await db.commit()
-            await db.refresh(user)
-
-        # ищем/создаём лицензию
-        result = await db.execute(select(License).filter_by(user_id=user.id))
-        lic = result.scalars().first()
-
-        def plus_30(from_dt: datetime) -> datetime:
-            return from_dt + timedelta(days=30)
-
-        if lic:
-            base = lic.valid_until or now
-            lic.valid_until = plus_30(max(base, now))
-            lic.is_active = True
-            lic.next_charge_at = lic.valid_until
-        else:
-            import uuid as _uuid
-            until = plus_30(now)
-            lic = License(
-                user_id=user.id,
-                license_key=str(_uuid.uuid4()),
-                is_active=True,
-                valid_until=until,
-                next_charge_at=until,
-            )
-            db.add(lic)
-
-        await db.commit()
-
-        if user.referred_by_id and not user.referral_bonus_claimed:
-            result = await db.execute(select(User).filter_by(id=user.referred_by_id))
-            referrer = result.scalars().first()
-            if referrer:
-                processed = await claim_referral_bonuses(db, referrer)
-                if processed:
-                    try:
-                        await send_telegram_message(
-                            chat_id=referrer.telegram_id,
-                            text=(
-                                "🎉 Ваш приглашённый оплатил подписку. "
-                                f"Начислено {processed * BONUS_DAYS_PER_REFERRAL} бонусных дней."
-                            ),
-                        )
-                    except Exception:
-                        pass
-
-    # Финальное уведомление
-    try:
-        await send_telegram_message(
-            chat_id=int(telegram_id),
-            text="✅ Оплата прошла успешно. Подписка активирована на 30 дней!",
-        )
-    except Exception:
-        pass
+        if event == "payment.succeeded":
+            raise HTTPException(status_code=400, detail="No telegram_id in metadata")
+        return {"status": f"ignored: {event}"}
+
+    # Всплеск вебхуков складывается в один коммит; ответ — только после фиксации
+    await write_coalescer.submit(
+        lambda db: payment_service.record_webhook_event(db, payload, int(telegram_id))
+    )
 
+    if event == "payment.succeeded":
+        background_tasks.add_task(payment_service.process_pending_payments)
     return {"status": "ok"}
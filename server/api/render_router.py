@@ -0,0 +1,261 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+
+from server.db.session import ReadSessionLocal
+from server.models.license import License
+from server.models.user import User
+from server.services.render_events import render_event_recorder
+from server.services.render_sessions import parse_render_log, render_sessions
+from telegram_bot.notify import queue_telegram_messages, send_telegram_message
+
+router = APIRouter()
+
+# Объединять события рендера в одно редактируемое сообщение на задачу
+RENDER_COALESCE = os.getenv("RENDER_COALESCE", "1") not in ("0", "false", "False")
+
+# Максимум событий в JSON-массиве /render_notify/batch
+RENDER_BATCH_MAX_SIZE = int(os.getenv("RENDER_BATCH_MAX_SIZE", "1000"))
+# NDJSON-поток обрабатывается порциями по столько строк (один запрос к БД на порцию)
+RENDER_STREAM_CHUNK_SIZE = int(os.getenv("RENDER_STREAM_CHUNK_SIZE", "500"))
+# Лимит длины текста сообщения Telegram
+TELEGRAM_TEXT_LIMIT = 4096
+
+
+# Модель для рендера
+class RenderData(BaseModel):
+    license_key: str
+    log: str
+    # Необязательные поля; если не переданы, берутся из текста лога
+    event: Optional[str] = None
+    scene: Optional[str] = None
+    camera: Optional[str] = None
+
+
+@router.post("/render_notify")
+async def handle_render_notify(data: RenderData):
+    """Получает лог рендера и отправляет его в Telegram."""
+    logging.info(">>> Получен render_notify: license_key=%s, log=%s", data.license_key, data.log)
+
+    user_chat_id = None
+    user_id = None
+
+    async with ReadSessionLocal() as db:
+        result = await db.execute(
+            select(License).filter_by(license_key=data.license_key)
+        )
+        license = result.scalars().first()
+        if license:
+            # В БД событие попадёт фоновым пакетом, запрос не ждёт записи
+            event, scene, camera = _event_fields(data)
+            render_event_recorder.record(data.license_key, event, scene, camera)
+        if not license:
+            logging.warning("License not found for key %s", data.license_key)
+        elif (
+            license.is_active
+            and license.next_charge_at
+            and license.next_charge_at > datetime.utcnow()
+        ):
+            user_id = license.user_id
+            result = await db.execute(select(User).filter_by(id=user_id))
+            user = result.scalars().first()
+            if not user:
+                logging.warning(
+                    "User %s not found for license %s",
+                    user_id,
+                    data.license_key,
+                )
+            elif not user.telegram_id:
+                logging.info(
+                    "Missing telegram_id for user %s and license %s",
+                    user.id,
+                    data.license_key,
+                )
+            else:
+                user_chat_id = user.telegram_id
+        else:
+            logging.info(
+                "Inactive license for key %s; skipping notification",
+                data.license_key,
+            )
+
+    if user_chat_id:
+        await dispatch_render_event(user_chat_id, data)
+    else:
+        logging.info(
+            "Telegram message not sent: license_key=%s user_id=%s (chat_id missing)",
+            data.license_key,
+            user_id,
+        )
+
+    return {"status": "ok"}
+
+
+@router.get("/render_sessions/metrics")
+async def render_session_metrics():
+    """Events received vs. Bot API calls made by the render-session aggregator."""
+    return render_sessions.stats()
+
+
+@router.get("/render_events/metrics")
+async def render_event_metrics():
+    """Render events buffered, written to ``render_events`` and dropped."""
+    return render_event_recorder.stats()
+
+
+def _event_fields(data: RenderData) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    event, scene, camera = parse_render_log(data.log)
+    return data.event or event, data.scene or scene, data.camera or camera
+
+
+def _fold_render_event(chat_id: int, data: RenderData) -> bool:
+    """Fold the event into its job's live message; False if it has to go out as text."""
+    event, scene, camera = _event_fields(data)
+    if RENDER_COALESCE and event and scene and camera:
+        render_sessions.record(chat_id, data.license_key, scene, camera, event)
+        return True
+    return False
+
+
+async def dispatch_render_event(chat_id: int, data: RenderData) -> None:
+    """Fold the event into its job's live message, or send the raw log as before."""
+    if not _fold_render_event(chat_id, data):
+        await send_telegram_message(chat_id=chat_id, text=data.log)
+
+
+async def resolve_render_chats(license_keys) -> Dict[str, Tuple[str, Optional[int]]]:
+    """``{license_key: (status, chat_id)}`` for all keys with a single query.
+
+    ``status`` is ``ok``, ``inactive`` or ``no_chat``; unknown keys are absent.
+    """
+    keys = list(set(license_keys))
+    if not keys:
+        return {}
+    async with ReadSessionLocal() as db:
+        result = await db.execute(
+            select(License.license_key, License.is_active, License.next_charge_at, User.telegram_id)
+            .outerjoin(User, User.id == License.user_id)
+            .where(License.license_key.in_(keys))
+        )
+        rows = result.all()
+
+    now = datetime.utcnow()
+    chats = {}
+    for key, is_active, next_charge_at, telegram_id in rows:
+        if not (is_active and next_charge_at and next_charge_at > now):
+            chats[key] = ("inactive", None)
+        elif not telegram_id:
+            chats[key] = ("no_chat", None)
+        else:
+            chats[key] = ("ok", telegram_id)
+    return chats
+
+
+def _chunk_logs(logs: List[str]) -> List[str]:
+    """Join one user's logs into as few messages as Telegram's length limit allows."""
+    messages, current = [], ""
+    for log in logs:
+        log = log[:TELEGRAM_TEXT_LIMIT]
+        if current and len(current) + 2 + len(log) > TELEGRAM_TEXT_LIMIT:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n\n{log}" if current else log
+    if current:
+        messages.append(current)
+    return messages
+
+
+async def process_render_events(items: List[Any], offset: int = 0) -> List[Dict[str, Any]]:
+    """Validate, resolve and dispatch a batch; one result per item, in order."""
+    events: List[Tuple[int, RenderData]] = []
+    results: List[Dict[str, Any]] = []
+    for index, item in enumerate(items, start=offset):
+        try:
+            events.append((index, RenderData.model_validate(item)))
+        except ValidationError as exc:
+            results.append({"index": index, "status": "invalid", "error": exc.errors()[0]["msg"]})
+
+    chats = await resolve_render_chats(data.license_key for _, data in events)
+    # Сырые логи одного пользователя уходят одним сообщением
+    raw: Dict[int, List[str]] = {}
+    for index, data in events:
+        status, chat_id = chats.get(data.license_key, ("not_found", None))
+        if status != "not_found":
+            event, scene, camera = _event_fields(data)
+            render_event_recorder.record(data.license_key, event, scene, camera)
+        if chat_id is not None:
+            if _fold_render_event(chat_id, data):
+                status = "coalesced"
+            else:
+                status = "queued"
+                raw.setdefault(chat_id, []).append(data.log)
+        results.append({"index": index, "status": status})
+
+    messages = [(chat_id, text) for chat_id, logs in raw.items() for text in _chunk_logs(logs)]
+    if messages and await queue_telegram_messages(messages) != len(messages):
+        # Очередь пишется одной транзакцией: при сбое не поставлено ничего — клиент повторит
+        for result in results:
+            if result["status"] == "queued":
+                result.update(status="error", error="notification queue unavailable")
+    results.sort(key=lambda result: result["index"])
+    return results
+
+
+async def _ndjson_items(request: Request):
+    """Parsed NDJSON lines of the request body, read as it arrives."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Невалидная строка превратится в результат "invalid" с понятной ошибкой
+        return line.decode("utf-8", "replace")
+
+
+@router.post("/render_notify/batch")
+async def handle_render_notify_batch(request: Request):
+    """Many render events at once: a JSON array or an NDJSON stream.
+
+    Returns ``{"results": [{"index": n, "status": ...}, ...]}`` in input order.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        results, chunk, offset = [], [], 0
+        async for line in _ndjson_items(request):
+            chunk.append(_parse_line(line))
+            if len(chunk) >= RENDER_STREAM_CHUNK_SIZE:
+                results += await process_render_events(chunk, offset)
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            results += await process_render_events(chunk, offset)
+        return {"results": results}
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > RENDER_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many render events (max {RENDER_BATCH_MAX_SIZE}); use NDJSON",
+        )
+    return {"results": await process_render_events(items)}
@@ -4,3 +4,9 @@ from server.db.base_class import Base
 from server.models.user import User
 from server.models.license import License
 from server.models.payment import Payment  # ← добавить
+from server.models.lease_revocation import LeaseRevocation
+from server.models.outbox import TelegramOutbox
+from server.models.stats_rollup import StatsRollup
+from server.models.render_event import RenderEvent
+from server.models.render_rollup import RenderRollup
+from server.models.telegram_media import TelegramMedia
@@ -0,0 +1,69 @@
+"""Helpers for statements whose syntax differs between database backends."""
+
+from sqlalchemy import DateTime, Integer, String, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+def insert_for(db, table):
+    """Return a dialect-specific ``INSERT`` supporting ``on_conflict_do_*``."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+class add_days(FunctionElement):
+    """``<datetime expression> + <days>`` evaluated by the database.
+
+    Used by bulk ``UPDATE`` statements so that shifting thousands of dates is
+    one statement instead of a load/modify/flush per row.
+    """
+
+    type = DateTime()
+    inherit_cache = True
+
+    def __init__(self, expr, days):
+        super().__init__(expr, literal(int(days), Integer))
+
+
+@compiles(add_days)
+def _add_days_default(element, compiler, **kw):
+    expr, days = element.clauses
+    return "(%s + make_interval(days => %s))" % (
+        compiler.process(expr, **kw),
+        compiler.process(days, **kw),
+    )
+
+
+@compiles(add_days, "sqlite")
+def _add_days_sqlite(element, compiler, **kw):
+    expr, days = element.clauses
+    value = compiler.process(expr, **kw)
+    # datetime() отбрасывает доли секунды, а %f хранит только миллисекунды —
+    # дописываем исходную дробную часть (".ffffff" в формате SQLAlchemy) как есть
+    return "(datetime(%s, (%s || ' days')) || substr(%s, 20))" % (
+        value,
+        compiler.process(days, **kw),
+        value,
+    )
+
+
+class day_bucket(FunctionElement):
+    """Calendar day of a datetime expression as ``YYYY-MM-DD`` text.
+
+    Matches the ``bucket`` written by the ``stats_rollup`` triggers.
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(day_bucket)
+def _day_bucket_default(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM-DD')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(day_bucket, "sqlite")
+def _day_bucket_sqlite(element, compiler, **kw):
+    return "date(%s)" % compiler.process(element.clauses, **kw)
@@ -0,0 +1,22 @@
+"""Recompute the ``stats_rollup`` table from licenses, users and payments.
+
+Usage::
+
+    python -m server.db.rebuild_stats
+"""
+
+import asyncio
+
+from server.db.session import SessionLocal, engine
+from server.services import stats_service
+
+
+async def main() -> None:
+    async with SessionLocal() as db:
+        rows = await stats_service.rebuild(db)
+    await engine.dispose()
+    print(f"stats_rollup пересчитана: {rows} строк")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Triggers that keep ``stats_rollup`` in step with licenses, users and payments.
+
+Every write path — ORM flushes, the bulk admin statements, webhook upserts —
+goes through these triggers, so the statistics page never has to scan the
+source tables.  Each trigger subtracts the old row's contribution and adds the
+new one with an ``INSERT ... ON CONFLICT DO UPDATE`` on ``(metric, bucket)``.
+SQLite gets plain row triggers; PostgreSQL gets one PL/pgSQL function per
+table.  On other databases run ``python -m server.db.rebuild_stats`` on a
+schedule.
+"""
+
+from sqlalchemy import event, text
+
+LICENSE_STATUS = "CASE WHEN {row}.is_active THEN 'licenses_active' ELSE 'licenses_inactive' END"
+
+# Выражение дня (YYYY-MM-DD) — то же, что даёт server.db.dialect.day_bucket
+DAY = {"sqlite": "date({})", "postgresql": "to_char({}, 'YYYY-MM-DD')"}
+
+
+def _bump(metric: str, bucket: str, value: str, amount: str = "0", when: str = "TRUE") -> str:
+    return (
+        "INSERT INTO stats_rollup(metric, bucket, value, amount) "
+        f"SELECT {metric}, {bucket}, {value}, {amount} WHERE {when} "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET "
+        "value = stats_rollup.value + excluded.value, "
+        "amount = stats_rollup.amount + excluded.amount;"
+    )
+
+
+def _license(row: str, sign: str, day: str) -> str:
+    return _bump(LICENSE_STATUS.format(row=row), "''", sign) + _bump(
+        "'licenses_expiring'",
+        day.format(f"{row}.next_charge_at"),
+        sign,
+        when=f"{row}.is_active AND {row}.next_charge_at IS NOT NULL",
+    )
+
+
+def _user(row: str, sign: str, day: str) -> str:
+    return (
+        _bump(
+            "'users_new'",
+            day.format(f"{row}.created_at"),
+            sign,
+            when=f"{row}.created_at IS NOT NULL",
+        )
+        + _bump("'referrals'", "''", sign, when=f"{row}.referred_by_id IS NOT NULL")
+        + _bump(
+            "'referrals_converted'",
+            "''",
+            sign,
+            when=f"{row}.referred_by_id IS NOT NULL AND {row}.referral_bonus_claimed",
+        )
+    )
+
+
+def _payment(row: str, sign: str, day: str) -> str:
+    # День успешной оплаты; старые строки без paid_at считаются по дню создания
+    return _bump(
+        "'payments_succeeded'",
+        day.format(f"coalesce({row}.paid_at, {row}.created_at)"),
+        sign,
+        amount=f"{sign} * coalesce({row}.amount_value, 0)",
+        when=f"{row}.status = 'succeeded'",
+    )
+
+
+def _sqlite_triggers(table: str, columns: str, contribution) -> list:
+    day = DAY["sqlite"]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_stats_ai AFTER INSERT ON {table} BEGIN "
+        f"{contribution('new', '1', day)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_stats_au AFTER UPDATE OF {columns} ON {table} "
+        f"BEGIN {contribution('old', '-1', day)} {contribution('new', '1', day)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_stats_ad AFTER DELETE ON {table} BEGIN "
+        f"{contribution('old', '-1', day)} END",
+    ]
+
+
+def _postgresql_triggers(table: str, columns: str, contribution) -> list:
+    day = DAY["postgresql"]
+    return [
+        f"CREATE OR REPLACE FUNCTION {table}_stats() RETURNS trigger AS $$ BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN {contribution('OLD', '-1', day)} END IF; "
+        f"IF TG_OP <> 'DELETE' THEN {contribution('NEW', '1', day)} END IF; "
+        "RETURN NULL; END $$ LANGUAGE plpgsql",
+        f"DROP TRIGGER IF EXISTS {table}_stats ON {table}",
+        f"CREATE TRIGGER {table}_stats AFTER INSERT OR DELETE OR UPDATE OF {columns} "
+        f"ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_stats()",
+    ]
+
+
+SOURCES = [
+    ("licenses", "is_active, next_charge_at", _license),
+    ("users", "created_at, referred_by_id, referral_bonus_claimed", _user),
+    ("payments", "status, amount_value, created_at, paid_at", _payment),
+]
+
+TRIGGERS = {
+    dialect: {table: build(table, columns, contribution) for table, columns, contribution in SOURCES}
+    for dialect, build in (("sqlite", _sqlite_triggers), ("postgresql", _postgresql_triggers))
+}
+
+
+def install(connection, table_names) -> None:
+    """Create the triggers for whichever source tables exist in ``table_names``."""
+    for table, statements in TRIGGERS.get(connection.dialect.name, {}).items():
+        if table in table_names:
+            for statement in statements:
+                connection.execute(text(statement))
+
+
+def attach(metadata) -> None:
+    """Install the triggers after ``metadata.create_all`` (SQLite and PostgreSQL)."""
+
+    @event.listens_for(metadata, "after_create")
+    def _after_create(target, connection, **kw):
+        if connection.dialect.name not in TRIGGERS:
+            return
+        names = set(target.tables)
+        if "stats_rollup" in names:
+            install(connection, names)
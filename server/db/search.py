@@ -0,0 +1,83 @@
+"""Trigram full-text index over license keys and Telegram IDs (SQLite only).
+
+``license_search`` is an FTS5 table with the ``trigram`` tokenizer whose
+``rowid`` is ``licenses.id``.  Triggers on ``licenses`` and ``users`` keep it in
+sync, so every write path — ORM, bulk statements, the bot — updates it without
+extra code.  The table is created together with ``licenses`` by
+``Base.metadata.create_all`` and by the Alembic migration for existing
+databases.  Other dialects fall back to ``ILIKE`` in the admin search.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import DDL, column, event, select, table, text
+
+SEARCH_TABLE = "license_search"
+
+# Trigram-индекс находит подстроки не короче трёх символов
+MIN_QUERY_LENGTH = 3
+
+STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    "USING fts5(license_key, telegram_id, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS licenses_search_ai AFTER INSERT ON licenses BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, license_key, telegram_id)
+        SELECT new.id, new.license_key, (SELECT telegram_id FROM users WHERE id = new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS licenses_search_au
+        AFTER UPDATE OF license_key, user_id ON licenses BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        INSERT INTO {SEARCH_TABLE}(rowid, license_key, telegram_id)
+        SELECT new.id, new.license_key, (SELECT telegram_id FROM users WHERE id = new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS licenses_search_ad AFTER DELETE ON licenses BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF telegram_id ON users BEGIN
+        UPDATE {SEARCH_TABLE} SET telegram_id = new.telegram_id
+        WHERE rowid IN (SELECT id FROM licenses WHERE user_id = new.id);
+    END""",
+)
+
+_search = table(SEARCH_TABLE, column("rowid"))
+
+_UUID_RE = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+
+
+def attach(licenses_table) -> None:
+    """Create the index and triggers right after ``licenses`` (SQLite only)."""
+    for statement in STATEMENTS:
+        event.listen(
+            licenses_table, "after_create", DDL(statement).execute_if(dialect="sqlite")
+        )
+    event.listen(
+        licenses_table,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}").execute_if(dialect="sqlite"),
+    )
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Alembic filter: FTS5 tables are managed by raw DDL, not by the models."""
+    return not (type_ == "table" and name and name.startswith(SEARCH_TABLE))
+
+
+def is_license_key(q: str) -> bool:
+    return bool(_UUID_RE.match(q))
+
+
+def matching_license_ids(q: str) -> Optional[object]:
+    """``SELECT rowid`` of licenses whose key or Telegram ID contains ``q``.
+
+    Returns ``None`` when ``q`` is too short for the trigram index.
+    """
+    if len(q) < MIN_QUERY_LENGTH:
+        return None
+    # Запрос — одна фраза FTS5: кавычки внутри удваиваются
+    phrase = '"' + q.replace('"', '""') + '"'
+    return select(_search.c.rowid).where(
+        text(f"{SEARCH_TABLE} MATCH :search_phrase").bindparams(search_phrase=phrase)
+    )
@@ -1,14 +1,100 @@
-"""Database session and engine setup using SQLAlchemy's async API."""
+"""Database session and engine setup using SQLAlchemy's async API.
+
+For SQLite the ``production`` profile (default) switches the file to WAL and
+applies tuned pragmas on every new connection, so the API and the bot process
+can read while the other one writes and wait for locks instead of failing
+with "database is locked".  ``DB_PROFILE=default`` keeps SQLite's stock
+settings (rollback journal, driver defaults).
+
+PostgreSQL is served by asyncpg; ``postgres://`` and ``postgresql://`` URLs
+are rewritten to ``postgresql+asyncpg://``.  When ``DATABASE_READ_URL`` points
+at a replica, hot read paths open :data:`ReadSessionLocal` sessions on a
+separate read-only engine; otherwise it is bound to the primary engine.
+"""
 
 import os
 from pathlib import Path
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 BASE_DIR = Path(__file__).resolve().parent
-DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{BASE_DIR / 'database.db'}")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+ASYNC_DRIVERS = {"postgres": "postgresql+asyncpg", "postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def normalize_url(url: str) -> str:
+    """Swap a sync or shorthand scheme for the async driver the app uses."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+DATABASE_URL = normalize_url(
+    os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{BASE_DIR / 'database.db'}")
+)
+# Реплика для чтения; пусто — читаем с основной базы
+DATABASE_READ_URL = normalize_url(os.getenv("DATABASE_READ_URL", ""))
+
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Отрицательное значение — размер в КиБ (здесь 64 МиБ)
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def _apply_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def build_engine(
+    url: str = DATABASE_URL, profile: str = DB_PROFILE, read_only: bool = False, **kwargs
+) -> AsyncEngine:
+    """Create an engine for ``url`` with the pool and pragmas of ``profile``.
+
+    ``read_only`` opens PostgreSQL transactions as ``READ ONLY`` so a query
+    routed to the replica can never attempt a write.
+    """
+    url = normalize_url(url)
+    parsed = make_url(url)
+    is_sqlite = parsed.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and parsed.database in (None, "", ":memory:")
+    if not in_memory and "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    if not is_sqlite:
+        kwargs.setdefault("pool_pre_ping", True)
+
+    if read_only and parsed.get_backend_name() == "postgresql":
+        kwargs.setdefault("execution_options", {"postgresql_readonly": True})
+
+    new_engine = create_async_engine(url, echo=False, **kwargs)
+    if is_sqlite and profile == "production" and not in_memory:
+        event.listen(new_engine.sync_engine, "connect", _apply_pragmas)
+    return new_engine
+
+
+engine = build_engine()
 SessionLocal = async_sessionmaker(
     bind=engine,
     expire_on_commit=False,
@@ -16,3 +102,12 @@ SessionLocal = async_sessionmaker(
     autoflush=False,
     class_=AsyncSession,
 )
+
+read_engine = build_engine(DATABASE_READ_URL, read_only=True) if DATABASE_READ_URL else engine
+ReadSessionLocal = async_sessionmaker(
+    bind=read_engine,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+    class_=AsyncSession,
+)
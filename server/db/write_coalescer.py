@@ -0,0 +1,176 @@
+"""Group commit: many small write transactions folded into one.
+
+Callers pass :meth:`WriteCoalescer.submit` an ``async def op(db)`` that makes
+its changes on the given session without committing.  A single writer task
+collects operations for up to ``WRITE_COALESCE_WINDOW_MS`` (at most
+``WRITE_COALESCE_MAX_BATCH`` of them), runs them one after another on one
+session and commits once.  On SQLite a burst of webhooks or ``/start``
+commands then pays for one writer lock and one fsync instead of one each.
+
+Every caller awaits its own result.  Each operation is flushed right after it
+runs, so a failing one is known: the batch is rolled back, that caller gets
+its exception and the remaining operations are replayed in a new transaction.
+Operations may therefore run more than once and must only touch the
+database — cache invalidation or messages belong after ``submit`` returns.
+A failed ``COMMIT`` is reported to every caller of the batch.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db.session import SessionLocal
+
+# Сколько ждать попутчиков после первой операции; 0 — коммитить каждую сразу
+WRITE_COALESCE_WINDOW = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "2")) / 1000
+WRITE_COALESCE_MAX_BATCH = int(os.getenv("WRITE_COALESCE_MAX_BATCH", "100"))
+
+Operation = Callable[[AsyncSession], Awaitable[Any]]
+
+# Метка остановки в очереди писателя
+_STOP = object()
+
+
+class WriteCoalescer:
+    """Single writer task that commits concurrent operations together."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        window: float = WRITE_COALESCE_WINDOW,
+        max_batch: int = WRITE_COALESCE_MAX_BATCH,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.window = window
+        self.max_batch = max_batch
+
+        self.operations = 0
+        self.commits = 0
+        self.replays = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    async def submit(self, op: Operation) -> Any:
+        """Run ``op(db)`` in the next group commit and return its result."""
+        if not self.enabled:
+            return await self._run_alone(op)
+        loop = asyncio.get_running_loop()
+        # Очередь и задача привязаны к циклу событий (тесты и TestClient создают новые)
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._writer())
+        future = loop.create_future()
+        self._queue.put_nowait((op, future))
+        return await future
+
+    async def stop(self) -> None:
+        """Commit what is queued and stop the writer task."""
+        task, queue = self._task, self._queue
+        self._task = None
+        if task is None or task.done() or self._loop is not asyncio.get_running_loop():
+            return
+        # Не отменяем писателя: он мог уже забрать пакет из очереди или коммитить его.
+        # Метка остановки встаёт за всеми операциями, и писатель завершается сам.
+        queue.put_nowait(_STOP)
+        await task
+
+    def stats(self) -> dict:
+        return {
+            "operations": self.operations,
+            "commits": self.commits,
+            "replays": self.replays,
+        }
+
+    async def _run_alone(self, op: Operation) -> Any:
+        async with self.session_factory() as db:
+            result = await op(db)
+            await db.commit()
+        self.operations += 1
+        self.commits += 1
+        return result
+
+    async def _writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    # Коммитим собранное и выходим
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._commit(batch)
+            except Exception as exc:
+                # Сюда попадаем только при сбое самой сессии; писатель должен жить дальше
+                logging.exception("Сбой группового коммита")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _commit(self, batch: List[Tuple[Operation, asyncio.Future]]) -> None:
+        pending = [(op, future) for op, future in batch if not future.done()]
+        while pending:
+            results, failed, error = [], None, None
+            async with self.session_factory() as db:
+                for index, (op, _) in enumerate(pending):
+                    try:
+                        results.append(await op(db))
+                        await db.flush()
+                    except Exception as exc:
+                        failed, error = index, exc
+                        break
+                if failed is None:
+                    try:
+                        await db.commit()
+                    except Exception as exc:
+                        for _, future in pending:
+                            if not future.done():
+                                future.set_exception(exc)
+                        return
+                else:
+                    await db.rollback()
+
+            if failed is None:
+                self.operations += len(pending)
+                self.commits += 1
+                for (_, future), result in zip(pending, results):
+                    if not future.done():
+                        future.set_result(result)
+                return
+
+            future = pending[failed][1]
+            if not future.done():
+                future.set_exception(error)
+            self.operations += 1
+            self.replays += failed
+            # Остальные операции откатились вместе с пакетом — повторяем их без сбойной
+            pending = [item for i, item in enumerate(pending) if i != failed and not item[1].done()]
+
+
+write_coalescer = WriteCoalescer()
@@ -1,24 +1,53 @@
 from server.api import payment_router
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-import os
-import logging
 from pathlib import Path
-from datetime import datetime
 from dotenv import load_dotenv
-from telegram_bot.notify import send_telegram_message
+from telegram_bot.outbox import notification_worker
+from telegram_bot import webhook as telegram_webhook_router
+from telegram_bot.webhook import BOT_IN_PROCESS, telegram_webhook
 
 from server.admin.routes import admin_router
-from server.api import license_router
+from server.db.write_coalescer import write_coalescer
+from server.api import license_router, notification_router, render_router
 from server.api.user_router import router as user_router
-from server.db.session import SessionLocal
-from server.models.license import License
-from server.models.user import User
-from sqlalchemy import select
+from server.services.expiry_service import license_sweeper
+from server.services.payment_service import process_pending_payments
+from server.services.render_events import render_event_recorder
+from server.services.yookassa_client import close_client as close_yookassa_client
 
 load_dotenv()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновая отправка Telegram-сообщений из очереди (outbox)
+    await notification_worker.start()
+    # Пакетная запись событий рендера, сводки и очистка старых событий
+    await render_event_recorder.start()
+    # Отключение просроченных лицензий и напоминания о продлении
+    await license_sweeper.start()
+    # Догоняем платежи, сохранённые, но не обработанные до перезапуска
+    asyncio.create_task(process_pending_payments())
+    # Вебхук или all-in-one: бот обрабатывает обновления в этом же процессе
+    if telegram_webhook.enabled or BOT_IN_PROCESS:
+        await telegram_webhook.start(polling=BOT_IN_PROCESS)
+    try:
+        yield
+    finally:
+        await notification_worker.stop()
+        # Бот закрывает общий Bot API клиент — после воркеров уведомлений
+        await telegram_webhook.stop()
+        await render_event_recorder.stop()
+        await license_sweeper.stop()
+        # Дописываем то, что успело встать в очередь группового коммита
+        await write_coalescer.stop()
+        await close_yookassa_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
@@ -27,66 +56,7 @@ app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 app.include_router(admin_router)
 app.include_router(license_router.router, prefix="/api")
 app.include_router(user_router, prefix="/api")
+app.include_router(notification_router.router, prefix="/api")
+app.include_router(render_router.router, prefix="/api")
 app.include_router(payment_router.router)
-
-
-# Модель для рендера
-class RenderData(BaseModel):
-    license_key: str
-    log: str
-
-@app.post("/api/render_notify")
-async def handle_render_notify(data: RenderData):
-    """Получает лог рендера и отправляет его в Telegram."""
-    logging.info(">>> Получен render_notify: license_key=%s, log=%s", data.license_key, data.log)
-
-    user_chat_id = None
-    user_id = None
-
-    async with SessionLocal() as db:
-        result = await db.execute(
-            select(License).filter_by(license_key=data.license_key)
-        )
-        license = result.scalars().first()
-        if not license:
-            logging.warning("License not found for key %s", data.license_key)
-        elif (
-            license.is_active
-            and license.next_charge_at
-            and license.next_charge_at > datetime.utcnow()
-        ):
-            user_id = license.user_id
-            result = await db.execute(select(User).filter_by(id=user_id))
-            user = result.scalars().first()
-            if not user:
-                logging.warning(
-                    "User %s not found for license %s",
-                    user_id,
-                    data.license_key,
-                )
-            elif not user.telegram_id:
-                logging.info(
-                    "Missing telegram_id for user %s and license %s",
-                    user.id,
-                    data.license_key,
-                )
-            else:
-                user_chat_id = user.telegram_id
-        else:
-            logging.info(
-                "Inactive license for key %s; skipping notification",
-                data.license_key,
-            )
-
-    formatted = data.log
-
-    if user_chat_id:
-        await send_telegram_message(chat_id=user_chat_id, text=formatted)
-    else:
-        logging.info(
-            "Telegram message not sent: license_key=%s user_id=%s (chat_id missing)",
-            data.license_key,
-            user_id,
-        )
-
-    return {"status": "ok"}
\ No newline at end of file
+app.include_router(telegram_webhook_router.router)
@@ -1,5 +1,21 @@
 from .user import User
 from .license import License
 from .payment import Payment
+from .lease_revocation import LeaseRevocation
+from .outbox import TelegramOutbox
+from .stats_rollup import StatsRollup
+from .render_event import RenderEvent
+from .render_rollup import RenderRollup
+from .telegram_media import TelegramMedia
 
-__all__ = ["User", "License", "Payment"]
+__all__ = [
+    "User",
+    "License",
+    "Payment",
+    "LeaseRevocation",
+    "TelegramOutbox",
+    "StatsRollup",
+    "RenderEvent",
+    "RenderRollup",
+    "TelegramMedia",
+]
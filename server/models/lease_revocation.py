@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from server.db.base_class import Base
+
+
+class LeaseRevocation(Base):
+    """Revocation record for offline license leases.
+
+    A lease for ``license_key`` issued at or before ``revoked_at`` is no
+    longer valid.  Rows older than the maximum lease lifetime are pruned.
+    """
+
+    __tablename__ = "lease_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    license_key = Column(String, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
+from server.db import search
 from server.db.base_class import Base
 
 class License(Base):
@@ -12,5 +13,18 @@ class License(Base):
     subscription_id = Column(String, nullable=True)
     is_active = Column(Boolean, default=False)
     next_charge_at = Column(DateTime, nullable=True)
+    # Последнее напоминание о продлении: к какой дате списания и за сколько дней
+    reminded_for = Column(DateTime, nullable=True)
+    reminder_days = Column(Integer, nullable=True)
 
     user = relationship("User", back_populates="license")
+
+    __table_args__ = (
+        # Keyset-пагинация админки по (next_charge_at, id)
+        Index("ix_licenses_next_charge_at_id", "next_charge_at", "id"),
+        # Фоновый обход: активные лицензии с истёкшей или близкой датой списания
+        Index("ix_licenses_is_active_next_charge_at", "is_active", "next_charge_at"),
+    )
+
+
+search.attach(License.__table__)
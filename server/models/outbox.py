@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Index
+from server.db.base_class import Base
+
+
+class TelegramOutbox(Base):
+    """Outgoing Telegram message waiting to be delivered by the notification worker."""
+
+    __tablename__ = "telegram_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(BigInteger, nullable=False, index=True)
+    text = Column(Text, nullable=False)
+
+    # pending → sending → sent | failed
+    status = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    # Не отправлять раньше этого момента (RetryAfter / повторные попытки)
+    not_before = Column(DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_telegram_outbox_status_not_before", "status", "not_before"),
+    )
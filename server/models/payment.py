@@ -1,6 +1,6 @@
 # server/models/payment.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, Text, UniqueConstraint, Index
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Numeric, Text, UniqueConstraint, Index
 from server.db.base_class import Base  # у тебя уже есть Base в проекте
 
 class Payment(Base):
@@ -11,7 +11,7 @@ class Payment(Base):
     payment_id = Column(String(64), nullable=False, unique=True, index=True)
 
     # Кто платил (для удобства связываем с твоей системой)
-    telegram_id = Column(Integer, nullable=False, index=True)
+    telegram_id = Column(BigInteger, nullable=False, index=True)
 
     # Статус платежа (ожидаем в итоге 'succeeded')
     status = Column(String(32), nullable=False, index=True)
@@ -23,12 +23,17 @@ class Payment(Base):
     # Описание (то, что ты передавал в create_payment)
     description = Column(Text, nullable=True)
 
+    # Ссылка на оплату — переиспользуем её, пока платёж ещё pending
+    confirmation_url = Column(Text, nullable=True)
+
     # Сырые данные вебхука (для отладки; можно хранить JSON как Text)
     payload = Column(Text, nullable=True)
 
     # Метки времени
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     processed_at = Column(DateTime, nullable=True)
+    # Когда платёж прошёл (succeeded) — по этому дню считается выручка
+    paid_at = Column(DateTime, nullable=True)
 
     __table_args__ = (
         UniqueConstraint("payment_id", name="uq_payments_payment_id"),
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from server.db.base_class import Base
+
+
+class RenderEvent(Base):
+    """Raw render event as received from the 3ds Max plugin (append-only).
+
+    Rows are written in batches by :mod:`server.services.render_events`,
+    folded into ``render_rollup`` and pruned after ``RENDER_EVENTS_RETENTION_DAYS``.
+    """
+
+    __tablename__ = "render_events"
+
+    id = Column(Integer, primary_key=True)
+    license_key = Column(String(64), nullable=False)
+    scene = Column(String(255), nullable=True)
+    camera = Column(String(255), nullable=True)
+    # start | end | log
+    event = Column(String(16), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Очистка и сводки идут по времени
+        Index("ix_render_events_created_at", "created_at"),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Float, Integer, String, Index
+from server.db.base_class import Base
+
+
+class RenderRollup(Base):
+    """Hourly and daily render aggregates per license and scene.
+
+    ``period`` is ``hour`` (``bucket`` = ``YYYY-MM-DD HH``) or ``day``
+    (``bucket`` = ``YYYY-MM-DD``).  ``render_seconds`` sums the durations of
+    ``start`` → ``end`` pairs of the same scene and camera, attributed to the
+    bucket of the ``end`` event.
+    """
+
+    __tablename__ = "render_rollup"
+
+    period = Column(String(4), primary_key=True)
+    bucket = Column(String(13), primary_key=True)
+    license_key = Column(String(64), primary_key=True)
+    # '' — сцена не указана в логе
+    scene = Column(String(255), primary_key=True)
+    started = Column(Integer, nullable=False, default=0)
+    finished = Column(Integer, nullable=False, default=0)
+    render_seconds = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        # Сводка пользователя: одна лицензия за последние дни
+        Index("ix_render_rollup_period_license_bucket", "period", "license_key", "bucket"),
+    )
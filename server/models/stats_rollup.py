@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Numeric, String
+
+from server.db import rollup
+from server.db.base_class import Base
+
+
+class StatsRollup(Base):
+    """Pre-aggregated counters for the admin statistics page.
+
+    ``bucket`` is a ``YYYY-MM-DD`` day or ``''`` for running totals.  Rows are
+    maintained by database triggers (see :mod:`server.db.rollup`) and can be
+    recomputed with ``python -m server.db.rebuild_stats``.
+    """
+
+    __tablename__ = "stats_rollup"
+
+    metric = Column(String(32), primary_key=True)
+    bucket = Column(String(10), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    # Сумма платежей (для выручки), для остальных метрик 0
+    amount = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+rollup.attach(Base.metadata)
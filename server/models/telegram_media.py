@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime
+from server.db.base_class import Base
+
+
+class TelegramMedia(Base):
+    """``file_id`` Telegram assigned to a local file after its first upload.
+
+    ``key`` holds the bot id and the file's content hash, so a new bot token
+    or a changed file gets uploaded again instead of reusing a stale id.
+    """
+
+    __tablename__ = "telegram_media"
+
+    key = Column(String(128), primary_key=True)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from server.db.base_class import Base
 
@@ -10,6 +12,8 @@ class User(Base):
     referral_code = Column(String, unique=True, index=True)
     referred_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     referral_bonus_claimed = Column(Boolean, default=False, nullable=False)
+    # Дата регистрации (для статистики); у старых записей пусто
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=True)
 
     license = relationship(
         "License",
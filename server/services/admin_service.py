@@ -0,0 +1,346 @@
+"""Paged queries behind the admin license and user lists.
+
+Lists use keyset (cursor) pagination: the cursor holds the sort key of the
+last row on the page, so fetching page *N* costs the same as page 1 and only
+``page_size + 1`` rows are ever loaded.  Licenses are ordered by
+``(next_charge_at, id)`` (``NULL`` dates last) or by ``id``; users by ``id``.
+Totals shown above the tables come from one aggregate query cached for
+``ADMIN_COUNTS_TTL_SECONDS``.  Bulk actions reuse the same filters and run as
+a single ``UPDATE``/``DELETE`` statement.
+"""
+
+import base64
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, and_, cast, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db import search
+from server.db.dialect import add_days
+from server.models.license import License
+from server.models.user import User
+from server.services import lease_service
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+ADMIN_PAGE_SIZE_MAX = int(os.getenv("ADMIN_PAGE_SIZE_MAX", "500"))
+ADMIN_COUNTS_TTL = float(os.getenv("ADMIN_COUNTS_TTL_SECONDS", "30"))
+
+LICENSE_SORTS = ("", "next_charge_at_asc", "next_charge_at_desc")
+
+
+def page_size(requested: Optional[int]) -> int:
+    if not requested or requested < 1:
+        return ADMIN_PAGE_SIZE
+    return min(requested, ADMIN_PAGE_SIZE_MAX)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def _is_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_cursor(token: Optional[str]) -> Optional[List[Any]]:
+    """Return the decoded cursor, or ``None`` (first page) if it is missing or broken.
+
+    Valid cursors are ``[id]`` and ``[next_charge_at, id]`` with the date as
+    an ISO string (parsed back to ``datetime``) or ``null``.
+    """
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or not values or not _is_id(values[-1]):
+        return None
+    if len(values) == 1:
+        return values
+    if len(values) != 2:
+        return None
+    charge_at, last_id = values
+    if charge_at is None:
+        return values
+    if not isinstance(charge_at, str):
+        return None
+    try:
+        return [datetime.fromisoformat(charge_at), last_id]
+    except ValueError:
+        return None
+
+
+def _substring_condition(q: str, dialect_name: str):
+    if dialect_name == "sqlite":
+        ids = search.matching_license_ids(q)
+        if ids is not None:
+            return License.id.in_(ids)
+    return or_(
+        License.license_key.ilike(f"%{q}%"),
+        cast(User.telegram_id, String).ilike(f"%{q}%"),
+    )
+
+
+_BIGINT_MAX = 2**63 - 1
+
+
+def search_condition(q: str, dialect_name: str = "sqlite"):
+    """WHERE clause for the admin search box.
+
+    A full UUID matches the license key exactly through its unique index.  A
+    number matches the Telegram ID (if it fits in ``BIGINT``) or a numeric key
+    exactly and, from ``search.MIN_QUERY_LENGTH`` digits on, also as a part of
+    them.  Anything
+    else is a substring search through the ``license_search`` trigram index;
+    very short queries and non-SQLite databases fall back to ``ILIKE``.
+    """
+    if search.is_license_key(q):
+        return License.license_key == q.lower()
+    if q.isascii() and q.isdigit():
+        exact = License.license_key == q
+        # Больше BIGINT Telegram ID не бывает, а привязать такое число нельзя
+        if int(q) <= _BIGINT_MAX:
+            # Оба условия по колонкам licenses — SQLite объединит два индексных поиска
+            exact = or_(
+                License.user_id.in_(select(User.id).where(User.telegram_id == int(q))),
+                exact,
+            )
+        if len(q) < search.MIN_QUERY_LENGTH:
+            return exact
+        # Часть Telegram ID — через trigram-индекс
+        return or_(exact, _substring_condition(q, dialect_name))
+    return _substring_condition(q, dialect_name)
+
+
+def license_list_query(status: str = "", q: str = "", dialect_name: str = "sqlite"):
+    """``SELECT License, User`` with the admin filters applied and no ordering."""
+    query = select(License, User).join(User)
+
+    q = q.strip()
+    if q:
+        query = query.filter(search_condition(q, dialect_name))
+
+    if status == "active":
+        query = query.filter(License.is_active.is_(True))
+    elif status == "inactive":
+        query = query.filter(License.is_active.is_(False))
+    return query
+
+
+def _after_charge_date(cursor: List[Any], descending: bool):
+    """Rows strictly after ``(next_charge_at, id)`` in the list order, ``NULL`` dates last."""
+    charge_at, last_id = cursor
+    id_after = License.id < last_id if descending else License.id > last_id
+    if charge_at is None:
+        return and_(License.next_charge_at.is_(None), id_after)
+    charge_after = (
+        License.next_charge_at < charge_at if descending else License.next_charge_at > charge_at
+    )
+    return or_(
+        charge_after,
+        and_(License.next_charge_at == charge_at, id_after),
+        License.next_charge_at.is_(None),
+    )
+
+
+def order_licenses(query, sort: str = "", cursor: Optional[List[Any]] = None):
+    """Apply the ordering for ``sort`` and, if given, the keyset condition for ``cursor``."""
+    if sort in ("next_charge_at_asc", "next_charge_at_desc"):
+        descending = sort == "next_charge_at_desc"
+        if descending:
+            query = query.order_by(
+                License.next_charge_at.desc().nulls_last(), License.id.desc()
+            )
+        else:
+            query = query.order_by(License.next_charge_at.asc().nulls_last(), License.id.asc())
+        if cursor is not None and len(cursor) == 2:
+            query = query.filter(_after_charge_date(cursor, descending))
+    else:
+        query = query.order_by(License.id.asc())
+        if cursor is not None and len(cursor) == 1:
+            query = query.filter(License.id > cursor[0])
+    return query
+
+
+def _license_cursor(lic: License, sort: str) -> str:
+    if sort in ("next_charge_at_asc", "next_charge_at_desc"):
+        return encode_cursor([lic.next_charge_at, lic.id])
+    return encode_cursor([lic.id])
+
+
+async def list_licenses(
+    db: AsyncSession,
+    status: str = "",
+    sort: str = "",
+    q: str = "",
+    after: Optional[str] = None,
+    limit: int = ADMIN_PAGE_SIZE,
+) -> Tuple[List[Tuple[License, User]], Optional[str]]:
+    """One page of ``(License, User)`` rows and the cursor of the next page."""
+    query = order_licenses(
+        license_list_query(status, q, db.bind.dialect.name), sort, decode_cursor(after)
+    )
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _license_cursor(rows[-1][0], sort)
+    return rows, next_cursor
+
+
+async def list_users(
+    db: AsyncSession, after: Optional[str] = None, limit: int = ADMIN_PAGE_SIZE
+) -> Tuple[List[Tuple[User, int]], Optional[str]]:
+    """One page of ``(User, license_count)`` rows ordered by ``id``."""
+    query = (
+        select(User, func.count(License.id).label("license_count"))
+        .outerjoin(License)
+        .group_by(User.id)
+        .order_by(User.id)
+    )
+    cursor = decode_cursor(after)
+    if cursor is not None and len(cursor) == 1:
+        query = query.filter(User.id > cursor[0])
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][0].id])
+    return rows, next_cursor
+
+
+def bulk_selection(
+    license_keys: Sequence[str] = (),
+    status: str = "",
+    q: str = "",
+    expires_within_days: Optional[int] = None,
+    dialect_name: str = "sqlite",
+):
+    """``SELECT licenses.id`` for a bulk action: explicit keys and/or dashboard filters.
+
+    ``expires_within_days`` keeps licenses whose ``next_charge_at`` falls between
+    now and now + N days (e.g. 7 for "expiring this week").
+    """
+    query = license_list_query(status, q, dialect_name).with_only_columns(License.id)
+    if license_keys:
+        query = query.filter(License.license_key.in_(list(license_keys)))
+    if expires_within_days is not None:
+        now = datetime.utcnow()
+        query = query.filter(
+            License.next_charge_at >= now,
+            License.next_charge_at < now + timedelta(days=expires_within_days),
+        )
+    return query
+
+
+async def bulk_shift_days(db: AsyncSession, selection, days: int) -> List[str]:
+    """Move ``next_charge_at``/``valid_until`` of the selected licenses by ``days``.
+
+    Extending (``days > 0``) also activates the license and starts from now
+    when there is no charge date yet; reducing only touches licenses that have
+    one and revokes their leases.  One ``UPDATE ... RETURNING``; the caller
+    commits.  Returns the affected license keys.
+    """
+    ids = selection.scalar_subquery()
+    stmt = update(License).where(License.id.in_(ids))
+    if days > 0:
+        new_date = add_days(func.coalesce(License.next_charge_at, datetime.utcnow()), days)
+        stmt = stmt.values(next_charge_at=new_date, valid_until=new_date, is_active=True)
+    else:
+        stmt = stmt.where(License.next_charge_at.is_not(None))
+        new_date = add_days(License.next_charge_at, days)
+        stmt = stmt.values(next_charge_at=new_date, valid_until=new_date)
+        await lease_service.revoke_selected(
+            db,
+            select(License.license_key).where(
+                License.id.in_(ids), License.next_charge_at.is_not(None)
+            ),
+        )
+    result = await db.execute(
+        stmt.returning(License.license_key).execution_options(synchronize_session=False)
+    )
+    return list(result.scalars().all())
+
+
+async def bulk_delete(db: AsyncSession, selection) -> List[str]:
+    """Delete the selected licenses with one ``DELETE ... RETURNING``; the caller commits."""
+    ids = selection.scalar_subquery()
+    await lease_service.revoke_selected(
+        db, select(License.license_key).where(License.id.in_(ids))
+    )
+    result = await db.execute(
+        delete(License)
+        .where(License.id.in_(ids))
+        .returning(License.license_key)
+        .execution_options(synchronize_session=False)
+    )
+    return list(result.scalars().all())
+
+
+class _CountsCache:
+    def __init__(self, ttl: float = ADMIN_COUNTS_TTL):
+        self.ttl = ttl
+        self._value: Optional[Dict[str, int]] = None
+        self._expires_at = 0.0
+
+    def get(self) -> Optional[Dict[str, int]]:
+        if self._value is not None and self._expires_at > time.monotonic():
+            return self._value
+        return None
+
+    def set(self, value: Dict[str, int]) -> None:
+        if self.ttl > 0:
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+
+    def clear(self) -> None:
+        self._value = None
+
+
+_counts = _CountsCache()
+
+
+async def get_counts(db: AsyncSession) -> Dict[str, int]:
+    """Totals for the admin header: licenses (all/active/inactive) and users."""
+    cached = _counts.get()
+    if cached is not None:
+        return cached
+    licenses = (
+        select(
+            func.count(License.id).label("total"),
+            func.count(License.id).filter(License.is_active.is_(True)).label("active"),
+        )
+        .subquery()
+    )
+    result = await db.execute(
+        select(
+            licenses.c.total,
+            licenses.c.active,
+            select(func.count(User.id)).scalar_subquery(),
+        )
+    )
+    total, active, users = result.one()
+    counts = {
+        "licenses": total,
+        "active": active or 0,
+        "inactive": total - (active or 0),
+        "users": users,
+    }
+    _counts.set(counts)
+    return counts
+
+
+def invalidate_counts() -> None:
+    """Drop cached totals after creating or deleting licenses/users."""
+    _counts.clear()
@@ -0,0 +1,232 @@
+"""Background expiry of overdue licenses and renewal reminders.
+
+Every ``LICENSE_SWEEP_INTERVAL_SECONDS`` :class:`LicenseSweeper` runs
+:func:`expire_overdue`, which switches off active licenses whose
+``next_charge_at`` has passed, and :func:`queue_reminders`, which puts
+"subscription ends in N days" messages into the Telegram outbox for each
+threshold of ``LICENSE_REMINDER_DAYS``.  Both walk the
+``(is_active, next_charge_at)`` index in batches of
+``LICENSE_SWEEP_BATCH_SIZE`` rows and commit every batch on its own, so the
+write lock is held for one short ``UPDATE`` at a time.
+
+The sweep keeps no cursor: expired licenses drop out of the selection and a
+sent reminder is stored on the license itself (``reminded_for`` is the
+charge date it was about, ``reminder_days`` its threshold).  An interrupted
+run simply continues on the next tick.  A renewal moves ``next_charge_at``
+past ``reminded_for``, which re-arms the reminders without touching them.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db.session import SessionLocal
+from server.models.license import License
+from server.models.outbox import TelegramOutbox
+from server.models.user import User
+from server.services import license_cache
+from telegram_bot import notify
+
+LICENSE_SWEEP_INTERVAL = float(os.getenv("LICENSE_SWEEP_INTERVAL_SECONDS", "600"))
+LICENSE_SWEEP_BATCH_SIZE = int(os.getenv("LICENSE_SWEEP_BATCH_SIZE", "500"))
+# Пороги напоминаний в днях до списания; пустая строка отключает напоминания
+LICENSE_REMINDER_DAYS = [
+    int(days) for days in os.getenv("LICENSE_REMINDER_DAYS", "3,1").split(",") if days.strip()
+]
+
+
+def _days_word(days: int) -> str:
+    if days % 10 == 1 and days % 100 != 11:
+        return "день"
+    if days % 10 in (2, 3, 4) and days % 100 not in (12, 13, 14):
+        return "дня"
+    return "дней"
+
+
+def reminder_text(next_charge_at: datetime, now: datetime) -> str:
+    """Reminder wording with the time actually left (not the threshold that fired)."""
+    days = (next_charge_at - now).days
+    left = f"через {days} {_days_word(days)}" if days >= 1 else "менее чем через сутки"
+    return (
+        f"⏳ Подписка закончится {left} — "
+        f"{next_charge_at:%d.%m.%Y %H:%M} UTC. "
+        "Чтобы продлить её, откройте меню бота: /start"
+    )
+
+
+async def expire_overdue(
+    db: AsyncSession,
+    batch_size: int = LICENSE_SWEEP_BATCH_SIZE,
+    now: Optional[datetime] = None,
+) -> int:
+    """Deactivate active licenses with ``next_charge_at`` in the past; returns how many."""
+    now = now or datetime.utcnow()
+    overdue = and_(License.is_active.is_(True), License.next_charge_at <= now)
+    expired = 0
+    while True:
+        ids = (
+            await db.execute(
+                select(License.id)
+                .where(overdue)
+                .order_by(License.next_charge_at, License.id)
+                .limit(batch_size)
+            )
+        ).scalars().all()
+        if not ids:
+            break
+        # Условие повторяется в UPDATE: лицензию могли продлить между выборкой и записью
+        keys = (
+            await db.execute(
+                update(License)
+                .where(License.id.in_(ids), overdue)
+                .values(is_active=False)
+                .returning(License.license_key)
+                .execution_options(synchronize_session=False)
+            )
+        ).scalars().all()
+        await db.commit()
+        license_cache.invalidate(*keys)
+        expired += len(keys)
+        if not keys or len(ids) < batch_size:
+            break
+    if expired:
+        logging.info("Деактивировано просроченных лицензий: %s", expired)
+    return expired
+
+
+async def queue_reminders(
+    db: AsyncSession,
+    reminder_days: Optional[List[int]] = None,
+    batch_size: int = LICENSE_SWEEP_BATCH_SIZE,
+    now: Optional[datetime] = None,
+) -> int:
+    """Queue renewal reminders for licenses due within each threshold; returns how many."""
+    now = now or datetime.utcnow()
+    queued = 0
+    # Сначала ближний порог: лицензии за сутки до списания не нужно ещё и «за 3 дня»
+    for days in sorted(LICENSE_REMINDER_DAYS if reminder_days is None else reminder_days):
+        due = and_(
+            License.is_active.is_(True),
+            License.next_charge_at > now,
+            License.next_charge_at <= now + timedelta(days=days),
+            or_(
+                License.reminded_for.is_(None),
+                License.reminded_for != License.next_charge_at,
+                License.reminder_days > days,
+            ),
+        )
+        while True:
+            rows = (
+                await db.execute(
+                    select(License.id, User.telegram_id)
+                    .join(User, License.user_id == User.id)
+                    .where(due)
+                    .order_by(License.next_charge_at, License.id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not rows:
+                break
+            chats = dict(rows)
+            # Отметка и сообщения — одной транзакцией: напоминание не теряется и не дублируется
+            marked = (
+                await db.execute(
+                    update(License)
+                    .where(License.id.in_(chats), due)
+                    .values(reminded_for=License.next_charge_at, reminder_days=days)
+                    .returning(License.id, License.next_charge_at)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            if marked:
+                await db.execute(
+                    insert(TelegramOutbox),
+                    [
+                        {"chat_id": chats[license_id], "text": reminder_text(next_charge_at, now)}
+                        for license_id, next_charge_at in marked
+                    ],
+                )
+            await db.commit()
+            queued += len(marked)
+            if marked and notify.outbox_wakeup is not None:
+                notify.outbox_wakeup.set()
+            if not marked or len(rows) < batch_size:
+                break
+    if queued:
+        logging.info("Поставлено напоминаний о продлении: %s", queued)
+    return queued
+
+
+class LicenseSweeper:
+    """Periodically expires overdue licenses and queues renewal reminders."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        interval: float = LICENSE_SWEEP_INTERVAL,
+        batch_size: int = LICENSE_SWEEP_BATCH_SIZE,
+        reminder_days: Optional[List[int]] = None,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.interval = interval
+        self.batch_size = batch_size
+        self.reminder_days = LICENSE_REMINDER_DAYS if reminder_days is None else reminder_days
+
+        self.runs = 0
+        self.expired = 0
+        self.reminded = 0
+        self.last_run: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def sweep(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Run one full pass and return how many licenses were expired and reminded."""
+        async with self.session_factory() as db:
+            expired = await expire_overdue(db, self.batch_size, now)
+            reminded = await queue_reminders(db, self.reminder_days, self.batch_size, now)
+        self.runs += 1
+        self.expired += expired
+        self.reminded += reminded
+        self.last_run = datetime.utcnow()
+        return {"expired": expired, "reminded": reminded}
+
+    async def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "runs": self.runs,
+            "expired": self.expired,
+            "reminded": self.reminded,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Ошибка фонового обхода лицензий")
+            await asyncio.sleep(self.interval)
+
+
+license_sweeper = LicenseSweeper()
@@ -0,0 +1,146 @@
+"""Streaming CSV/NDJSON export of licenses, users and payments.
+
+Rows are read with ``AsyncSession.stream`` in ``EXPORT_CHUNK_SIZE`` batches
+(a server-side cursor, ``yield_per``) and every batch is serialised and handed
+to the response before the next one is fetched, so memory stays flat however
+many rows are exported.  Licenses accept the same status/sort/search filters
+as the admin dashboard.
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from server.db.session import ReadSessionLocal
+from server.models.license import License
+from server.models.payment import Payment
+from server.models.user import User
+from server.services import admin_service
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+LICENSE_COLUMNS = (
+    License.id,
+    License.license_key,
+    User.telegram_id,
+    License.is_active,
+    License.next_charge_at,
+    License.valid_until,
+    License.subscription_id,
+)
+USER_COLUMNS = (
+    User.id,
+    User.telegram_id,
+    User.referral_code,
+    User.referred_by_id,
+    User.referral_bonus_claimed,
+)
+PAYMENT_COLUMNS = (
+    Payment.id,
+    Payment.payment_id,
+    Payment.telegram_id,
+    Payment.status,
+    Payment.amount_value,
+    Payment.currency,
+    Payment.description,
+    Payment.created_at,
+    Payment.paid_at,
+    Payment.processed_at,
+)
+
+
+def licenses_query(status: str = "", sort: str = "", q: str = "", dialect_name: str = "sqlite"):
+    query = admin_service.license_list_query(status, q, dialect_name)
+    return admin_service.order_licenses(query, sort).with_only_columns(*LICENSE_COLUMNS)
+
+
+def users_query():
+    return select(*USER_COLUMNS).order_by(User.id)
+
+
+def payments_query(status: str = ""):
+    query = select(*PAYMENT_COLUMNS).order_by(Payment.id)
+    if status:
+        query = query.filter(Payment.status == status)
+    return query
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _csv_chunk(rows: Sequence[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[_plain(v) for v in row] for row in rows])
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(header: List[str], rows: Sequence[Sequence[Any]]) -> str:
+    return "".join(
+        json.dumps(dict(zip(header, map(_plain, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+async def stream_rows(
+    build_query: Callable[[str], Any],
+    fmt: str = "csv",
+    compress: bool = False,
+    session_factory=None,
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the encoded export, one database batch at a time.
+
+    ``build_query`` receives the dialect name so the search filter can pick
+    the right index.
+    """
+    session_factory = session_factory or ReadSessionLocal
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    # wbits=31 — формат gzip, а не «голый» zlib
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    async with session_factory() as db:
+        query = build_query(db.bind.dialect.name)
+        header = [c.key for c in query.selected_columns]
+        if fmt == "csv":
+            yield encode(_csv_chunk([header]))
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            text = _csv_chunk(rows) if fmt == "csv" else _ndjson_chunk(header, rows)
+            data = encode(text)
+            if data:
+                yield data
+
+    if compressor:
+        yield compressor.flush()
+
+
+def export_filename(entity: str, fmt: str, compress: bool) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    return f"{entity}-{stamp}.{fmt}" + (".gz" if compress else "")
+
+
+def export_headers(entity: str, fmt: str, compress: bool) -> Dict[str, str]:
+    filename = export_filename(entity, fmt, compress)
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -0,0 +1,158 @@
+"""Signed offline license leases and their revocation list.
+
+A lease is a compact ``<claims>.<signature>`` token (both parts base64url,
+HMAC-SHA256 over the claims) that lets a render node keep rendering without
+calling ``/api/check_license`` on every frame.  The lease expires no later
+than the license's ``next_charge_at``.  Revocations are stored in
+``lease_revocations`` so that nodes can cheaply poll for keys revoked since
+their last check.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.models.lease_revocation import LeaseRevocation
+
+LEASE_TTL = int(os.getenv("LICENSE_LEASE_TTL_SECONDS", str(6 * 3600)))
+# За сколько секунд до истечения узел должен обновить аренду
+LEASE_REFRESH_MARGIN = int(os.getenv("LICENSE_LEASE_REFRESH_MARGIN_SECONDS", "600"))
+# Как часто узлам стоит запрашивать список отзывов
+REVOCATION_POLL_INTERVAL = int(os.getenv("LICENSE_LEASE_REVOCATION_POLL_SECONDS", "300"))
+
+
+class LeaseConfigError(RuntimeError):
+    """Leases cannot be signed or checked because ``LICENSE_LEASE_SECRET`` is unset."""
+
+
+def _secret() -> bytes:
+    secret = os.getenv("LICENSE_LEASE_SECRET")
+    if not secret:
+        raise LeaseConfigError("LICENSE_LEASE_SECRET is not configured.")
+    return secret.encode()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_lease(
+    license_key: str, telegram_id: int, next_charge_at: Optional[datetime]
+) -> Dict[str, Any]:
+    """Issue a lease for an active license, capped at ``next_charge_at`` (UTC)."""
+    issued = time.time()
+    now = int(issued)
+    expires_at = now + LEASE_TTL
+    if next_charge_at is not None:
+        charge_ts = int((next_charge_at - datetime.utcnow()).total_seconds()) + now
+        expires_at = min(expires_at, charge_ts)
+
+    # iat с долями секунды: аренда, выданная сразу после отзыва в ту же секунду,
+    # не должна считаться отозванной (см. is_revoked)
+    claims = {
+        "k": license_key,
+        "u": telegram_id,
+        "iat": round(issued, 6),
+        "exp": expires_at,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return {
+        "lease": f"{payload}.{_sign(payload)}",
+        "issued_at": now,
+        "expires_at": expires_at,
+        "refresh_after": max(now, expires_at - LEASE_REFRESH_MARGIN),
+        "revocation_poll_seconds": REVOCATION_POLL_INTERVAL,
+    }
+
+
+def decode_lease(token: str) -> Optional[Dict[str, Any]]:
+    """Return the claims of a correctly signed, unexpired lease, otherwise ``None``."""
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+
+async def is_revoked(db: AsyncSession, claims: Dict[str, Any]) -> bool:
+    """Whether the lease's key was revoked at or after the lease was issued."""
+    issued_at = datetime.utcfromtimestamp(claims["iat"])
+    result = await db.execute(
+        select(LeaseRevocation.id)
+        .filter(
+            LeaseRevocation.license_key == claims["k"],
+            LeaseRevocation.revoked_at >= issued_at,
+        )
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def revoke(db: AsyncSession, *license_keys: Optional[str]) -> None:
+    """Record revocations for ``license_keys``; the caller commits.
+
+    Records older than the maximum lease lifetime can no longer match any
+    outstanding lease, so they are pruned here to keep the list short.
+    """
+    now = datetime.utcnow()
+    horizon = now - timedelta(seconds=LEASE_TTL)
+    await db.execute(delete(LeaseRevocation).filter(LeaseRevocation.revoked_at < horizon))
+    for key in license_keys:
+        if key:
+            db.add(LeaseRevocation(license_key=key, revoked_at=now))
+
+
+async def revoke_selected(db: AsyncSession, license_keys) -> None:
+    """Like :func:`revoke` for every key returned by the ``license_keys`` select.
+
+    One ``INSERT ... SELECT`` regardless of how many licenses are affected;
+    the caller commits.
+    """
+    now = datetime.utcnow()
+    horizon = now - timedelta(seconds=LEASE_TTL)
+    await db.execute(delete(LeaseRevocation).filter(LeaseRevocation.revoked_at < horizon))
+    keys = license_keys.subquery()
+    await db.execute(
+        insert(LeaseRevocation).from_select(
+            ["license_key", "revoked_at"],
+            select(keys.c[0], literal(now, DateTime)),
+        )
+    )
+
+
+async def get_revocations(db: AsyncSession, since: datetime) -> List[Dict[str, Any]]:
+    """Revocations recorded after ``since`` that may still affect a live lease."""
+    horizon = datetime.utcnow() - timedelta(seconds=LEASE_TTL)
+    result = await db.execute(
+        select(LeaseRevocation.license_key, LeaseRevocation.revoked_at)
+        .filter(LeaseRevocation.revoked_at > max(since, horizon))
+        .order_by(LeaseRevocation.revoked_at)
+    )
+    return [
+        {
+            "license_key": key,
+            "revoked_at": int((revoked_at - datetime(1970, 1, 1)).total_seconds()),
+        }
+        for key, revoked_at in result.all()
+    ]
@@ -0,0 +1,100 @@
+"""In-process TTL/LRU cache for ``/api/check_license`` results.
+
+Entries are keyed by license key and hold the payload returned to render
+nodes (status, ``days_left`` and ``user_id``).  Every code path that changes a
+license must call :func:`invalidate` for the affected key so that nodes see
+the change immediately instead of after the TTL expires.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+LICENSE_CACHE_TTL = float(os.getenv("LICENSE_CACHE_TTL_SECONDS", "30"))
+LICENSE_CACHE_MAX_SIZE = int(os.getenv("LICENSE_CACHE_MAX_SIZE", "10000"))
+
+
+class LicenseStatusCache:
+    """Bounded LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = LICENSE_CACHE_TTL, max_size: int = LICENSE_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Бот и API могут дергать инвалидацию из разных потоков (to_thread и т.п.)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, license_key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(license_key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[license_key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(license_key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(
+        self,
+        license_key: str,
+        payload: Dict[str, Any],
+        valid_until: Optional[datetime] = None,
+    ) -> None:
+        """Store ``payload``; an active entry never outlives ``valid_until`` (UTC)."""
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if valid_until is not None:
+            ttl = min(ttl, (valid_until - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[license_key] = (time.monotonic() + ttl, dict(payload))
+            self._entries.move_to_end(license_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *license_keys: Optional[str]) -> None:
+        with self._lock:
+            for key in license_keys:
+                if key:
+                    self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+        }
+
+
+license_status_cache = LicenseStatusCache()
+
+
+def invalidate(*license_keys: Optional[str]) -> None:
+    """Drop cached status for the given license keys (``None`` is ignored)."""
+    license_status_cache.invalidate(*license_keys)
@@ -1,11 +1,14 @@
 """Operations for managing :class:`License` records asynchronously."""
 
+from datetime import datetime
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from server.models.license import License
 from server.models.user import User
+from server.services import license_cache
 
 
 async def create_license(
@@ -13,6 +16,7 @@ async def create_license(
 ):
     result = await db.execute(select(License).filter_by(user_id=user.id))
     license = result.scalars().first()
+    old_key = license.license_key if license else None
     if license:
         license.license_key = license_key
         if next_charge_at is not None:
@@ -29,6 +33,7 @@ async def create_license(
         )
         db.add(license)
     await db.commit()
+    license_cache.invalidate(old_key, license_key)
     await db.refresh(license)
     return license
 
@@ -40,3 +45,38 @@ async def get_license_by_key(db: AsyncSession, license_key: str):
         .filter(License.license_key == license_key)
     )
     return result.scalars().first()
+
+
+async def get_licenses_by_keys(db: AsyncSession, license_keys):
+    """Fetch licenses with their owner's Telegram ID in a single ``IN (...)`` query.
+
+    Returns a mapping ``license_key -> (License, telegram_id)``.
+    """
+    if not license_keys:
+        return {}
+    result = await db.execute(
+        select(License, User.telegram_id)
+        .join(User, License.user_id == User.id)
+        .filter(License.license_key.in_(license_keys))
+    )
+    return {lic.license_key: (lic, telegram_id) for lic, telegram_id in result.all()}
+
+
+def license_status(license, telegram_id, now=None):
+    """Build the ``check_license`` payload for ``license`` (``None`` means not found)."""
+    if license is None:
+        return {"status": "not_found", "valid": False}
+    now = now or datetime.utcnow()
+    if not license.is_active or (
+        license.next_charge_at and license.next_charge_at <= now
+    ):
+        return {"status": "inactive", "valid": False}
+    days_left = 0
+    if license.next_charge_at:
+        days_left = (license.next_charge_at - now).days
+    return {
+        "status": "active",
+        "valid": True,
+        "user_id": telegram_id,
+        "days_left": days_left,
+    }
@@ -0,0 +1,227 @@
+"""Persisting YooKassa webhook events and applying them in the background.
+
+The webhook handler only stores the event in ``payments`` (``payment_id`` is
+the idempotency key) and returns.  :func:`process_pending_payments` then
+extends licenses, grants referral bonuses and queues notifications for every
+succeeded payment that has not been processed yet.
+"""
+
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db.dialect import insert_for
+from server.db.session import SessionLocal
+from server.models.license import License
+from server.models.payment import Payment
+from server.models.user import User
+from server.services import license_cache
+from server.services.referral_service import (
+    BONUS_DAYS_PER_REFERRAL,
+    claim_referral_bonuses,
+)
+from telegram_bot.notify import send_telegram_message
+
+SUBSCRIPTION_DAYS = 30
+
+# Сколько секунд ссылка на оплату pending-платежа переиспользуется при повторных нажатиях
+PAYMENT_LINK_TTL = int(os.getenv("PAYMENT_LINK_TTL_SECONDS", "900"))
+
+
+def _amount(obj: Dict[str, Any]):
+    amount = obj.get("amount") or {}
+    try:
+        value = Decimal(str(amount["value"])) if "value" in amount else None
+    except InvalidOperation:
+        value = None
+    return value, amount.get("currency")
+
+
+def _paid_at(obj: Dict[str, Any], status: str) -> Optional[datetime]:
+    """Naive UTC time the payment succeeded (``captured_at``, else now)."""
+    if status != "succeeded":
+        return None
+    try:
+        captured = datetime.fromisoformat(obj["captured_at"])
+    except (KeyError, TypeError, ValueError):
+        return datetime.utcnow()
+    if captured.tzinfo is not None:
+        captured = captured.astimezone(timezone.utc).replace(tzinfo=None)
+    return captured
+
+
+async def record_webhook_event(
+    db: AsyncSession, payload: Dict[str, Any], telegram_id: int
+) -> None:
+    """Insert the event into ``payments``; redeliveries leave the row untouched.
+
+    An existing row only changes status while it has not succeeded yet
+    (e.g. ``pending`` → ``succeeded``), so a repeated ``payment.succeeded``
+    is a no-op.  ``paid_at`` is set with the success and is what the revenue
+    statistics are bucketed by; ``created_at`` stays the time the link was
+    created.  The caller commits (the webhook goes through the group commit).
+    """
+    obj = payload.get("object") or {}
+    status = obj.get("status") or payload.get("event", "").split(".", 1)[-1]
+    value, currency = _amount(obj)
+
+    stmt = insert_for(db, Payment).values(
+        payment_id=obj["id"],
+        telegram_id=telegram_id,
+        status=status,
+        amount_value=value,
+        currency=currency,
+        description=obj.get("description"),
+        payload=json.dumps(payload, ensure_ascii=False, default=str),
+        created_at=datetime.utcnow(),
+        paid_at=_paid_at(obj, status),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Payment.payment_id],
+        set_={
+            "status": stmt.excluded.status,
+            "payload": stmt.excluded.payload,
+            "paid_at": stmt.excluded.paid_at,
+        },
+        where=Payment.status != "succeeded",
+    )
+    await db.execute(stmt)
+
+
+async def find_reusable_payment(db: AsyncSession, telegram_id: int) -> Optional[Payment]:
+    """Latest pending payment of the user created within ``PAYMENT_LINK_TTL``."""
+    since = datetime.utcnow() - timedelta(seconds=PAYMENT_LINK_TTL)
+    result = await db.execute(
+        select(Payment)
+        .where(
+            Payment.telegram_id == telegram_id,
+            Payment.status == "pending",
+            Payment.created_at >= since,
+            Payment.confirmation_url.is_not(None),
+        )
+        .order_by(Payment.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def record_created_payment(
+    db: AsyncSession, payment: Dict[str, Any], telegram_id: int
+) -> None:
+    """Store a payment just created in YooKassa so repeated clicks can reuse it; the caller commits."""
+    value, currency = _amount(payment)
+    stmt = insert_for(db, Payment).values(
+        payment_id=payment["id"],
+        telegram_id=telegram_id,
+        status=payment.get("status") or "pending",
+        amount_value=value,
+        currency=currency,
+        description=payment.get("description"),
+        confirmation_url=(payment.get("confirmation") or {}).get("confirmation_url"),
+        created_at=datetime.utcnow(),
+    )
+    # Вебхук мог прийти раньше — тогда строка уже есть
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=[Payment.payment_id]))
+
+
+async def activate_subscription(
+    db: AsyncSession, telegram_id: int, now: datetime, days: int = SUBSCRIPTION_DAYS
+):
+    """Create or extend the user's license by ``days``; the caller commits."""
+    result = await db.execute(select(User).filter_by(telegram_id=telegram_id))
+    user = result.scalars().first()
+    if not user:
+        user = User(telegram_id=telegram_id)
+        db.add(user)
+        await db.flush()
+
+    result = await db.execute(select(License).filter_by(user_id=user.id))
+    lic = result.scalars().first()
+    if lic:
+        base = lic.valid_until or now
+        lic.valid_until = max(base, now) + timedelta(days=days)
+        lic.is_active = True
+        lic.next_charge_at = lic.valid_until
+    else:
+        until = now + timedelta(days=days)
+        lic = License(
+            user_id=user.id,
+            license_key=str(uuid.uuid4()),
+            is_active=True,
+            valid_until=until,
+            next_charge_at=until,
+        )
+        db.add(lic)
+    return user, lic
+
+
+async def _process_payment(session_factory, payment_pk: int) -> bool:
+    now = datetime.utcnow()
+    referrer_chat, bonus_days = None, 0
+    async with session_factory() as db:
+        # Захват платежа: обработать его может только один исполнитель
+        claimed = await db.execute(
+            update(Payment)
+            .where(Payment.id == payment_pk, Payment.processed_at.is_(None))
+            .values(processed_at=now)
+        )
+        if claimed.rowcount != 1:
+            await db.rollback()
+            return False
+
+        payment = await db.get(Payment, payment_pk)
+        telegram_id = payment.telegram_id
+        user, lic = await activate_subscription(db, telegram_id, now)
+        await db.commit()
+        license_cache.invalidate(lic.license_key)
+
+        if user.referred_by_id and not user.referral_bonus_claimed:
+            result = await db.execute(select(User).filter_by(id=user.referred_by_id))
+            referrer = result.scalars().first()
+            if referrer:
+                processed = await claim_referral_bonuses(db, referrer)
+                if processed:
+                    referrer_chat = referrer.telegram_id
+                    bonus_days = processed * BONUS_DAYS_PER_REFERRAL
+
+    if referrer_chat:
+        await send_telegram_message(
+            chat_id=referrer_chat,
+            text=(
+                "🎉 Ваш приглашённый оплатил подписку. "
+                f"Начислено {bonus_days} бонусных дней."
+            ),
+        )
+    await send_telegram_message(
+        chat_id=telegram_id,
+        text="✅ Оплата прошла успешно. Подписка активирована на 30 дней!",
+    )
+    return True
+
+
+async def process_pending_payments(session_factory=None) -> int:
+    """Apply every succeeded, not yet processed payment. Returns how many were applied."""
+    session_factory = session_factory or SessionLocal
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Payment.id)
+            .where(Payment.status == "succeeded", Payment.processed_at.is_(None))
+            .order_by(Payment.id)
+        )
+        pending = result.scalars().all()
+
+    applied = 0
+    for payment_pk in pending:
+        try:
+            if await _process_payment(session_factory, payment_pk):
+                applied += 1
+        except Exception:
+            logging.exception("Не удалось обработать платёж id=%s", payment_pk)
+    return applied
@@ -1,44 +1,45 @@
 """Referral-related helpers using async SQLAlchemy sessions."""
 
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import Tuple
 
 import uuid
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from server.models.user import User
 from server.models.license import License
+from server.services import license_cache
 
 # Количество бонусных дней за одного приглашённого
 BONUS_DAYS_PER_REFERRAL = 7
 
 
+def _has_active_license():
+    return User.id.in_(select(License.user_id).where(License.is_active.is_(True)))
+
+
 async def get_referrals_and_bonus_days(
     db: AsyncSession, user: User
-) -> Tuple[List[User], int, int]:
-    """Return successful referrals, available bonus days and total bonus days accrued."""
-    result = await db.execute(
-        select(User).filter_by(referred_by_id=user.id, referral_bonus_claimed=True)
-    )
-    referrals = result.scalars().all()
+) -> Tuple[int, int, int]:
+    """Return the number of successful referrals, available and total bonus days.
 
-    # Определяем количество приглашённых, оплативших подписку,
-    # но за которых ещё не получены бонусы
+    Everything is computed by a single aggregate query over ``users``.
+    """
     result = await db.execute(
-        select(User).filter_by(referred_by_id=user.id, referral_bonus_claimed=False)
+        select(
+            func.count().filter(User.referral_bonus_claimed.is_(True)),
+            func.count().filter(
+                User.referral_bonus_claimed.is_(False), _has_active_license()
+            ),
+        ).where(User.referred_by_id == user.id)
     )
-    candidates = result.scalars().all()
-    unclaimed_referrals = 0
-    for cand in candidates:
-        result_lic = await db.execute(select(License).filter_by(user_id=cand.id, is_active=True))
-        if result_lic.scalars().first():
-            unclaimed_referrals += 1
+    claimed, unclaimed = result.one()
 
-    bonus_days_available = unclaimed_referrals * BONUS_DAYS_PER_REFERRAL
-    total_bonus_days = len(referrals) * BONUS_DAYS_PER_REFERRAL
+    bonus_days_available = unclaimed * BONUS_DAYS_PER_REFERRAL
+    total_bonus_days = claimed * BONUS_DAYS_PER_REFERRAL
 
-    return referrals, bonus_days_available, total_bonus_days
+    return claimed, bonus_days_available, total_bonus_days
 
 
 async def claim_referral_bonuses(
@@ -46,26 +47,26 @@ async def claim_referral_bonuses(
 ) -> int:
     """Mark eligible referrals as claimed and add bonus days to user's license.
 
-    Returns the number of referrals processed.
+    Eligible referrals are flagged by one ``UPDATE ... WHERE id IN (...)`` in
+    the same transaction as the license extension, so a concurrent claim only
+    sees the rows that are still unclaimed.  Returns the number of referrals
+    processed.
     """
     result = await db.execute(
-        select(User).filter_by(referred_by_id=user.id, referral_bonus_claimed=False)
+        update(User)
+        .where(
+            User.referred_by_id == user.id,
+            User.referral_bonus_claimed.is_(False),
+            _has_active_license(),
+        )
+        .values(referral_bonus_claimed=True)
+        .execution_options(synchronize_session=False)
     )
-    candidates = result.scalars().all()
-
-    eligible = []
-    for cand in candidates:
-        result_lic = await db.execute(select(License).filter_by(user_id=cand.id, is_active=True))
-        if result_lic.scalars().first():
-            eligible.append(cand)
-
-    if not eligible:
+    claimed = result.rowcount
+    if not claimed:
         return 0
 
-    for cand in eligible:
-        cand.referral_bonus_claimed = True
-
-    total_days = days_per_referral * len(eligible)
+    total_days = days_per_referral * claimed
     now = datetime.utcnow()
 
     result = await db.execute(select(License).filter_by(user_id=user.id))
@@ -88,4 +89,5 @@ async def claim_referral_bonuses(
         db.add(lic)
 
     await db.commit()
-    return len(eligible)
+    license_cache.invalidate(lic.license_key)
+    return claimed
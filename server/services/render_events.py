@@ -0,0 +1,400 @@
+"""Persistence, rollups and retention of render events.
+
+:meth:`RenderEventRecorder.record` only appends to an in-memory buffer; a
+background task writes the buffer to ``render_events`` with one multi-row
+``INSERT`` every ``RENDER_EVENTS_FLUSH_SECONDS`` (or sooner when it fills
+up), so the render callbacks never wait for the database.
+
+Every ``RENDER_ROLLUP_INTERVAL_SECONDS`` :func:`rollup` recomputes the hourly
+rows of ``render_rollup`` from shortly before the last rolled-up hour and
+derives the daily rows from them.  The extra window covers events written
+late with an earlier ``created_at`` (a retried flush, another process's
+buffer): at least an hour, or ``RENDER_EVENTS_FLUSH_SECONDS`` plus
+``RENDER_EVENTS_MAX_DELAY_SECONDS`` if that is longer. :func:`prune` then deletes raw events older than
+``RENDER_EVENTS_RETENTION_DAYS`` in batches of ``RENDER_PRUNE_BATCH_SIZE``.
+The bot and the admin page read only ``render_rollup``.
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db.session import SessionLocal
+from server.models.render_event import RenderEvent
+from server.models.render_rollup import RenderRollup
+
+RENDER_EVENTS_FLUSH_SECONDS = float(os.getenv("RENDER_EVENTS_FLUSH_SECONDS", "1"))
+RENDER_EVENTS_MAX_BUFFER = int(os.getenv("RENDER_EVENTS_MAX_BUFFER", "5000"))
+RENDER_ROLLUP_INTERVAL = float(os.getenv("RENDER_ROLLUP_INTERVAL_SECONDS", "300"))
+RENDER_EVENTS_RETENTION_DAYS = int(os.getenv("RENDER_EVENTS_RETENTION_DAYS", "30"))
+RENDER_PRUNE_BATCH_SIZE = int(os.getenv("RENDER_PRUNE_BATCH_SIZE", "5000"))
+# Насколько позже своего created_at событие может попасть в таблицу (повторы flush)
+RENDER_EVENTS_MAX_DELAY = float(os.getenv("RENDER_EVENTS_MAX_DELAY_SECONDS", "600"))
+# Насколько раньше начала пересчитываемого часа искать парный start для end
+RENDER_PAIR_LOOKBACK = timedelta(hours=int(os.getenv("RENDER_PAIR_LOOKBACK_HOURS", "6")))
+
+HOUR_FORMAT = "%Y-%m-%d %H"
+
+
+def _hour(moment: datetime) -> str:
+    return moment.strftime(HOUR_FORMAT)
+
+
+def _rewind() -> timedelta:
+    return max(
+        timedelta(hours=1),
+        timedelta(seconds=RENDER_EVENTS_FLUSH_SECONDS + RENDER_EVENTS_MAX_DELAY),
+    )
+
+
+async def rollup(db: AsyncSession) -> int:
+    """Recompute hourly and daily aggregates around the last rolled-up hour; returns hour rows."""
+    last = await db.scalar(
+        select(func.max(RenderRollup.bucket)).where(RenderRollup.period == "hour")
+    )
+    if last:
+        # Запоздавшие события (повтор flush, буфер другого процесса) ложатся в прошлые часы
+        since = (datetime.strptime(last, HOUR_FORMAT) - _rewind()).replace(
+            minute=0, second=0, microsecond=0
+        )
+    else:
+        first = await db.scalar(select(func.min(RenderEvent.created_at)))
+        if first is None:
+            return 0
+        since = first.replace(minute=0, second=0, microsecond=0)
+
+    # (час, лицензия, сцена) → [started, finished, render_seconds]
+    hours: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    result = await db.stream(
+        select(
+            RenderEvent.license_key,
+            RenderEvent.scene,
+            RenderEvent.camera,
+            RenderEvent.event,
+            RenderEvent.created_at,
+        )
+        .where(RenderEvent.created_at >= since - RENDER_PAIR_LOOKBACK)
+        .order_by(
+            RenderEvent.license_key,
+            RenderEvent.scene,
+            RenderEvent.camera,
+            RenderEvent.created_at,
+            RenderEvent.id,
+        )
+        .execution_options(yield_per=2000)
+    )
+    # Незакрытый start текущей задачи (лицензия, сцена, камера); log между ними не мешает
+    job, started_at = None, None
+    async for key, scene, camera, event, created_at in result:
+        if (key, scene, camera) != job:
+            job, started_at = (key, scene, camera), None
+        if created_at >= since:
+            totals = hours[(_hour(created_at), key, scene or "")]
+            if event == "start":
+                totals[0] += 1
+            elif event == "end":
+                totals[1] += 1
+                if started_at is not None:
+                    totals[2] += (created_at - started_at).total_seconds()
+        if event == "start":
+            started_at = created_at
+        elif event == "end":
+            started_at = None
+
+    await db.execute(
+        delete(RenderRollup).where(
+            RenderRollup.period == "hour", RenderRollup.bucket >= _hour(since)
+        )
+    )
+    if hours:
+        await db.execute(
+            insert(RenderRollup),
+            [
+                {
+                    "period": "hour",
+                    "bucket": bucket,
+                    "license_key": key,
+                    "scene": scene,
+                    "started": started,
+                    "finished": finished,
+                    "render_seconds": seconds,
+                }
+                for (bucket, key, scene), (started, finished, seconds) in hours.items()
+            ],
+        )
+
+    first_day = since.date().isoformat()
+    day = func.substr(RenderRollup.bucket, 1, 10)
+    await db.execute(
+        delete(RenderRollup).where(RenderRollup.period == "day", RenderRollup.bucket >= first_day)
+    )
+    await db.execute(
+        insert(RenderRollup).from_select(
+            ["period", "bucket", "license_key", "scene", "started", "finished", "render_seconds"],
+            select(
+                literal("day"),
+                day,
+                RenderRollup.license_key,
+                RenderRollup.scene,
+                func.sum(RenderRollup.started),
+                func.sum(RenderRollup.finished),
+                func.sum(RenderRollup.render_seconds),
+            )
+            .where(RenderRollup.period == "hour", RenderRollup.bucket >= f"{first_day} 00")
+            .group_by(day, RenderRollup.license_key, RenderRollup.scene),
+        )
+    )
+    await db.commit()
+    return len(hours)
+
+
+async def prune(
+    db: AsyncSession,
+    retention_days: int = RENDER_EVENTS_RETENTION_DAYS,
+    batch_size: int = RENDER_PRUNE_BATCH_SIZE,
+) -> int:
+    """Delete raw events older than ``retention_days``, one committed batch at a time."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        batch = (
+            select(RenderEvent.id)
+            .where(RenderEvent.created_at < cutoff)
+            .order_by(RenderEvent.created_at)
+            .limit(batch_size)
+        )
+        result = await db.execute(
+            delete(RenderEvent)
+            .where(RenderEvent.id.in_(batch.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def _summary_rows(rows) -> List[Dict[str, Any]]:
+    return [
+        {
+            "scene": scene or "—",
+            "license_key": key,
+            "started": started,
+            "finished": finished,
+            "hours": round((seconds or 0) / 3600, 1),
+        }
+        for key, scene, started, finished, seconds in rows
+    ]
+
+
+async def user_summary(
+    db: AsyncSession, license_key: str, days: int = 7, today: Optional[date] = None
+) -> Dict[str, Any]:
+    """Renders of one license over the last ``days`` days and its busiest scenes."""
+    today = today or datetime.utcnow().date()
+    since = (today - timedelta(days=days - 1)).isoformat()
+    result = await db.execute(
+        select(
+            RenderRollup.license_key,
+            RenderRollup.scene,
+            func.sum(RenderRollup.started),
+            func.sum(RenderRollup.finished),
+            func.sum(RenderRollup.render_seconds),
+        )
+        .where(
+            RenderRollup.period == "day",
+            RenderRollup.license_key == license_key,
+            RenderRollup.bucket >= since,
+        )
+        .group_by(RenderRollup.license_key, RenderRollup.scene)
+        .order_by(func.sum(RenderRollup.finished).desc())
+    )
+    rows = result.all()
+    return {
+        "days": days,
+        "started": sum(row[2] for row in rows),
+        "finished": sum(row[3] for row in rows),
+        "hours": round(sum(row[4] or 0 for row in rows) / 3600, 1),
+        "scenes": _summary_rows(rows[:3]),
+    }
+
+
+async def admin_summary(
+    db: AsyncSession, days: int = 30, today: Optional[date] = None, top: int = 10
+) -> Dict[str, Any]:
+    """Daily totals over ``days`` days and the busiest scenes, from ``render_rollup``."""
+    today = today or datetime.utcnow().date()
+    since = (today - timedelta(days=days - 1)).isoformat()
+    in_range = (RenderRollup.period == "day", RenderRollup.bucket >= since)
+
+    result = await db.execute(
+        select(
+            RenderRollup.bucket,
+            func.sum(RenderRollup.started),
+            func.sum(RenderRollup.finished),
+            func.sum(RenderRollup.render_seconds),
+            func.count(RenderRollup.license_key.distinct()),
+        )
+        .where(*in_range)
+        .group_by(RenderRollup.bucket)
+        .order_by(RenderRollup.bucket.desc())
+    )
+    daily = [
+        {
+            "day": bucket,
+            "started": started,
+            "finished": finished,
+            "hours": round((seconds or 0) / 3600, 1),
+            "licenses": licenses,
+        }
+        for bucket, started, finished, seconds, licenses in result.all()
+    ]
+
+    result = await db.execute(
+        select(
+            RenderRollup.license_key,
+            RenderRollup.scene,
+            func.sum(RenderRollup.started),
+            func.sum(RenderRollup.finished),
+            func.sum(RenderRollup.render_seconds),
+        )
+        .where(*in_range)
+        .group_by(RenderRollup.license_key, RenderRollup.scene)
+        .order_by(func.sum(RenderRollup.finished).desc())
+        .limit(top)
+    )
+    return {"days": days, "daily": daily, "scenes": _summary_rows(result.all())}
+
+
+class RenderEventRecorder:
+    """Buffers render events in memory and maintains ``render_events`` in the background."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        flush_interval: float = RENDER_EVENTS_FLUSH_SECONDS,
+        max_buffer: int = RENDER_EVENTS_MAX_BUFFER,
+        rollup_interval: float = RENDER_ROLLUP_INTERVAL,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.rollup_interval = rollup_interval
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._tasks: list = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def record(
+        self,
+        license_key: str,
+        event: Optional[str],
+        scene: Optional[str] = None,
+        camera: Optional[str] = None,
+    ) -> None:
+        """Queue an event for the next batch insert (never touches the database)."""
+        if len(self._buffer) >= self.max_buffer * 2:
+            # Запись в БД не успевает — теряем событие, а не память процесса
+            self.dropped += 1
+            return
+        self._buffer.append(
+            {
+                "license_key": license_key,
+                "scene": scene,
+                "camera": camera,
+                "event": event or "log",
+                "created_at": datetime.utcnow(),
+            }
+        )
+        self.recorded += 1
+        if len(self._buffer) >= self.max_buffer and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write the buffered events with one ``INSERT``; returns how many were written."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(insert(RenderEvent), rows)
+                    await db.commit()
+            except Exception:
+                logging.exception("Не удалось записать %s событий рендера", len(rows))
+                # Вернём строки в буфер — запишем со следующей попыткой
+                self._buffer[:0] = rows[: self.max_buffer]
+                self.dropped += max(0, len(rows) - self.max_buffer)
+                return 0
+            self.written += len(rows)
+            return len(rows)
+
+    async def maintain(self) -> None:
+        """Roll up new events and prune expired ones."""
+        await self.flush()
+        async with self.session_factory() as db:
+            await rollup(db)
+            await prune(db)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._maintenance_loop()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "buffered": len(self._buffer),
+        }
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+            try:
+                await self.maintain()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Ошибка при сводке/очистке событий рендера")
+
+
+render_event_recorder = RenderEventRecorder()
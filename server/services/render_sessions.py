@@ -0,0 +1,228 @@
+"""Coalesce render notifications into one live-edited Telegram message per job.
+
+Events are grouped by ``(license_key, scene, camera)``.  The first event of a
+job sends a message; later events only mark the session dirty and are folded
+into an ``editMessageText`` call issued at most once per
+``RENDER_EDIT_INTERVAL_SECONDS``.  A session that sees no events for
+``RENDER_SESSION_IDLE_SECONDS`` gets a final edit and is dropped.
+
+Every call waits for a slot of the outbox worker, so live messages share the
+global and per-chat limits with queued notifications.  If the final
+"finished" update cannot reach Telegram, it is handed to the outbox instead of
+being lost.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+RENDER_EDIT_INTERVAL = float(os.getenv("RENDER_EDIT_INTERVAL_SECONDS", "10"))
+RENDER_SESSION_IDLE = float(os.getenv("RENDER_SESSION_IDLE_SECONDS", "300"))
+
+_SCENE_RE = re.compile(r"Scene:\s*(.+)")
+_VIEW_RE = re.compile(r"View:\s*(.+)")
+
+
+def parse_render_log(log: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Extract ``(event, scene, camera)`` from the text sent by ``ui_interface.ms``."""
+    event = None
+    if "Render started" in log:
+        event = "start"
+    elif "Render finished" in log:
+        event = "end"
+    scene = _SCENE_RE.search(log)
+    camera = _VIEW_RE.search(log)
+    return (
+        event,
+        scene.group(1).strip() if scene else None,
+        camera.group(1).strip() if camera else None,
+    )
+
+
+@dataclass
+class RenderSession:
+    chat_id: int
+    license_key: str
+    scene: str
+    camera: str
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    frames_started: int = 0
+    frames_done: int = 0
+    message_id: Optional[int] = None
+    last_edit_at: float = 0.0
+    dirty: bool = True
+    finished: bool = False
+    api_calls: int = 0
+    flush_task: Optional[asyncio.Task] = None
+    idle_task: Optional[asyncio.Task] = None
+
+    def render_text(self) -> str:
+        elapsed = int((datetime.utcnow() - self.started_at).total_seconds())
+        hours, rest = divmod(elapsed, 3600)
+        minutes, seconds = divmod(rest, 60)
+        header = "🏁 Render finished" if self.finished else "🎬 Rendering"
+        return (
+            f"{header}\n"
+            f"🗜 Scene: {self.scene}\n"
+            f"📷 View: {self.camera}\n"
+            f"🖼 Frames done: {self.frames_done} (started {self.frames_started})\n"
+            f"⏱ Elapsed: {hours:02d}:{minutes:02d}:{seconds:02d}"
+        )
+
+
+class RenderSessionAggregator:
+    """In-process registry of live render jobs and their Telegram messages."""
+
+    def __init__(
+        self,
+        bot=None,
+        rate_limiter=None,
+        edit_interval: float = RENDER_EDIT_INTERVAL,
+        idle_timeout: float = RENDER_SESSION_IDLE,
+    ):
+        self._bot = bot
+        self._rate_limiter = rate_limiter
+        self.edit_interval = edit_interval
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[Tuple[str, str, str], RenderSession] = {}
+        self.events = 0
+        self.api_calls = 0
+        self.jobs = 0
+
+    @property
+    def bot(self):
+        if self._bot is None:
+            from telegram_bot.notify import get_bot
+
+            self._bot = get_bot()
+        return self._bot
+
+    async def _acquire(self, chat_id: int) -> None:
+        if self._rate_limiter is None:
+            from telegram_bot.outbox import notification_worker
+
+            self._rate_limiter = notification_worker
+        await self._rate_limiter.acquire_chat_slot(chat_id)
+
+    def record(
+        self, chat_id: int, license_key: str, scene: str, camera: str, event: str
+    ) -> RenderSession:
+        """Register a render event; Telegram calls happen in the background."""
+        key = (license_key, scene, camera)
+        session = self.sessions.get(key)
+        if session is None or session.finished:
+            session = RenderSession(
+                chat_id=chat_id, license_key=license_key, scene=scene, camera=camera
+            )
+            self.sessions[key] = session
+            self.jobs += 1
+
+        self.events += 1
+        if event == "start":
+            session.frames_started += 1
+        elif event == "end":
+            session.frames_done += 1
+            session.frames_started = max(session.frames_started, session.frames_done)
+        session.dirty = True
+
+        if session.flush_task is None or session.flush_task.done():
+            delay = 0.0
+            if session.message_id is not None:
+                delay = max(0.0, session.last_edit_at + self.edit_interval - time.monotonic())
+            session.flush_task = asyncio.create_task(self._flush_later(session, delay))
+
+        if session.idle_task is not None:
+            session.idle_task.cancel()
+        session.idle_task = asyncio.create_task(self._expire_later(key, session))
+        return session
+
+    async def _flush_later(self, session: RenderSession, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            await self._flush(session)
+        except Exception:
+            logging.exception(
+                "Не удалось обновить сообщение о рендере (license_key=%s)", session.license_key
+            )
+
+    async def _flush(self, session: RenderSession) -> None:
+        if not session.dirty:
+            return
+        session.dirty = False
+        text = session.render_text()
+        await self._acquire(session.chat_id)
+        try:
+            if session.message_id is None:
+                message = await self.bot.send_message(chat_id=session.chat_id, text=text)
+                session.message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(
+                    chat_id=session.chat_id, message_id=session.message_id, text=text
+                )
+        except RetryAfter as exc:
+            # Не теряем обновление: переносим его на следующий проход
+            session.dirty = True
+            retry = exc.retry_after
+            retry = retry.total_seconds() if hasattr(retry, "total_seconds") else float(retry)
+            if self._rate_limiter is not None and hasattr(self._rate_limiter, "pause"):
+                self._rate_limiter.pause(retry)
+            session.flush_task = asyncio.create_task(self._flush_later(session, retry))
+            return
+        except BadRequest as exc:
+            if "not modified" not in str(exc).lower():
+                # Сообщение удалено пользователем — начнём новое
+                logging.info("Render message edit failed (%s); sending a new one", exc)
+                session.message_id = None
+                session.dirty = True
+        except NetworkError as exc:
+            # При таймауте сообщение могло дойти — повтор через outbox дал бы дубль
+            if not session.finished or isinstance(exc, TimedOut):
+                raise
+            logging.warning("Итог рендера не отправлен (%s); ставим его в outbox", exc)
+            from telegram_bot.notify import queue_telegram_messages
+
+            await queue_telegram_messages([(session.chat_id, text)])
+        finally:
+            session.api_calls += 1
+            self.api_calls += 1
+            session.last_edit_at = time.monotonic()
+
+        if session.dirty:
+            session.flush_task = asyncio.create_task(
+                self._flush_later(session, self.edit_interval)
+            )
+
+    async def _expire_later(self, key, session: RenderSession) -> None:
+        await asyncio.sleep(self.idle_timeout)
+        session.finished = True
+        session.dirty = True
+        # Не отменяем идущую отправку: потеряли бы message_id и прислали второе сообщение.
+        # Ждём её (и её перенос после RetryAfter) — она уже отправит итоговый текст
+        while session.flush_task is not None and not session.flush_task.done():
+            await asyncio.wait({session.flush_task})
+        try:
+            await self._flush(session)
+        except Exception:
+            logging.exception("Не удалось завершить сообщение о рендере")
+        if self.sessions.get(key) is session:
+            del self.sessions[key]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active_sessions": len(self.sessions),
+            "jobs": self.jobs,
+            "events": self.events,
+            "bot_api_calls": self.api_calls,
+            "calls_per_event": round(self.api_calls / self.events, 4) if self.events else 0.0,
+        }
+
+
+render_sessions = RenderSessionAggregator()
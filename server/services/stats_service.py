@@ -0,0 +1,132 @@
+"""Admin statistics read from the ``stats_rollup`` table.
+
+The page reads a few dozen pre-aggregated rows instead of running
+``GROUP BY`` over licenses, users and payments.  :func:`rebuild` recomputes
+every metric from the source tables (used by ``server.db.rebuild_stats`` and
+after bulk imports that bypass the triggers).
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.db.dialect import day_bucket
+from server.models.license import License
+from server.models.payment import Payment
+from server.models.stats_rollup import StatsRollup
+from server.models.user import User
+
+STATS_DAYS = 30
+
+
+def _day(column):
+    return day_bucket(column)
+
+
+def _rebuild_queries():
+    zero = literal(0)
+    paid_day = _day(func.coalesce(Payment.paid_at, Payment.created_at))
+    status = case((License.is_active.is_(True), "licenses_active"), else_="licenses_inactive")
+    referred = User.referred_by_id.is_not(None)
+    return [
+        select(status, literal(""), func.count(), zero).group_by(status),
+        select(
+            literal("licenses_expiring"), _day(License.next_charge_at), func.count(), zero
+        )
+        .where(License.is_active.is_(True), License.next_charge_at.is_not(None))
+        .group_by(_day(License.next_charge_at)),
+        select(literal("users_new"), _day(User.created_at), func.count(), zero)
+        .where(User.created_at.is_not(None))
+        .group_by(_day(User.created_at)),
+        select(literal("referrals"), literal(""), func.count(), zero).where(referred),
+        select(literal("referrals_converted"), literal(""), func.count(), zero).where(
+            referred, User.referral_bonus_claimed.is_(True)
+        ),
+        select(
+            literal("payments_succeeded"),
+            paid_day,
+            func.count(),
+            func.coalesce(func.sum(Payment.amount_value), 0),
+        )
+        .where(Payment.status == "succeeded")
+        .group_by(paid_day),
+    ]
+
+
+async def rebuild(db: AsyncSession) -> int:
+    """Replace the rollup with freshly aggregated rows; returns the row count."""
+    await db.execute(delete(StatsRollup))
+    columns = ["metric", "bucket", "value", "amount"]
+    for query in _rebuild_queries():
+        await db.execute(insert(StatsRollup).from_select(columns, query))
+    await db.commit()
+    result = await db.execute(select(func.count()).select_from(StatsRollup))
+    return result.scalar_one()
+
+
+def _days(start: date, count: int) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range(count)]
+
+
+async def get_dashboard(db: AsyncSession, today: Optional[date] = None) -> Dict[str, Any]:
+    """Everything the statistics page shows, from a single query on ``stats_rollup``."""
+    today = today or datetime.utcnow().date()
+    past = _days(today - timedelta(days=STATS_DAYS - 1), STATS_DAYS)
+    upcoming = _days(today, STATS_DAYS)
+
+    result = await db.execute(
+        select(StatsRollup.metric, StatsRollup.bucket, StatsRollup.value, StatsRollup.amount)
+        .where(
+            or_(
+                StatsRollup.bucket == "",
+                and_(
+                    StatsRollup.metric == "licenses_expiring",
+                    StatsRollup.bucket.between(upcoming[0], upcoming[-1]),
+                ),
+                and_(
+                    StatsRollup.metric.in_(("users_new", "payments_succeeded")),
+                    StatsRollup.bucket.between(past[0], past[-1]),
+                ),
+            )
+        )
+    )
+    rows: Dict[str, Dict[str, tuple]] = {}
+    for metric, bucket, value, amount in result.all():
+        rows.setdefault(metric, {})[bucket] = (value, Decimal(str(amount or 0)))
+
+    def total(metric: str) -> int:
+        return rows.get(metric, {}).get("", (0, 0))[0]
+
+    def on(metric: str, day: str) -> tuple:
+        return rows.get(metric, {}).get(day, (0, Decimal("0")))
+
+    daily = []
+    for day in reversed(past):
+        payments, revenue = on("payments_succeeded", day)
+        daily.append(
+            {
+                "day": day,
+                "new_users": on("users_new", day)[0],
+                "payments": payments,
+                "revenue": revenue,
+            }
+        )
+
+    referrals = total("referrals")
+    converted = total("referrals_converted")
+    return {
+        "licenses_active": total("licenses_active"),
+        "licenses_inactive": total("licenses_inactive"),
+        "expiring": [
+            {"day": day, "licenses": on("licenses_expiring", day)[0]} for day in upcoming
+        ],
+        "daily": daily,
+        "payments_total": sum(row["payments"] for row in daily),
+        "revenue_total": sum((row["revenue"] for row in daily), Decimal("0")),
+        "referrals": referrals,
+        "referrals_converted": converted,
+        "referral_conversion": round(converted / referrals * 100, 1) if referrals else 0.0,
+    }
@@ -1,5 +1,8 @@
 """Utility functions for working with :class:`User` via ``AsyncSession``."""
 
+import uuid
+from typing import Optional
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -18,3 +21,28 @@ async def create_user(db: AsyncSession, telegram_id: int):
     await db.commit()
     await db.refresh(user)
     return user
+
+
+async def ensure_user(db: AsyncSession, telegram_id: int, start_param: Optional[str] = None):
+    """Return the user with a referral code, creating it if needed; the caller commits.
+
+    ``start_param`` is the referral code from ``/start <code>`` and only
+    matters for a new user.
+    """
+    user = await get_user_by_telegram_id(db, telegram_id)
+    if user:
+        if not user.referral_code:
+            user.referral_code = str(uuid.uuid4())
+        return user
+
+    referred_by_id = None
+    if start_param:
+        result = await db.execute(select(User.id).filter_by(referral_code=start_param))
+        referred_by_id = result.scalar_one_or_none()
+    user = User(
+        telegram_id=telegram_id,
+        referral_code=str(uuid.uuid4()),
+        referred_by_id=referred_by_id,
+    )
+    db.add(user)
+    return user
@@ -0,0 +1,97 @@
+"""Asynchronous YooKassa API client with a pooled keep-alive connection.
+
+The official SDK is synchronous and would block the event loop for the whole
+HTTP round trip; this client talks to the REST API directly through
+``httpx.AsyncClient`` so other requests keep being served meanwhile.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT_SECONDS", "15"))
+YOOKASSA_CONNECT_TIMEOUT = float(os.getenv("YOOKASSA_CONNECT_TIMEOUT_SECONDS", "5"))
+YOOKASSA_MAX_CONNECTIONS = int(os.getenv("YOOKASSA_MAX_CONNECTIONS", "10"))
+
+
+class YooKassaError(Exception):
+    """Failed YooKassa API call; ``status_code`` is ``None`` when no response arrived."""
+
+    def __init__(self, status_code: Optional[int], body: str):
+        if status_code is None:
+            super().__init__(f"YooKassa API request failed: {body}")
+        else:
+            super().__init__(f"YooKassa API returned {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class YooKassaConfigError(RuntimeError):
+    """YooKassa credentials are not configured, so no payment can be created."""
+
+
+class YooKassaClient:
+    def __init__(
+        self,
+        shop_id: str,
+        secret_key: str,
+        base_url: str = YOOKASSA_API_URL,
+        timeout: float = YOOKASSA_TIMEOUT,
+        connect_timeout: float = YOOKASSA_CONNECT_TIMEOUT,
+        max_connections: int = YOOKASSA_MAX_CONNECTIONS,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            auth=(shop_id, secret_key),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def create_payment(
+        self, params: Dict[str, Any], idempotence_key: str
+    ) -> Dict[str, Any]:
+        try:
+            response = await self._client.post(
+                "/payments", json=params, headers={"Idempotence-Key": idempotence_key}
+            )
+        except httpx.HTTPError as exc:
+            raise YooKassaError(None, repr(exc)) from exc
+        if response.status_code >= 400:
+            raise YooKassaError(response.status_code, response.text)
+        try:
+            return response.json()
+        except ValueError as exc:
+            raise YooKassaError(response.status_code, response.text) from exc
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_client: Optional[YooKassaClient] = None
+
+
+def get_client() -> YooKassaClient:
+    """Shared client built from ``YOOKASSA_SHOP_ID``/``YOOKASSA_SECRET_KEY``."""
+    global _client
+    if _client is None:
+        shop_id = os.getenv("YOOKASSA_SHOP_ID")
+        secret_key = os.getenv("YOOKASSA_SECRET_KEY")
+        if not shop_id or not secret_key:
+            raise YooKassaConfigError(
+                "YOOKASSA credentials are not configured "
+                "(set YOOKASSA_SHOP_ID and YOOKASSA_SECRET_KEY)."
+            )
+        _client = YooKassaClient(shop_id, secret_key, base_url=YOOKASSA_API_URL)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,110 @@
+"""Long-lived HTTP client the bot uses to call the FastAPI service.
+
+One ``httpx.AsyncClient`` is created when the bot starts and closed when it
+stops, so button presses reuse pooled keep-alive connections instead of
+paying for a new TCP (and TLS) handshake each time.  Connection failures and
+``502/503/504`` answers are retried with a short backoff.  ``create_payment``
+sends one idempotence key for all of its attempts, so a retry after a lost
+answer gets the same YooKassa payment back.  It does not retry ``502``: that
+status means YooKassa itself failed or refused, and a repeat would not help.
+
+When the bot runs inside the FastAPI process (webhook or all-in-one mode),
+:class:`InProcessApi` takes its place and calls the same code directly,
+without the loopback HTTP round trip.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Collection, Dict, Optional
+from uuid import uuid4
+
+import httpx
+
+API_BASE = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
+BOT_API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT_SECONDS", "15"))
+BOT_API_CONNECT_TIMEOUT = float(os.getenv("BOT_API_CONNECT_TIMEOUT_SECONDS", "5"))
+BOT_API_MAX_CONNECTIONS = int(os.getenv("BOT_API_MAX_CONNECTIONS", "10"))
+BOT_API_RETRIES = int(os.getenv("BOT_API_RETRIES", "2"))
+
+RETRY_STATUSES = {502, 503, 504}
+# 502 от create_payment — ошибка ЮKassa, повтор её не исправит
+PAYMENT_RETRY_STATUSES = {503, 504}
+RETRY_BACKOFF = 0.2
+
+
+class ApiClient:
+    def __init__(
+        self,
+        base_url: str = API_BASE,
+        timeout: float = BOT_API_TIMEOUT,
+        connect_timeout: float = BOT_API_CONNECT_TIMEOUT,
+        max_connections: int = BOT_API_MAX_CONNECTIONS,
+        retries: int = BOT_API_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.retries = retries
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    async def post(
+        self,
+        path: str,
+        json: Dict[str, Any],
+        retry_statuses: Collection[int] = RETRY_STATUSES,
+    ) -> httpx.Response:
+        """POST with retries on connection errors and ``retry_statuses``."""
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self._client.post(path, json=json)
+            except httpx.TransportError as exc:
+                if last:
+                    raise
+                logging.warning("API %s недоступен (%s), повтор %s", path, exc, attempt + 1)
+            else:
+                if response.status_code not in retry_statuses or last:
+                    return response
+                logging.warning(
+                    "API %s ответил %s, повтор %s", path, response.status_code, attempt + 1
+                )
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    async def create_payment(self, telegram_id: int) -> httpx.Response:
+        # Один ключ на все попытки: повтор не создаст в ЮKassa второй платёж
+        return await self.post(
+            "/api/create_payment",
+            {"telegram_id": telegram_id, "idempotence_key": str(uuid4())},
+            retry_statuses=PAYMENT_RETRY_STATUSES,
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class InProcessApi:
+    """:class:`ApiClient` interface for a bot hosted by the FastAPI process itself."""
+
+    async def create_payment(self, telegram_id: int) -> httpx.Response:
+        # Импорт здесь: отдельному процессу бота роутеры API не нужны
+        from server.api.payment_router import create_payment_link
+        from server.services.yookassa_client import YooKassaConfigError, YooKassaError
+
+        # Те же статусы, что у POST /api/create_payment
+        try:
+            data = await create_payment_link(telegram_id)
+        except YooKassaConfigError as exc:
+            return httpx.Response(503, json={"detail": str(exc)})
+        except YooKassaError as exc:
+            return httpx.Response(502, json={"detail": f"YooKassa error: {exc}"})
+        return httpx.Response(200, json=data)
+
+    async def aclose(self) -> None:
+        pass
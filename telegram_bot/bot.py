@@ -1,13 +1,12 @@
 import os
 import asyncio
-import uuid
 import datetime
-import httpx
-from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
@@ -15,9 +14,14 @@ from telegram.ext import (
 )
 
 from server.db.session import SessionLocal
+from server.db.write_coalescer import write_coalescer
 from sqlalchemy import select
 from server.models.user import User
 from server.models.license import License
+from server.services import lease_service, license_cache, render_events, user_service
+from telegram_bot.api_client import ApiClient
+from telegram_bot.concurrency import BOT_CONCURRENT_UPDATES, PerUserUpdateProcessor
+from telegram_bot.media import LOGO_PATH, edit_screen, media_cache
 from server.services.referral_service import (
     get_referrals_and_bonus_days,
     claim_referral_bonuses,
@@ -27,9 +31,6 @@ from server.services.referral_service import (
 
 load_dotenv()
 
-API_BASE = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
-
-
 def _load_bot_token() -> str:
     """Load and validate Telegram bot token from environment or .env.
 
@@ -59,60 +60,60 @@ def _load_bot_token() -> str:
 
 
 TOKEN = _load_bot_token()
+# Если задан, обновления приходят вебхуком в FastAPI (telegram_bot/webhook.py)
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+# Бот внутри процесса API даже без вебхука (long polling, один воркер uvicorn)
+BOT_IN_PROCESS = os.getenv("BOT_IN_PROCESS", "0") == "1"
 ADMIN_ID = 670562262
 
 
+MAIN_MENU_TEXT = "Добро пожаловать! Выберите действие:"
+
+
+def main_menu_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton("🎫 Подписка/Лицензия", callback_data="licenses_menu")],
+            [InlineKeyboardButton("👥 Пригласить друга", callback_data="invite_friend")],
+            [InlineKeyboardButton("📊 Реферальная статистика", callback_data="referral_stats")],
+            [InlineKeyboardButton("🎬 Мои рендеры", callback_data="render_stats")],
+        ]
+    )
+
+
 async def send_main_menu(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
-    keyboard = [
-        [InlineKeyboardButton("🎫 Подписка/Лицензия", callback_data="licenses_menu")],
-        [InlineKeyboardButton("👥 Пригласить друга", callback_data="invite_friend")],
-        [InlineKeyboardButton("📊 Реферальная статистика", callback_data="referral_stats")],
-    ]
-
-    # Пытаемся отправить логотип, если есть локальный файл
-    logo_path = Path(__file__).resolve().parent / "assets" / "logo.png"
-    if logo_path.exists():
-        logo_bytes = await asyncio.to_thread(logo_path.read_bytes)
-        await context.bot.send_photo(
-            chat_id=user_id,
-            photo=logo_bytes,
-            caption="Добро пожаловать! Выберите действие:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+    # Логотип загружается один раз, дальше уходит по file_id
+    if LOGO_PATH.exists():
+        await media_cache.send_photo(
+            context.bot,
+            user_id,
+            LOGO_PATH,
+            caption=MAIN_MENU_TEXT,
+            reply_markup=main_menu_markup(),
         )
     else:
         await context.bot.send_message(
             chat_id=user_id,
-            text="Добро пожаловать! Выберите действие:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            text=MAIN_MENU_TEXT,
+            reply_markup=main_menu_markup(),
         )
 
 
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """«⬅️ Назад»: возвращает главное меню в том же сообщении."""
+    query = update.callback_query
+    await query.answer()
+    await edit_screen(query, MAIN_MENU_TEXT, reply_markup=main_menu_markup())
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     tg_id = update.effective_user.id
     start_param = context.args[0] if context.args else None
 
-    async with SessionLocal() as db:
-        result = await db.execute(select(User).filter_by(telegram_id=tg_id))
-        user = result.scalars().first()
-        if not user:
-            referred_by_id = None
-            if start_param:
-                result = await db.execute(
-                    select(User).filter_by(referral_code=start_param)
-                )
-                referrer = result.scalars().first()
-                if referrer:
-                    referred_by_id = referrer.id
-            user = User(
-                telegram_id=tg_id,
-                referral_code=str(uuid.uuid4()),
-                referred_by_id=referred_by_id,
-            )
-            db.add(user)
-            await db.commit()
-        elif not user.referral_code:
-            user.referral_code = str(uuid.uuid4())
-            await db.commit()
+    # Запись идёт через групповой коммит: всплеск /start — одна транзакция
+    await write_coalescer.submit(
+        lambda db: user_service.ensure_user(db, tg_id, start_param)
+    )
 
     await send_main_menu(tg_id, context)
 
@@ -148,8 +149,8 @@ async def show_licenses_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         kb.append([InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")])
 
-        await query.edit_message_text(
-            msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb)
+        await edit_screen(
+            query, msg, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(kb)
         )
 
 
@@ -157,20 +158,12 @@ async def invite_friend(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     query = update.callback_query
     await query.answer()
     tg_id = update.effective_user.id
-    async with SessionLocal() as db:
-        result = await db.execute(select(User).filter_by(telegram_id=tg_id))
-        user = result.scalars().first()
-        if user and not user.referral_code:
-            user.referral_code = str(uuid.uuid4())
-            await db.commit()
-        elif not user:
-            user = User(telegram_id=tg_id, referral_code=str(uuid.uuid4()))
-            db.add(user)
-            await db.commit()
-        bot_username = (await context.bot.get_me()).username
-        link = f"https://t.me/{bot_username}?start={user.referral_code}"
+    user = await write_coalescer.submit(lambda db: user_service.ensure_user(db, tg_id))
+    # username известен после initialize() — без лишнего getMe на каждое нажатие
+    link = f"https://t.me/{context.bot.username}?start={user.referral_code}"
 
-    await query.edit_message_text(
+    await edit_screen(
+        query,
         f"Поделитесь этой ссылкой, чтобы получить бонусные дни:\n{link}",
         reply_markup=InlineKeyboardMarkup(
             [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
@@ -187,23 +180,66 @@ async def show_referrals(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     async with SessionLocal() as db:
         result = await db.execute(select(User).filter_by(telegram_id=tg_id))
         user = result.scalars().first()
-        referrals, bonus_days_available, total_bonus_days = ([], 0, 0)
+        referrals, bonus_days_available, total_bonus_days = (0, 0, 0)
         if user:
             referrals, bonus_days_available, total_bonus_days = await get_referrals_and_bonus_days(
                 db, user
             )
 
     msg = (
-        f"Количество приглашённых: {len(referrals)}\n"
+        f"Количество приглашённых: {referrals}\n"
         f"Начислено бонусных дней за всё время: {total_bonus_days}"
     )
     if not referrals:
         msg += "\n\nПока нет приглашённых пользователей."
 
-    keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
-    await (update.message or update.callback_query.message).reply_text(
-        msg, reply_markup=InlineKeyboardMarkup(keyboard)
+    keyboard = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
     )
+    if query:
+        await edit_screen(query, msg, reply_markup=keyboard)
+    else:
+        await update.message.reply_text(msg, reply_markup=keyboard)
+
+
+async def show_renders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    if query:
+        await query.answer()
+
+    tg_id = update.effective_user.id
+    summary = None
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(License.license_key).join(User).filter(User.telegram_id == tg_id)
+        )
+        license_key = result.scalars().first()
+        if license_key:
+            # Читаем только суточные сводки, сырые события не трогаем
+            summary = await render_events.user_summary(db, license_key)
+
+    if not summary or not summary["started"] and not summary["finished"]:
+        msg = "За последние 7 дней рендеров не было."
+    else:
+        msg = (
+            f"🎬 Рендеры за {summary['days']} дней\n"
+            f"Запущено: {summary['started']}\n"
+            f"Завершено: {summary['finished']}\n"
+            f"Часов рендера: {summary['hours']}"
+        )
+        if summary["scenes"]:
+            msg += "\n\nСамые активные сцены:\n" + "\n".join(
+                f"• {row['scene']} — {row['finished']} ({row['hours']} ч)"
+                for row in summary["scenes"]
+            )
+
+    keyboard = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
+    )
+    if query:
+        await edit_screen(query, msg, reply_markup=keyboard)
+    else:
+        await update.message.reply_text(msg, reply_markup=keyboard)
 
 
 async def claim_referral_bonus(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -214,7 +250,7 @@ async def claim_referral_bonus(update: Update, context: ContextTypes.DEFAULT_TYP
         result = await db.execute(select(User).filter_by(telegram_id=tg_id))
         user = result.scalars().first()
         if not user:
-            await query.edit_message_text("Пользователь не найден.")
+            await edit_screen(query, "Пользователь не найден.")
             return
         count = await claim_referral_bonuses(db, user)
     if count:
@@ -222,7 +258,7 @@ async def claim_referral_bonus(update: Update, context: ContextTypes.DEFAULT_TYP
     else:
         text = "Нет бонусов к получению."
     kb = [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb))
+    await edit_screen(query, text, reply_markup=InlineKeyboardMarkup(kb))
 
 
 async def subscribe_license(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -234,14 +270,12 @@ async def subscribe_license(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     try:
         # Обращаемся к нашему FastAPI-эндпоинту, который создаёт платёж в ЮKassa
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(
-                f"{API_BASE}/api/create_payment",
-                json={"telegram_id": tg_id},
-            )
+        # Общий клиент из main(): соединение с API уже открыто
+        resp = await context.bot_data["api"].create_payment(tg_id)
 
         if resp.status_code != 200:
-            await query.edit_message_text(
+            await edit_screen(
+                query,
                 "❌ Не удалось создать платёж. Попробуйте позже."
             )
             return
@@ -250,7 +284,8 @@ async def subscribe_license(update: Update, context: ContextTypes.DEFAULT_TYPE)
         confirmation_url = data.get("confirmation_url")
 
         if not confirmation_url:
-            await query.edit_message_text(
+            await edit_screen(
+                query,
                 "⚠️ Сервер не вернул ссылку на оплату. Попробуйте позже."
             )
             return
@@ -263,14 +298,16 @@ async def subscribe_license(update: Update, context: ContextTypes.DEFAULT_TYPE)
             ]
         )
 
-        await query.edit_message_text(
+        await edit_screen(
+            query,
             "Чтобы оформить подписку, нажмите кнопку ниже и завершите оплату:",
             reply_markup=kb,
         )
 
     except Exception as e:
         # Можно залогировать e
-        await query.edit_message_text(
+        await edit_screen(
+            query,
             "⚠️ Произошла ошибка при создании платежа. Попробуйте позже."
         )
 
@@ -291,10 +328,14 @@ async def cancel_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE
                 lic.subscription_id = None
             lic.is_active = False
             lic.next_charge_at = None
+            await lease_service.revoke(db, lic.license_key)
             await db.commit()
+            license_cache.invalidate(lic.license_key)
 
-    await query.edit_message_text("❌ Подписка отменена.")
-    await send_main_menu(tg_id, context)
+    # Одно редактирование вместо сообщения об отмене и нового меню
+    await edit_screen(
+        query, f"❌ Подписка отменена.\n\n{MAIN_MENU_TEXT}", reply_markup=main_menu_markup()
+    )
 
 
 async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -302,7 +343,7 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if command == "licenses_menu":
         return await show_licenses_menu(update, context)
     elif command == "back_to_main":
-        return await start(update, context)
+        return await show_main_menu(update, context)
     elif command == "subscribe_license":
         return await subscribe_license(update, context)
     elif command == "cancel_subscription":
@@ -313,19 +354,59 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return await show_referrals(update, context)
     elif command == "claim_referral_bonus":
         return await claim_referral_bonus(update, context)
-
-
-async def main() -> None:
-    app = ApplicationBuilder().token(TOKEN).build()
+    elif command == "render_stats":
+        return await show_renders(update, context)
+
+
+def build_application(
+    builder: Optional[ApplicationBuilder] = None,
+    concurrent_updates: int = BOT_CONCURRENT_UPDATES,
+    api=None,
+) -> Application:
+    """Application with all bot handlers; used by polling and by the FastAPI webhook."""
+    builder = builder or ApplicationBuilder().token(TOKEN)
+    if concurrent_updates > 1:
+        # Разные пользователи — параллельно, обновления одного — по очереди
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("referrals", show_referrals))
+    app.add_handler(CommandHandler("renders", show_renders))
     app.add_handler(CallbackQueryHandler(handle_buttons))
+    # ApiClient ходит в API по HTTP; внутри процесса API передаётся InProcessApi
+    app.bot_data["api"] = api or ApiClient()
+    return app
+
+
+async def close_application(app: Application) -> None:
+    if app.updater and app.updater.running:
+        await app.updater.stop()
+    if app.running:
+        await app.stop()
+    await app.shutdown()
+    await app.bot_data["api"].aclose()
+
+
+async def main() -> None:
+    if TELEGRAM_WEBHOOK_URL:
+        # start_polling удалил бы вебхук, и обновления перестали бы приходить в API
+        raise SystemExit(
+            "Задан TELEGRAM_WEBHOOK_URL: обновления принимает FastAPI на /telegram/webhook, "
+            "отдельный процесс бота не нужен."
+        )
+    if BOT_IN_PROCESS:
+        # Два процесса с getUpdates получают от Telegram ошибку Conflict
+        raise SystemExit("Задан BOT_IN_PROCESS=1: бот уже работает внутри API (make all-in-one).")
+    app = build_application()
 
     await app.initialize()
-    await app.start()
-    await app.updater.start_polling()
-    print("🤖 Бот запущен. Ожидаю команды...")
-    await asyncio.Event().wait()
+    try:
+        await app.start()
+        await app.updater.start_polling()
+        print(f"🤖 Бот @{app.bot.username} запущен. Ожидаю команды...")
+        await asyncio.Event().wait()
+    finally:
+        await close_application(app)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+"""Concurrent processing of bot updates, in order per user.
+
+By default an :class:`~telegram.ext.Application` handles one update at a
+time, so a slow handler (creating a payment, a heavy referral query) holds up
+every other user.  :class:`PerUserUpdateProcessor` lets updates of different
+users run in parallel while the updates of one user still run one after
+another, in the order they arrived.
+
+PTB admits up to ``BOT_MAX_PENDING_UPDATES`` updates at once.  Inside, an
+update first waits for its user's lock and only then takes one of the
+``BOT_CONCURRENT_UPDATES`` worker slots, so a user who taps a button many
+times queues behind themselves without occupying workers other users need.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "16"))
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "256"))
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """At most ``workers`` updates at a time, one at a time per ``effective_user``."""
+
+    def __init__(
+        self,
+        workers: int = BOT_CONCURRENT_UPDATES,
+        max_pending: int = BOT_MAX_PENDING_UPDATES,
+    ):
+        super().__init__(max(workers, max_pending))
+        self.workers = workers
+        self.busy = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        # user_id → (замок, сколько обновлений пользователя ждут или выполняются)
+        self._users: Dict[int, list] = {}
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.workers)
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self._slots is None:
+            await self.initialize()
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        entry = self._users.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # Замок asyncio.Lock честный (FIFO): обновления пользователя идут по порядку
+            async with entry[0], self._slots:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._users[user.id]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self.busy += 1
+        try:
+            await coroutine
+        finally:
+            self.busy -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "busy": self.busy, "users": len(self._users)}
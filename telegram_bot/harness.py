@@ -0,0 +1,185 @@
+"""Offline harness for the bot: recorded updates in, Bot API calls recorded out.
+
+:class:`RecordingRequest` stands in for the HTTP layer of
+:class:`telegram.Bot`: every Bot API call is answered locally with a
+plausible result (optionally after a simulated network delay) and recorded
+with a timestamp, so the real handlers run without a network or a token
+known to Telegram.  :func:`replay` posts
+updates to the FastAPI ``/telegram/webhook`` route and measures, per update,
+how long the route took to answer and how long it took until the bot made
+its first call back to that user (the "reply").
+"""
+
+import asyncio
+import copy
+import itertools
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from telegram.request import BaseRequest, RequestData
+
+from telegram_bot.webhook import SECRET_HEADER
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "RenderLicense",
+    "username": "render_license_bot",
+}
+
+# Служебные вызовы, которые не считаются ответом пользователю
+SERVICE_METHODS = {"getMe", "getWebhookInfo", "setWebhook", "deleteWebhook", "getUpdates"}
+
+
+class RecordingRequest(BaseRequest):
+    """Answers Bot API calls without Telegram and records them."""
+
+    def __init__(self, latency: float = 0):
+        # Задержка ответа, как у настоящего Bot API (сеть до Telegram)
+        self.latency = latency
+        self.calls: List[Tuple[float, str, Dict[str, Any]]] = []
+        # Обновления, которые отдаст следующий getUpdates (режим long polling)
+        self.pending_updates: List[Dict[str, Any]] = []
+        # URL последнего setWebhook — его вернёт getWebhookInfo (секрет Telegram не отдаёт)
+        self.webhook_url = ""
+        self._message_ids = itertools.count(1)
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def wait_reply(self, key: str) -> asyncio.Future:
+        """Future resolved at the first call addressed to ``key`` (chat id or callback query id)."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        return future
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        now = time.perf_counter()
+        self.calls.append((now, name, params))
+        if name not in SERVICE_METHODS:
+            for key in (params.get("chat_id"), params.get("callback_query_id")):
+                future = self._waiters.pop(str(key), None)
+                if future is not None and not future.done():
+                    future.set_result(now)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if name == "getUpdates":
+            updates, self.pending_updates = self.pending_updates, []
+            if not updates:
+                # Как долгий опрос Telegram: пустой ответ не сразу
+                await asyncio.sleep(0.05)
+            return 200, json.dumps({"ok": True, "result": updates}).encode()
+        return 200, json.dumps({"ok": True, "result": self._result(name, params)}).encode()
+
+    def _result(self, name: str, params: Dict[str, Any]) -> Any:
+        if name == "getMe":
+            return BOT_USER
+        if name == "getWebhookInfo":
+            return {
+                "url": self.webhook_url,
+                "has_custom_certificate": False,
+                "pending_update_count": 0,
+            }
+        if name == "setWebhook":
+            self.webhook_url = params.get("url", "")
+        elif name == "deleteWebhook":
+            self.webhook_url = ""
+        if not name.startswith(("send", "edit")):
+            return True
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+        }
+        if name == "sendPhoto":
+            message["photo"] = [
+                {"file_id": "logo-file-id", "file_unique_id": "logo", "width": 512, "height": 512}
+            ]
+            message["caption"] = params.get("caption")
+        else:
+            message["text"] = params.get("text") or params.get("caption") or ""
+        return message
+
+
+def for_user(update: Dict[str, Any], user_id: int, update_id: int) -> Dict[str, Any]:
+    """Copy of a recorded update re-addressed to ``user_id``."""
+    update = copy.deepcopy(update)
+    update["update_id"] = update_id
+    for kind in ("message", "callback_query"):
+        body = update.get(kind)
+        if not body:
+            continue
+        body["from"]["id"] = user_id
+        message = body if kind == "message" else body.get("message")
+        if message:
+            message["chat"]["id"] = user_id
+        if kind == "callback_query":
+            body["id"] = f"cq-{update_id}"
+    return update
+
+
+def reply_key(update: Dict[str, Any]) -> str:
+    if "callback_query" in update:
+        return update["callback_query"]["id"]
+    return str(update["message"]["chat"]["id"])
+
+
+async def replay(
+    app,
+    recorder: RecordingRequest,
+    updates: Iterable[Dict[str, Any]],
+    secret: str,
+    concurrency: int = 10,
+    reply_timeout: float = 30,
+) -> List[Tuple[float, float]]:
+    """POST ``updates`` to ``/telegram/webhook``; returns ``(accept, reply)`` seconds per update.
+
+    Updates are sent one at a time per user, users in parallel (at most
+    ``concurrency`` requests in flight).
+    """
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for update in updates:
+        body = update.get("message") or update.get("callback_query")
+        by_user.setdefault(str(body["from"]["id"]), []).append(update)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: List[Tuple[float, float]] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bot.test") as client:
+
+        async def user_session(user_updates):
+            for update in user_updates:
+                async with semaphore:
+                    reply = recorder.wait_reply(reply_key(update))
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/telegram/webhook", json=update, headers={SECRET_HEADER: secret}
+                    )
+                    response.raise_for_status()
+                    accepted = time.perf_counter()
+                replied = await asyncio.wait_for(reply, reply_timeout)
+                timings.append((accepted - started, replied - started))
+
+        await asyncio.gather(*(user_session(u) for u in by_user.values()))
+    return timings
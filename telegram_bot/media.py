@@ -0,0 +1,113 @@
+"""Reuse of uploaded Telegram media and in-place menu screens.
+
+The first time a local file is sent, Telegram stores it and returns a
+``file_id``; sending that id afterwards costs no upload.  :class:`MediaCache`
+keeps the ids in memory and in the ``telegram_media`` table, so restarts and
+other bot processes reuse them too.  The key includes the bot id and a hash
+of the file, so a new token or a changed logo is uploaded once more.
+
+Menus are edited in place with :func:`edit_screen` instead of sending a new
+message per button press.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from telegram import Bot, CallbackQuery, Message
+from telegram.error import BadRequest
+
+from server.db.session import SessionLocal
+from server.db.write_coalescer import write_coalescer
+from server.models.telegram_media import TelegramMedia
+
+# Логотип главного меню лежит в assets/ в корне репозитория
+LOGO_PATH = Path(
+    os.getenv("BOT_LOGO_PATH", Path(__file__).resolve().parents[1] / "assets" / "logo.png")
+)
+
+
+class MediaCache:
+    """``file_id`` of local files already uploaded to Telegram."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or SessionLocal
+        self.uploads = 0
+        self.reused = 0
+        self._file_ids: Dict[str, str] = {}
+        # путь → (размер, mtime, sha256), чтобы не читать файл на каждое нажатие
+        self._digests: Dict[Path, Tuple[int, int, str]] = {}
+
+    async def key(self, bot: Bot, path: Path) -> str:
+        stat = path.stat()
+        cached = self._digests.get(path)
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            data = await asyncio.to_thread(path.read_bytes)
+            cached = (stat.st_size, stat.st_mtime_ns, hashlib.sha256(data).hexdigest()[:32])
+            self._digests[path] = cached
+        # id бота — часть токена до двоеточия, get_me не нужен
+        return f"{bot.token.split(':')[0]}:{path.name}:{cached[2]}"
+
+    async def get(self, key: str) -> Optional[str]:
+        if key not in self._file_ids:
+            async with self.session_factory() as db:
+                file_id = await db.scalar(
+                    select(TelegramMedia.file_id).where(TelegramMedia.key == key)
+                )
+            if file_id is None:
+                return None
+            self._file_ids[key] = file_id
+        return self._file_ids[key]
+
+    async def remember(self, key: str, file_id: str) -> None:
+        self._file_ids[key] = file_id
+
+        async def op(db):
+            await db.merge(TelegramMedia(key=key, file_id=file_id))
+
+        await write_coalescer.submit(op)
+
+    async def forget(self, key: str) -> None:
+        self._file_ids.pop(key, None)
+        await write_coalescer.submit(
+            lambda db: db.execute(delete(TelegramMedia).where(TelegramMedia.key == key))
+        )
+
+    async def send_photo(self, bot: Bot, chat_id: int, path: Path, **kwargs) -> Message:
+        """Send ``path`` as a photo, by ``file_id`` when it was uploaded before."""
+        key = await self.key(bot, path)
+        file_id = await self.get(key)
+        if file_id:
+            try:
+                message = await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+                self.reused += 1
+                return message
+            except BadRequest as exc:
+                # id стал недействительным — загрузим файл заново
+                logging.warning("Telegram отклонил file_id для %s: %s", path.name, exc)
+                await self.forget(key)
+
+        data = await asyncio.to_thread(path.read_bytes)
+        message = await bot.send_photo(chat_id=chat_id, photo=data, **kwargs)
+        self.uploads += 1
+        await self.remember(key, message.photo[-1].file_id)
+        return message
+
+    def stats(self) -> Dict[str, int]:
+        return {"uploads": self.uploads, "reused": self.reused}
+
+
+media_cache = MediaCache()
+
+
+async def edit_screen(query: CallbackQuery, text: str, **kwargs) -> None:
+    """Replace the current menu screen: the caption of a photo or the text of a message."""
+    if query.message is not None and query.message.photo:
+        # Фото остаётся прежним — меняем только подпись и кнопки
+        await query.edit_message_caption(caption=text, **kwargs)
+    else:
+        await query.edit_message_text(text, **kwargs)
@@ -1,7 +1,14 @@
 import os
+import asyncio
 import logging
+from typing import Iterable, Optional, Tuple
 from dotenv import load_dotenv
 from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from server.db.session import SessionLocal
+from server.models.outbox import TelegramOutbox
+from telegram_bot.concurrency import BOT_CONCURRENT_UPDATES
 
 load_dotenv()
 TOKEN = (
@@ -13,12 +20,58 @@ TOKEN = (
 if not TOKEN:
     raise RuntimeError("TELEGRAM_BOT_TOKEN не найден в .env или переменных окружения")
 
+# Количество параллельных отправителей в пуле воркеров
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "4"))
+
+# Будит воркер сразу после постановки сообщения в очередь (в этом же процессе);
+# событие создаёт запущенный NotificationWorker в своём event loop
+outbox_wakeup: Optional[asyncio.Event] = None
+
+_bot = None
+
+
+def get_bot() -> Bot:
+    """Общий keep-alive клиент Bot API: уведомления и бот, запущенный внутри API."""
+    global _bot
+    if _bot is None:
+        # Соединений хватает и воркерам outbox, и обработчикам бота в этом процессе
+        pool_size = NOTIFY_WORKERS + BOT_CONCURRENT_UPDATES + 4
+        _bot = Bot(token=TOKEN, request=HTTPXRequest(connection_pool_size=pool_size))
+    return _bot
+
 
 async def send_telegram_message(chat_id: int, text: str):
-    """Отправка сообщения в Telegram пользователю с заданным chat_id."""
+    """Ставит сообщение в очередь (outbox) на отправку пользователю с заданным chat_id.
+
+    Сама отправка выполняется фоновым воркером :mod:`telegram_bot.outbox`,
+    поэтому вызов не ждёт ответа Telegram.
+    """
+    try:
+        async with SessionLocal() as db:
+            db.add(TelegramOutbox(chat_id=chat_id, text=text))
+            await db.commit()
+        logging.info(f"Сообщение поставлено в очередь Telegram: chat_id={chat_id}")
+        if outbox_wakeup is not None:
+            outbox_wakeup.set()
+    except Exception:
+        logging.exception(f"Ошибка при постановке Telegram-сообщения в очередь для chat_id={chat_id}")
+
+
+async def queue_telegram_messages(messages: Iterable[Tuple[int, str]]) -> int:
+    """Ставит в очередь сразу несколько сообщений ``(chat_id, text)`` одной транзакцией.
+
+    Возвращает число поставленных сообщений (0 при ошибке записи).
+    """
+    rows = [TelegramOutbox(chat_id=chat_id, text=text) for chat_id, text in messages]
+    if not rows:
+        return 0
     try:
-        bot = Bot(token=TOKEN)
-        logging.info(f"Отправка сообщения в Telegram: chat_id={chat_id}, text={text}")
-        await bot.send_message(chat_id=chat_id, text=text)
+        async with SessionLocal() as db:
+            db.add_all(rows)
+            await db.commit()
     except Exception:
-        logging.exception(f"Ошибка при отправке Telegram-сообщения для chat_id={chat_id}")
+        logging.exception("Ошибка при постановке %s Telegram-сообщений в очередь", len(rows))
+        return 0
+    if outbox_wakeup is not None:
+        outbox_wakeup.set()
+    return len(rows)
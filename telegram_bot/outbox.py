@@ -0,0 +1,355 @@
+"""Background delivery of queued Telegram messages (the ``telegram_outbox`` table).
+
+A single dispatcher claims due rows and hands them to a small pool of
+workers that share one keep-alive :class:`telegram.Bot`.  Sends respect
+Telegram's global (~30 msg/s) and per-chat (~1 msg/s) limits; ``RetryAfter``
+pauses all sends and reschedules the message.  Rows stay in the database until
+delivered, so queued messages survive a restart.
+
+A chat is dispatched only while its oldest undelivered row is ``pending``: a
+row claimed by this or another process (``sending``) holds the chat's later
+messages back.  Rows left in ``sending`` by a crashed process are re-queued
+once they are ``NOTIFY_STALE_SECONDS`` old, checked on every such interval.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select, update
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter
+
+from server.db.session import SessionLocal
+from server.models.outbox import TelegramOutbox
+from telegram_bot import notify
+
+NOTIFY_GLOBAL_RATE = float(os.getenv("NOTIFY_GLOBAL_RATE", "30"))
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv("NOTIFY_PER_CHAT_INTERVAL", "1.0"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "0.5"))
+# Строки в статусе sending дольше этого времени считаются брошенными (падение процесса);
+# проверка повторяется с тем же интервалом
+NOTIFY_STALE_SECONDS = int(os.getenv("NOTIFY_STALE_SECONDS", "60"))
+
+_PERMANENT_ERRORS = (BadRequest, ChatMigrated, Forbidden, InvalidToken)
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class NotificationWorker:
+    """Drains ``telegram_outbox`` with a rate-limited pool of senders."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        bot=None,
+        workers: int = notify.NOTIFY_WORKERS,
+        global_rate: float = NOTIFY_GLOBAL_RATE,
+        per_chat_interval: float = NOTIFY_PER_CHAT_INTERVAL,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+        poll_interval: float = NOTIFY_POLL_INTERVAL,
+        stale_seconds: float = NOTIFY_STALE_SECONDS,
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.bot = bot
+        self.workers = workers
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self._latencies: deque = deque(maxlen=1000)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self._inflight_chats: set = set()
+        self._chat_next: Dict[int, float] = {}
+        self._next_global = 0.0
+        self._paused_until = 0.0
+        self._next_recover = 0.0
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        if self.bot is None:
+            self.bot = notify.get_bot()
+            try:
+                await self.bot.initialize()
+            except Exception:
+                logging.exception("Не удалось инициализировать Telegram Bot; повторим при отправке")
+        self._queue = asyncio.Queue()
+        self._rate_lock = asyncio.Lock()
+        self._wakeup = notify.outbox_wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._dispatch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if notify.outbox_wakeup is self._wakeup:
+            notify.outbox_wakeup = None
+
+        # Заявленные, но не отправленные строки возвращаем в очередь
+        unsent = []
+        while self._queue is not None and not self._queue.empty():
+            unsent.append(self._queue.get_nowait().id)
+        if unsent:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(TelegramOutbox)
+                    .where(TelegramOutbox.id.in_(unsent), TelegramOutbox.status == "sending")
+                    .values(status="pending", attempts=TelegramOutbox.attempts - 1)
+                )
+                await db.commit()
+        self._inflight_chats.clear()
+
+    async def _recover_stale(self) -> int:
+        threshold = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        stale = [
+            TelegramOutbox.status == "sending",
+            TelegramOutbox.claimed_at < threshold,
+        ]
+        if self._inflight_chats:
+            # Свои заявленные строки не трогаем: они ещё ждут лимита или отправляются
+            stale.append(TelegramOutbox.chat_id.notin_(self._inflight_chats))
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(TelegramOutbox).where(*stale).values(status="pending")
+            )
+            await db.commit()
+        if result.rowcount:
+            logging.warning("Возвращено в очередь брошенных сообщений: %s", result.rowcount)
+        return result.rowcount
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                if time.monotonic() >= self._next_recover:
+                    await self._recover_stale()
+                    self._next_recover = time.monotonic() + self.stale_seconds
+                claimed = await self._dispatch_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Ошибка при выборке очереди Telegram-сообщений")
+                claimed = 0
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_due(self) -> int:
+        capacity = self.workers * 2 - self._queue.qsize()
+        if capacity <= 0:
+            return 0
+
+        now = datetime.utcnow()
+        loop_now = time.monotonic()
+        # Самое старое недоставленное сообщение каждого чата. Чат берём в работу, только
+        # если оно ожидает и его время пришло: пока оно отложено (backoff, RetryAfter)
+        # или уже отправляется — здесь или в другом процессе, — более новые ждут
+        heads = (
+            select(func.min(TelegramOutbox.id))
+            .where(TelegramOutbox.status.in_(("pending", "sending")))
+            .group_by(TelegramOutbox.chat_id)
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(TelegramOutbox.id, TelegramOutbox.chat_id)
+                .where(
+                    TelegramOutbox.id.in_(heads),
+                    TelegramOutbox.status == "pending",
+                    TelegramOutbox.not_before <= now,
+                )
+                .order_by(TelegramOutbox.id)
+                .limit(capacity * 4)
+            )
+            picked = []
+            for row_id, chat_id in result.all():
+                # Не больше одного сообщения на чат за раз — так сохраняется порядок
+                blocked = (
+                    chat_id in self._inflight_chats
+                    or self._chat_next.get(chat_id, 0) > loop_now
+                )
+                if not blocked:
+                    picked.append(row_id)
+                    if len(picked) >= capacity:
+                        break
+            if not picked:
+                return 0
+
+            result = await db.execute(
+                update(TelegramOutbox)
+                .where(TelegramOutbox.id.in_(picked), TelegramOutbox.status == "pending")
+                .values(status="sending", claimed_at=now, attempts=TelegramOutbox.attempts + 1)
+                .returning(TelegramOutbox)
+            )
+            claimed = sorted(result.scalars().all(), key=lambda row: row.id)
+            await db.commit()
+
+        for row in claimed:
+            self._inflight_chats.add(row.chat_id)
+            self._queue.put_nowait(row)
+        return len(claimed)
+
+    async def acquire_slot(self) -> None:
+        """Wait for a slot under the global rate limit (shared with other senders)."""
+        if self._rate_lock is None:
+            self._rate_lock = asyncio.Lock()
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = max(self._next_global, self._paused_until) - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                now = time.monotonic()
+            self._next_global = now + 1 / self.global_rate
+
+    async def acquire_chat_slot(self, chat_id: int) -> None:
+        """Wait for ``chat_id``'s per-chat interval, then for a global slot.
+
+        For senders outside the outbox (live render messages): they share both
+        limits with queued deliveries, and the dispatcher holds the chat's
+        queued messages back for the same interval.
+        """
+        while True:
+            wait = self._chat_next.get(chat_id, 0) - time.monotonic()
+            if chat_id in self._inflight_chats:
+                wait = max(wait, self.per_chat_interval)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self._chat_next[chat_id] = time.monotonic() + self.per_chat_interval
+        await self.acquire_slot()
+
+    def pause(self, seconds: float) -> None:
+        """Suspend all sends after Telegram answered with ``RetryAfter``."""
+        self.retry_after += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _worker(self) -> None:
+        while True:
+            row = await self._queue.get()
+            try:
+                await self._deliver(row)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Ошибка воркера Telegram-уведомлений (outbox id=%s)", row.id)
+            finally:
+                self._inflight_chats.discard(row.chat_id)
+                self._chat_next[row.chat_id] = time.monotonic() + self.per_chat_interval
+                if len(self._chat_next) > 10_000:
+                    now = time.monotonic()
+                    self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+                self._queue.task_done()
+
+    async def _deliver(self, row: TelegramOutbox) -> None:
+        await self.acquire_slot()
+        try:
+            await self.bot.send_message(chat_id=row.chat_id, text=row.text)
+        except RetryAfter as exc:
+            delay = _seconds(exc.retry_after)
+            self.pause(delay)
+            logging.warning("Telegram RetryAfter %.1fs (outbox id=%s)", delay, row.id)
+            await self._reschedule(row, delay, str(exc), count_attempt=False)
+        except _PERMANENT_ERRORS as exc:
+            logging.warning("Telegram отклонил сообщение outbox id=%s: %s", row.id, exc)
+            await self._finish(row, "failed", str(exc))
+        except Exception as exc:
+            if row.attempts >= self.max_attempts:
+                logging.exception("Сообщение outbox id=%s не доставлено", row.id)
+                await self._finish(row, "failed", str(exc))
+            else:
+                await self._reschedule(row, 2 ** row.attempts, str(exc))
+        else:
+            await self._finish(row, "sent")
+
+    async def _reschedule(
+        self, row: TelegramOutbox, delay: float, error: str, count_attempt: bool = True
+    ) -> None:
+        values = {
+            "status": "pending",
+            "not_before": datetime.utcnow() + timedelta(seconds=delay),
+            "last_error": error,
+        }
+        if not count_attempt:
+            values["attempts"] = TelegramOutbox.attempts - 1
+        async with self.session_factory() as db:
+            await db.execute(
+                update(TelegramOutbox).where(TelegramOutbox.id == row.id).values(**values)
+            )
+            await db.commit()
+
+    async def _finish(self, row: TelegramOutbox, status: str, error: Optional[str] = None) -> None:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            await db.execute(
+                update(TelegramOutbox)
+                .where(TelegramOutbox.id == row.id)
+                .values(status=status, sent_at=now if status == "sent" else None, last_error=error)
+            )
+            await db.commit()
+        if status == "sent":
+            self.sent += 1
+            self._latencies.append((now - row.created_at).total_seconds())
+        else:
+            self.failed += 1
+
+    async def metrics(self) -> Dict[str, Any]:
+        """Queue depth from the database plus in-process send counters and latency."""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(TelegramOutbox.status, func.count())
+                .where(TelegramOutbox.status.in_(("pending", "sending")))
+                .group_by(TelegramOutbox.status)
+            )
+            by_status = dict(result.all())
+
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 1)
+
+        return {
+            "depth": by_status.get("pending", 0) + by_status.get("sending", 0),
+            "pending": by_status.get("pending", 0),
+            "in_flight": by_status.get("sending", 0),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "send_latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": percentile(1.0),
+                "samples": len(latencies),
+            },
+            "workers": self.workers,
+            "running": self.running,
+        }
+
+
+notification_worker = NotificationWorker()
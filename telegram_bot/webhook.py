@@ -0,0 +1,221 @@
+"""Webhook delivery of bot updates, hosted by the FastAPI app.
+
+With ``TELEGRAM_WEBHOOK_URL`` set, the FastAPI lifespan starts the bot's
+:class:`~telegram.ext.Application` without an updater and registers the URL
+with Telegram.  Telegram then POSTs every update to ``/telegram/webhook``
+along with ``TELEGRAM_WEBHOOK_SECRET`` in the
+``X-Telegram-Bot-Api-Secret-Token`` header.  The route checks the secret,
+puts the update on the application's queue and answers immediately, so a
+slow handler never holds Telegram's connection.
+
+The API must run as a single uvicorn worker.  Several pieces of state live
+in process memory: the license status cache, the per-user update locks that
+keep one user's updates in order, the outbox rate limits, live render
+sessions, and the render rollup, which must not run in two processes at
+once.  :meth:`TelegramWebhook.start` takes a host-wide lock file
+(``BOT_LOCK_FILE``), so a second worker refuses to start the bot instead of
+silently breaking per-user ordering.
+
+With ``BOT_IN_PROCESS=1`` and no webhook URL (``make all-in-one``) the same
+application fetches updates by long polling instead, in a single worker.
+Either way the bot shares the process's database engine and Bot API client
+(:func:`telegram_bot.notify.get_bot`) and creates payments in-process.
+"""
+
+import hmac
+import logging
+import os
+import tempfile
+from typing import IO, Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from telegram import Update
+from telegram.ext import Application
+
+from telegram_bot.api_client import InProcessApi
+from telegram_bot.bot import (
+    BOT_IN_PROCESS,
+    TELEGRAM_WEBHOOK_URL,
+    TOKEN,
+    build_application,
+    close_application,
+)
+from telegram_bot.notify import get_bot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+# Сколько соединений Telegram может держать к вебхуку одновременно
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+# Файл блокировки: бот работает только в одном процессе на машине
+BOT_LOCK_FILE = os.getenv(
+    "BOT_LOCK_FILE",
+    os.path.join(tempfile.gettempdir(), f"renderlicense-bot-{TOKEN.split(':')[0]}.lock"),
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+router = APIRouter()
+
+
+class _ProcessLock:
+    """Exclusive, non-blocking lock on a file; released by the OS if the process dies."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle: Optional[IO] = None
+
+    def acquire(self) -> bool:
+        if self._handle is not None:
+            return True
+        handle = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self) -> None:
+        handle, self._handle = self._handle, None
+        if handle is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        handle.close()
+
+
+class TelegramWebhook:
+    """Bot application hosted by the FastAPI process: fed by the webhook route or by polling."""
+
+    def __init__(
+        self,
+        url: str = TELEGRAM_WEBHOOK_URL,
+        secret: str = TELEGRAM_WEBHOOK_SECRET,
+        lock_file: str = BOT_LOCK_FILE,
+    ):
+        self.url = url
+        self.secret = secret
+        self._lock = _ProcessLock(lock_file)
+        self.application: Optional[Application] = None
+        self.polling = False
+        self.received = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    async def start(
+        self, application: Optional[Application] = None, polling: bool = False
+    ) -> None:
+        """Start the bot application; register the webhook ``url`` or, with ``polling``, poll."""
+        if self.enabled and not self.secret:
+            raise RuntimeError(
+                "TELEGRAM_WEBHOOK_SECRET не задан: без него на вебхук может писать кто угодно"
+            )
+        polling = polling and not self.enabled
+        if not self._lock.acquire():
+            raise RuntimeError(
+                f"Бот уже запущен в другом процессе ({self._lock.path}): "
+                "запускайте API одним воркером uvicorn, без --workers"
+            )
+        try:
+            await self._start(application, polling)
+        except BaseException:
+            self._lock.release()
+            raise
+
+    async def _start(self, application: Optional[Application], polling: bool) -> None:
+        if application is None:
+            # Тот же Bot API клиент, что у воркеров уведомлений
+            builder = Application.builder().bot(get_bot())
+            if not polling:
+                # Без updater: обновления приносит маршрут FastAPI, а не getUpdates
+                builder = builder.updater(None)
+            application = build_application(builder, api=InProcessApi())
+        await application.initialize()
+        await application.start()
+        self.application = application
+        self.polling = polling
+        if self.enabled:
+            await self._register()
+        elif polling:
+            await application.updater.start_polling()
+            logging.info("Бот @%s получает обновления long polling", application.bot.username)
+
+    async def stop(self) -> None:
+        application, self.application = self.application, None
+        self.polling = False
+        if application is not None:
+            await close_application(application)
+        self._lock.release()
+
+    async def feed(self, data: dict) -> None:
+        """Queue one update received from Telegram for the application's handlers."""
+        update = Update.de_json(data, self.application.bot)
+        self.received += 1
+        await self.application.update_queue.put(update)
+
+    def check_secret(self, token: Optional[str]) -> bool:
+        ok = bool(self.secret) and hmac.compare_digest(
+            (token or "").encode(), self.secret.encode()
+        )
+        if not ok:
+            self.rejected += 1
+        return ok
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.application is not None,
+            "mode": "polling" if self.polling else "webhook",
+            "received": self.received,
+            "rejected": self.rejected,
+            "queued": self.application.update_queue.qsize() if self.application else 0,
+        }
+
+    async def _register(self) -> None:
+        bot = self.application.bot
+        # Устанавливаем при каждом старте: getWebhookInfo не возвращает секрет, и по одному
+        # URL не понять, что сменились секрет или настройки; setWebhook идемпотентен
+        await bot.set_webhook(
+            url=self.url,
+            secret_token=self.secret,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+        )
+        logging.info("Вебхук Telegram установлен: %s", self.url)
+
+
+telegram_webhook = TelegramWebhook()
+
+
+@router.post("/telegram/webhook", include_in_schema=False)
+async def receive_update(request: Request):
+    if telegram_webhook.application is None or telegram_webhook.polling:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not telegram_webhook.check_secret(request.headers.get(SECRET_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON update")
+    await telegram_webhook.feed(data)
+    return Response(status_code=200)
+
+
+@router.get("/telegram/webhook/metrics")
+async def webhook_metrics():
+    return telegram_webhook.stats()
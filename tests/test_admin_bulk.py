@@ -0,0 +1,189 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.lease_revocation import LeaseRevocation
+from server.models.license import License
+from server.models.user import User
+from server.services.license_cache import license_status_cache
+
+NOW = datetime.datetime.utcnow().replace(microsecond=123456)
+
+
+class DummyRequest:
+    headers = {"accept": "application/json"}
+
+
+def load_admin_routes(monkeypatch):
+    class DummyTemplates:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def TemplateResponse(self, *args, **kwargs):
+            return None
+
+    monkeypatch.setattr("fastapi.templating.Jinja2Templates", DummyTemplates)
+    monkeypatch.setattr(
+        "fastapi.dependencies.utils.ensure_multipart_is_installed", lambda: None
+    )
+    import importlib
+
+    return importlib.import_module("server.admin.routes")
+
+
+def setup_test_db(monkeypatch, admin_routes):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", connect_args={"check_same_thread": False}
+    )
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            # lk0..lk9 истекают через 0..9 дней, у lk10 даты нет
+            for i in range(11):
+                user = User(telegram_id=100 + i)
+                db.add_all(
+                    [
+                        user,
+                        License(
+                            license_key=f"lk{i}",
+                            user=user,
+                            is_active=i % 2 == 0,
+                            next_charge_at=None
+                            if i == 10
+                            else NOW + datetime.timedelta(days=i, hours=1),
+                        ),
+                    ]
+                )
+            await db.commit()
+
+    asyncio.run(init_models())
+    monkeypatch.setattr(admin_routes, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(admin_routes, "ReadSessionLocal", TestingSessionLocal)
+    license_status_cache.clear()
+    return engine, TestingSessionLocal
+
+
+def load_dates(TestingSessionLocal):
+    async def load():
+        async with TestingSessionLocal() as db:
+            rows = (await db.execute(select(License))).scalars().all()
+        return {lic.license_key: lic for lic in rows}
+
+    return asyncio.run(load())
+
+
+def call_bulk(engine, admin_routes, action, **form):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+
+    form = {
+        "license_keys": "",
+        "status": "",
+        "q": "",
+        "expires_within_days": "",
+        "days": 30,
+        "apply_to_filter": False,
+        "all_licenses": False,
+        **form,
+    }
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = asyncio.run(admin_routes.bulk_action(DummyRequest(), action, **form))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return result, statements
+
+
+def test_bulk_extend_expiring_this_week_is_one_update(monkeypatch):
+    admin_routes = load_admin_routes(monkeypatch)
+    engine, TestingSessionLocal = setup_test_db(monkeypatch, admin_routes)
+    before = load_dates(TestingSessionLocal)
+    license_status_cache.set("lk3", {"status": "active"})
+
+    result, statements = call_bulk(
+        engine, admin_routes, "extend", expires_within_days="7", days=3, apply_to_filter=True
+    )
+
+    assert result == {"action": "extend", "affected": 7}
+    assert statements == ["UPDATE"]
+    after = load_dates(TestingSessionLocal)
+    for i in range(11):
+        key = f"lk{i}"
+        if i < 7:
+            shifted = before[key].next_charge_at + datetime.timedelta(days=3)
+            assert after[key].next_charge_at == shifted
+            assert after[key].valid_until == shifted
+            assert after[key].is_active
+        else:
+            assert after[key].next_charge_at == before[key].next_charge_at
+    assert license_status_cache.get("lk3") is None
+
+
+def test_bulk_reduce_and_delete_by_keys_and_filter(monkeypatch):
+    admin_routes = load_admin_routes(monkeypatch)
+    engine, TestingSessionLocal = setup_test_db(monkeypatch, admin_routes)
+    before = load_dates(TestingSessionLocal)
+
+    result, statements = call_bulk(
+        engine, admin_routes, "reduce", license_keys="lk1 lk2\nlk10", days=30
+    )
+    # lk10 без даты списания не трогаем
+    assert result["affected"] == 2
+    assert statements.count("UPDATE") == 1
+    after = load_dates(TestingSessionLocal)
+    assert after["lk1"].next_charge_at == before["lk1"].next_charge_at - datetime.timedelta(days=30)
+    assert after["lk10"].next_charge_at is None
+
+    result, statements = call_bulk(
+        engine, admin_routes, "delete", status="inactive", apply_to_filter=True
+    )
+    assert result["affected"] == 5
+    assert statements.count("DELETE") == 2  # чистка старых отзывов + сами лицензии
+    remaining = load_dates(TestingSessionLocal)
+    assert sorted(remaining) == sorted(f"lk{i}" for i in range(0, 11, 2))
+
+    async def revoked():
+        async with TestingSessionLocal() as db:
+            return sorted((await db.execute(select(LeaseRevocation.license_key))).scalars())
+
+    assert asyncio.run(revoked()) == sorted(["lk1", "lk2", "lk1", "lk3", "lk5", "lk7", "lk9"])
+
+
+def test_bulk_requires_selection(monkeypatch):
+    admin_routes = load_admin_routes(monkeypatch)
+    engine, TestingSessionLocal = setup_test_db(monkeypatch, admin_routes)
+    from fastapi import HTTPException
+
+    try:
+        call_bulk(engine, admin_routes, "delete")
+    except HTTPException as exc:
+        assert exc.status_code == 400
+    else:
+        raise AssertionError("bulk delete without a selection must be rejected")
+    assert len(load_dates(TestingSessionLocal)) == 11
+
+    # Скрытые status/q текущей вкладки без ключей и без флага ничего не трогают
+    for form in ({"status": "active"}, {"q": "lk"}):
+        try:
+            call_bulk(engine, admin_routes, "delete", **form)
+        except HTTPException as exc:
+            assert exc.status_code == 400
+        else:
+            raise AssertionError("bulk delete by tab filter alone must be rejected")
+    assert len(load_dates(TestingSessionLocal)) == 11
+
+    result, _ = call_bulk(engine, admin_routes, "extend", all_licenses=True, days=1)
+    assert result["affected"] == 11
+    assert load_dates(TestingSessionLocal)["lk10"].next_charge_at is not None
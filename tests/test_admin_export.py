@@ -0,0 +1,154 @@
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import json
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.payment import Payment
+from server.models.user import User
+from server.services import export_service
+
+
+def load_admin_routes(monkeypatch):
+    class DummyTemplates:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def TemplateResponse(self, *args, **kwargs):
+            return None
+
+    monkeypatch.setattr("fastapi.templating.Jinja2Templates", DummyTemplates)
+    monkeypatch.setattr(
+        "fastapi.dependencies.utils.ensure_multipart_is_installed", lambda: None
+    )
+    import importlib
+
+    return importlib.import_module("server.admin.routes")
+
+
+def setup_test_db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'export.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            for i in range(25):
+                user = User(telegram_id=5000 + i)
+                db.add_all(
+                    [
+                        user,
+                        License(
+                            license_key=f"export-key-{i:02d}",
+                            user=user,
+                            is_active=i % 5 != 0,
+                            next_charge_at=datetime.datetime(2026, 1, 1)
+                            + datetime.timedelta(days=25 - i),
+                        ),
+                    ]
+                )
+            db.add(
+                Payment(
+                    payment_id="pay-1",
+                    telegram_id=5000,
+                    status="succeeded",
+                    amount_value=49,
+                    currency="RUB",
+                )
+            )
+            await db.commit()
+
+    asyncio.run(init_models())
+    return TestingSessionLocal
+
+
+def test_export_licenses_csv_with_filters(monkeypatch, tmp_path):
+    admin_routes = load_admin_routes(monkeypatch)
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(admin_routes, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(admin_routes, "ReadSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(export_service, "EXPORT_CHUNK_SIZE", 4)
+    app = FastAPI()
+    app.include_router(admin_routes.admin_router)
+
+    with TestClient(app) as client:
+        response = client.get(
+            "/admin/export/licenses",
+            params={"status": "inactive", "sort": "next_charge_at_asc"},
+        )
+        everything = client.get("/admin/export/licenses")
+        searched = client.get("/admin/export/licenses", params={"q": "key-1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["license_key"] for row in rows] == [
+        "export-key-20",
+        "export-key-15",
+        "export-key-10",
+        "export-key-05",
+        "export-key-00",
+    ]
+    assert rows[0]["telegram_id"] == "5020"
+    assert rows[0]["is_active"] == "False"
+
+    assert len(list(csv.DictReader(io.StringIO(everything.text)))) == 25
+    searched_keys = [row["license_key"] for row in csv.DictReader(io.StringIO(searched.text))]
+    assert searched_keys == [f"export-key-{i}" for i in range(10, 20)]
+
+
+def test_export_ndjson_gzip(monkeypatch, tmp_path):
+    admin_routes = load_admin_routes(monkeypatch)
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(admin_routes, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(admin_routes, "ReadSessionLocal", TestingSessionLocal)
+    app = FastAPI()
+    app.include_router(admin_routes.admin_router)
+
+    with TestClient(app) as client:
+        users = client.get("/admin/export/users", params={"format": "ndjson", "gzip": "1"})
+        payments = client.get("/admin/export/payments", params={"format": "ndjson"})
+        unknown = client.get("/admin/export/secrets")
+        bad_format = client.get("/admin/export/users", params={"format": "xml"})
+
+    assert users.headers["content-type"] == "application/gzip"
+    assert users.headers["content-disposition"].endswith('.ndjson.gz"')
+    lines = gzip.decompress(users.content).decode().splitlines()
+    assert len(lines) == 25
+    assert json.loads(lines[0])["telegram_id"] == 5000
+
+    assert [json.loads(line) for line in payments.text.splitlines()][0]["amount_value"] == "49.00"
+    assert unknown.status_code == 404
+    assert bad_format.status_code == 400
+
+
+def test_export_streams_in_batches(tmp_path):
+    TestingSessionLocal = setup_test_db(tmp_path)
+
+    async def collect():
+        chunks = []
+        async for chunk in export_service.stream_rows(
+            lambda dialect: export_service.users_query(),
+            "csv",
+            session_factory=TestingSessionLocal,
+            chunk_size=10,
+        ):
+            chunks.append(chunk)
+        return chunks
+
+    chunks = asyncio.run(collect())
+    # Заголовок + три пачки по 10/10/5 строк
+    assert [chunk.count(b"\n") for chunk in chunks] == [1, 10, 10, 5]
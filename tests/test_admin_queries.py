@@ -3,7 +3,7 @@ import datetime
 import sys
 from pathlib import Path
 
-from sqlalchemy import event
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
@@ -11,6 +11,7 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 from server.models.user import User
 from server.models.license import License
 from server.db.base_class import Base
+from server.services import admin_service
 
 
 class DummyRequest:
@@ -76,7 +77,14 @@ def test_admin_dashboard_query_count(monkeypatch):
     asyncio.run(seed())
 
     monkeypatch.setattr(admin_routes, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(admin_routes, "ReadSessionLocal", TestingSessionLocal)
+    admin_service.invalidate_counts()
 
+    # Страница + счётчики; со второго раза счётчики берутся из кэша
+    query_count = asyncio.run(
+        count_queries(engine, admin_routes.admin_dashboard, DummyRequest())
+    )
+    assert query_count == 2
     query_count = asyncio.run(
         count_queries(engine, admin_routes.admin_dashboard, DummyRequest())
     )
@@ -111,8 +119,204 @@ def test_admin_users_query_count(monkeypatch):
     asyncio.run(seed())
 
     monkeypatch.setattr(admin_routes, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(admin_routes, "ReadSessionLocal", TestingSessionLocal)
+    admin_service.invalidate_counts()
 
+    query_count = asyncio.run(
+        count_queries(engine, admin_routes.admin_users, DummyRequest())
+    )
+    assert query_count == 2
     query_count = asyncio.run(
         count_queries(engine, admin_routes.admin_users, DummyRequest())
     )
     assert query_count == 1
+
+
+def seed_licenses(TestingSessionLocal):
+    now = datetime.datetime(2026, 1, 1)
+    # Повторяющиеся даты и NULL проверяют разрешение «ничьих» по id
+    dates = [3, None, 1, 3, 2, None, 1, 5, 3, None, 4]
+
+    async def seed():
+        async with TestingSessionLocal() as db:
+            for i, offset in enumerate(dates):
+                user = User(telegram_id=1000 + i)
+                db.add_all(
+                    [
+                        user,
+                        License(
+                            license_key=f"lk{i}",
+                            user=user,
+                            is_active=i % 2 == 0,
+                            next_charge_at=None
+                            if offset is None
+                            else now + datetime.timedelta(days=offset),
+                        ),
+                    ]
+                )
+            await db.commit()
+
+    asyncio.run(seed())
+
+
+def collect_pages(TestingSessionLocal, func, limit, **kwargs):
+    async def walk():
+        pages, after = [], None
+        async with TestingSessionLocal() as db:
+            while True:
+                rows, after = await func(db, after=after, limit=limit, **kwargs)
+                pages.append(rows)
+                if after is None:
+                    return pages
+
+    return asyncio.run(walk())
+
+
+def test_license_keyset_pagination_matches_full_sort():
+    engine, TestingSessionLocal = setup_test_db()
+    seed_licenses(TestingSessionLocal)
+
+    async def load_all():
+        async with TestingSessionLocal() as db:
+            return (await db.execute(admin_service.license_list_query())).all()
+
+    everything = [lic for lic, _ in asyncio.run(load_all())]
+    dated = [lic for lic in everything if lic.next_charge_at is not None]
+    undated = [lic for lic in everything if lic.next_charge_at is None]
+    expected = {
+        "": sorted(everything, key=lambda lic: lic.id),
+        "next_charge_at_asc": sorted(dated, key=lambda lic: (lic.next_charge_at, lic.id))
+        + sorted(undated, key=lambda lic: lic.id),
+        "next_charge_at_desc": sorted(
+            dated, key=lambda lic: (lic.next_charge_at, lic.id), reverse=True
+        )
+        + sorted(undated, key=lambda lic: lic.id, reverse=True),
+    }
+
+    for sort, licenses in expected.items():
+        pages = collect_pages(
+            TestingSessionLocal, admin_service.list_licenses, limit=3, sort=sort
+        )
+        assert all(len(page) <= 3 for page in pages)
+        assert [lic.id for page in pages for lic, _ in page] == [lic.id for lic in licenses]
+
+    pages = collect_pages(
+        TestingSessionLocal,
+        admin_service.list_licenses,
+        limit=2,
+        status="active",
+        sort="next_charge_at_asc",
+    )
+    keys = [lic.license_key for page in pages for lic, _ in page]
+    assert sorted(keys) == sorted(lic.license_key for lic in everything if lic.is_active)
+
+
+def test_broken_cursor_falls_back_to_first_page():
+    engine, TestingSessionLocal = setup_test_db()
+    seed_licenses(TestingSessionLocal)
+    broken = [
+        admin_service.encode_cursor(values)
+        for values in (["x", 1], [1], ["2026-01-01", "1"], [None, True], [{}], [1, 2, 3])
+    ] + ["not-base64!", "e30"]
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            first, _ = await admin_service.list_licenses(db, limit=3, sort="next_charge_at_asc")
+            pages = []
+            for token in broken:
+                rows, _ = await admin_service.list_licenses(
+                    db, after=token, limit=3, sort="next_charge_at_asc"
+                )
+                pages.append(rows)
+            users, _ = await admin_service.list_users(db, after=broken[0], limit=3)
+        return first, pages, users
+
+    first, pages, users = asyncio.run(scenario())
+    # [1] — корректный курсор сортировки по id, для сортировки по дате он не подходит
+    assert all([lic.id for lic, _ in page] == [lic.id for lic, _ in first] for page in pages)
+    assert len(users) == 3
+    assert admin_service.decode_cursor(broken[0]) is None
+    assert admin_service.decode_cursor(admin_service.encode_cursor([None, 5])) == [None, 5]
+
+
+def test_user_keyset_pagination_and_cached_counts():
+    engine, TestingSessionLocal = setup_test_db()
+    seed_licenses(TestingSessionLocal)
+    admin_service.invalidate_counts()
+
+    pages = collect_pages(TestingSessionLocal, admin_service.list_users, limit=4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [user.telegram_id for page in pages for user, _ in page] == list(range(1000, 1011))
+
+    async def counts():
+        async with TestingSessionLocal() as db:
+            return await admin_service.get_counts(db)
+
+    assert asyncio.run(counts()) == {"licenses": 11, "active": 6, "inactive": 5, "users": 11}
+    query_count = asyncio.run(count_queries(engine, counts))
+    assert query_count == 0
+
+
+def test_admin_search_index_follows_writes():
+    engine, TestingSessionLocal = setup_test_db()
+    key = "6f1c2e1a-93b7-4a55-8d0e-2b7c9a4e1f30"
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            alice = User(telegram_id=555123)
+            bob = User(telegram_id=777999)
+            db.add_all(
+                [
+                    alice,
+                    bob,
+                    License(license_key=key, user=alice),
+                    License(license_key="custom-Studio-key", user=bob),
+                ]
+            )
+            await db.commit()
+
+            async def search(q):
+                rows, _ = await admin_service.list_licenses(db, q=q)
+                return sorted(lic.license_key for lic, _ in rows)
+
+            found = {
+                "uuid": await search(key.upper()),
+                "fragment": await search("93B7-4a"),
+                "studio": await search("studio"),
+                "telegram_id": await search("777999"),
+                "id_fragment": await search("5551"),
+                "short_digits": await search("55"),
+                "short": await search("-k"),
+                # Длиннее BIGINT: не привязывается к telegram_id, ищется только как текст
+                "huge_number": await search("5551239" * 4),
+                "huge_fragment": await search("555123" + "0" * 20),
+            }
+
+            bob.telegram_id = 888000
+            lic = (await db.execute(select(License).filter_by(license_key=key))).scalars().one()
+            lic.license_key = "renamed-key"
+            await db.commit()
+            found["renamed_old"] = await search("93b7")
+            found["renamed_new"] = await search("named")
+            found["new_telegram_id"] = await search("888000")
+
+            await db.delete(lic)
+            await db.commit()
+            found["deleted"] = await search("named")
+            return found
+
+    found = asyncio.run(scenario())
+    assert found["uuid"] == [key]
+    assert found["fragment"] == [key]
+    assert found["studio"] == ["custom-Studio-key"]
+    assert found["telegram_id"] == ["custom-Studio-key"]
+    # Число от трёх цифр ищется и как часть Telegram ID, короче — только целиком
+    assert found["id_fragment"] == [key]
+    assert found["short_digits"] == []
+    assert found["short"] == ["custom-Studio-key"]
+    assert found["huge_number"] == []
+    assert found["huge_fragment"] == []
+    assert found["renamed_old"] == []
+    assert found["renamed_new"] == ["renamed-key"]
+    assert found["new_telegram_id"] == ["custom-Studio-key"]
+    assert found["deleted"] == []
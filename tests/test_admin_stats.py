@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.payment import Payment
+from server.models.stats_rollup import StatsRollup
+from server.models.user import User
+from server.services import admin_service, payment_service, stats_service
+from server.services.referral_service import claim_referral_bonuses
+
+TODAY = datetime.datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+def setup_test_db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stats.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    return engine, TestingSessionLocal
+
+
+async def snapshot(db):
+    result = await db.execute(
+        select(StatsRollup.metric, StatsRollup.bucket, StatsRollup.value, StatsRollup.amount)
+    )
+    return {
+        (metric, bucket): (value, Decimal(str(amount)))
+        for metric, bucket, value, amount in result.all()
+        if value or amount
+    }
+
+
+async def write_everything(db):
+    referrer = User(telegram_id=1, created_at=TODAY - datetime.timedelta(days=3))
+    db.add(referrer)
+    await db.flush()
+    for i in range(6):
+        user = User(telegram_id=10 + i, referred_by_id=referrer.id if i < 4 else None)
+        db.add_all(
+            [
+                user,
+                License(
+                    license_key=f"lk{i}",
+                    user=user,
+                    is_active=i % 3 != 0,
+                    next_charge_at=TODAY + datetime.timedelta(days=i + 1),
+                ),
+            ]
+        )
+    await db.commit()
+
+    # Вебхук: pending → succeeded, повторная доставка не должна удвоить выручку
+    for status in ("pending", "succeeded", "succeeded"):
+        await payment_service.record_webhook_event(
+            db,
+            {
+                "event": f"payment.{status}",
+                "object": {
+                    "id": "pay-1",
+                    "status": status,
+                    "amount": {"value": "49.00", "currency": "RUB"},
+                },
+            },
+            telegram_id=11,
+        )
+    db.add(Payment(payment_id="pay-2", telegram_id=12, status="succeeded", amount_value=99))
+    db.add(Payment(payment_id="pay-3", telegram_id=12, status="canceled", amount_value=99))
+    await db.commit()
+
+    await claim_referral_bonuses(db, referrer)
+
+    selection = admin_service.bulk_selection(status="active")
+    await admin_service.bulk_shift_days(db, selection, 2)
+    await db.execute(update(License).where(License.license_key == "lk0").values(is_active=True))
+    await db.execute(delete(License).where(License.license_key == "lk5"))
+    await db.commit()
+
+
+def test_rollup_triggers_match_full_rebuild(tmp_path):
+    engine, TestingSessionLocal = setup_test_db(tmp_path)
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            await write_everything(db)
+            incremental = await snapshot(db)
+            await stats_service.rebuild(db)
+            rebuilt = await snapshot(db)
+        return incremental, rebuilt
+
+    incremental, rebuilt = asyncio.run(scenario())
+    assert incremental == rebuilt
+    today = TODAY.date().isoformat()
+    assert incremental[("payments_succeeded", today)] == (2, Decimal("148"))
+    # Лицензия пригласившего (бонус) + lk0..lk4
+    assert incremental[("licenses_active", "")][0] == 5
+    assert incremental[("referrals", "")][0] == 4
+    assert incremental[("referrals_converted", "")][0] == 2
+
+
+def test_revenue_is_bucketed_by_payment_day(tmp_path):
+    engine, TestingSessionLocal = setup_test_db(tmp_path)
+    yesterday = TODAY - datetime.timedelta(days=1)
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            # Ссылка на оплату создана вчера, а оплачена сегодня
+            db.add(
+                Payment(
+                    payment_id="pay-late", telegram_id=5, status="pending",
+                    amount_value=49, created_at=yesterday,
+                )
+            )
+            await db.commit()
+            for captured_at in (TODAY, TODAY + datetime.timedelta(hours=1)):
+                await payment_service.record_webhook_event(
+                    db,
+                    {
+                        "event": "payment.succeeded",
+                        "object": {
+                            "id": "pay-late",
+                            "status": "succeeded",
+                            "captured_at": captured_at.isoformat() + "Z",
+                            "amount": {"value": "49.00", "currency": "RUB"},
+                        },
+                    },
+                    telegram_id=5,
+                )
+                await db.commit()
+            payment = (
+                await db.execute(select(Payment).execution_options(populate_existing=True))
+            ).scalar_one()
+            incremental = await snapshot(db)
+            await stats_service.rebuild(db)
+            return payment.paid_at, incremental, await snapshot(db)
+
+    paid_at, incremental, rebuilt = asyncio.run(scenario())
+    # Повторная доставка вебхука не сдвигает момент оплаты
+    assert paid_at == TODAY
+    assert incremental == rebuilt
+    assert incremental[("payments_succeeded", TODAY.date().isoformat())] == (1, Decimal("49"))
+    assert ("payments_succeeded", yesterday.date().isoformat()) not in incremental
+
+
+def test_stats_page_reads_rollup_in_one_query(tmp_path):
+    engine, TestingSessionLocal = setup_test_db(tmp_path)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            await write_everything(db)
+        event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            async with TestingSessionLocal() as db:
+                return await stats_service.get_dashboard(db, today=TODAY.date())
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    stats = asyncio.run(scenario())
+    assert len(statements) == 1
+    assert "stats_rollup" in statements[0]
+    assert stats["licenses_active"] == 5
+    assert stats["licenses_inactive"] == 1
+    assert stats["payments_total"] == 2
+    assert stats["revenue_total"] == Decimal("148")
+    assert stats["referral_conversion"] == 50.0
+    assert stats["daily"][0]["new_users"] == 6
+    assert stats["daily"][3]["new_users"] == 1
+    assert sum(row["licenses"] for row in stats["expiring"]) == 5
@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import json
+import sys
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from telegram import Bot
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from server.models.payment import Payment
+import server.api.payment_router as payment_router
+from server.services import yookassa_client
+from telegram_bot import bot, notify, webhook
+from telegram_bot.api_client import InProcessApi
+from telegram_bot.harness import RecordingRequest, for_user
+from telegram_bot.media import media_cache
+from telegram_bot.webhook import SECRET_HEADER, TelegramWebhook
+
+UPDATES = json.loads(
+    (Path(__file__).resolve().parents[1] / "benchmarks" / "telegram_updates.json").read_text(
+        encoding="utf-8"
+    )
+)
+PAY_URL = "https://yookassa.example/confirm/pending"
+
+
+def setup_test_db(monkeypatch, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'aio.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            db.add(
+                Payment(
+                    payment_id="pending-42",
+                    telegram_id=42,
+                    status="pending",
+                    confirmation_url=PAY_URL,
+                    created_at=datetime.datetime.utcnow(),
+                )
+            )
+            await db.commit()
+
+    asyncio.run(init_models())
+    for module in (bot, payment_router):
+        monkeypatch.setattr(module, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(media_cache, "session_factory", TestingSessionLocal)
+    # Без ключей ЮKassa: новый платёж создать нельзя, только переиспользовать
+    monkeypatch.delenv("YOOKASSA_SHOP_ID", raising=False)
+    monkeypatch.delenv("YOOKASSA_SECRET_KEY", raising=False)
+    monkeypatch.setattr(yookassa_client, "_client", None)
+
+
+def test_in_process_api_calls_payment_code_directly(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+
+    async def scenario():
+        api = InProcessApi()
+        return await api.create_payment(42), await api.create_payment(43)
+
+    reused, failed = asyncio.run(scenario())
+    assert reused.status_code == 200
+    assert reused.json() == {"confirmation_url": PAY_URL}
+    # Ключи ЮKassa не заданы — 503, как у POST /api/create_payment
+    assert failed.status_code == 503
+    assert "YOOKASSA" in failed.json()["detail"]
+
+
+def test_in_process_api_and_route_map_yookassa_errors_alike(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+
+    class RejectingClient:
+        async def create_payment(self, params, idempotence_key):
+            raise yookassa_client.YooKassaError(400, "invalid receipt")
+
+    app = FastAPI()
+    app.include_router(payment_router.router)
+
+    async def scenario():
+        unconfigured = await post_create_payment(app, 43)
+        monkeypatch.setattr(yookassa_client, "get_client", lambda: RejectingClient())
+        in_process = await InProcessApi().create_payment(43)
+        return unconfigured, in_process, await post_create_payment(app, 43)
+
+    unconfigured, in_process, over_http = asyncio.run(scenario())
+    assert unconfigured.status_code == 503
+    assert in_process.status_code == over_http.status_code == 502
+    assert in_process.json() == over_http.json()
+
+
+async def post_create_payment(app, telegram_id):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        return await client.post("/api/create_payment", json={"telegram_id": telegram_id})
+
+
+def test_bot_polls_inside_api_process_with_shared_client(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+    recorder = RecordingRequest()
+    shared = Bot(bot.TOKEN, request=recorder, get_updates_request=recorder)
+    monkeypatch.setattr(notify, "_bot", shared)
+    hook = TelegramWebhook(url="", secret="s3cret")
+    monkeypatch.setattr(webhook, "telegram_webhook", hook)
+
+    press = for_user(UPDATES[1], 42, 1)
+    press["callback_query"]["data"] = "subscribe_license"
+    recorder.pending_updates.append(press)
+
+    app = FastAPI()
+    app.include_router(webhook.router)
+
+    async def scenario():
+        await hook.start(polling=True)
+        try:
+            assert hook.application.bot is shared
+            for _ in range(200):
+                if any(name == "editMessageCaption" for _, name, _ in recorder.calls):
+                    break
+                await asyncio.sleep(0.01)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api.test") as client:
+                posted = await client.post(
+                    "/telegram/webhook", json=press, headers={SECRET_HEADER: "s3cret"}
+                )
+            return posted, hook.stats()
+        finally:
+            await hook.stop()
+            await write_coalescer.stop()
+
+    posted, stats = asyncio.run(scenario())
+    edits = [params for _, name, params in recorder.calls if name == "editMessageCaption"]
+    assert PAY_URL in json.dumps(edits[0]["reply_markup"])
+    # В режиме polling маршрут вебхука закрыт
+    assert posted.status_code == 404
+    assert stats["mode"] == "polling"
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from telegram_bot import api_client
+from telegram_bot.api_client import ApiClient
+
+
+def make_client(monkeypatch, responses, retries=2):
+    monkeypatch.setattr(api_client, "RETRY_BACKOFF", 0)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        answer = responses[min(len(calls), len(responses)) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return httpx.Response(answer, json={"confirmation_url": "https://pay"})
+
+    client = ApiClient("http://api.test", retries=retries, transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+def test_create_payment_retries_gateway_errors(monkeypatch):
+    client, calls = make_client(monkeypatch, [503, httpx.ConnectError("refused"), 200])
+
+    response = asyncio.run(client.create_payment(42))
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert calls[-1].url == "http://api.test/api/create_payment"
+    bodies = [json.loads(call.content) for call in calls]
+    assert all(body["telegram_id"] == 42 for body in bodies)
+    # Все попытки с одним ключом: ЮKassa не создаст второй платёж
+    assert len({body["idempotence_key"] for body in bodies}) == 1
+
+
+def test_create_payment_does_not_retry_yookassa_failures(monkeypatch):
+    client, calls = make_client(monkeypatch, [502, 200])
+
+    assert asyncio.run(client.create_payment(42)).status_code == 502
+    assert len(calls) == 1
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    client, calls = make_client(monkeypatch, [400])
+
+    assert asyncio.run(client.create_payment(42)).status_code == 400
+    assert len(calls) == 1
+
+
+def test_last_connection_error_is_raised(monkeypatch):
+    client, calls = make_client(monkeypatch, [httpx.ConnectError("refused")], retries=1)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.create_payment(42))
+    assert len(calls) == 2
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from telegram import CallbackQuery, Update, User
+from telegram.ext import ApplicationBuilder
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from telegram_bot import bot
+from telegram_bot.concurrency import PerUserUpdateProcessor
+from telegram_bot.harness import RecordingRequest, for_user
+from telegram_bot.media import media_cache
+from telegram_bot.webhook import TelegramWebhook
+
+# Только нажатия кнопок из записанных обновлений (без /start)
+BUTTONS = [
+    update
+    for update in json.loads(
+        (Path(__file__).resolve().parents[1] / "benchmarks" / "telegram_updates.json").read_text(
+            encoding="utf-8"
+        )
+    )
+    if "callback_query" in update
+]
+
+
+def press(update_id, user_id):
+    return Update(
+        update_id,
+        callback_query=CallbackQuery(
+            str(update_id), User(user_id, "user", is_bot=False), chat_instance="x"
+        ),
+    )
+
+
+def test_processor_keeps_user_order_and_runs_users_in_parallel():
+    processor = PerUserUpdateProcessor(workers=4)
+    log = []
+
+    async def handler(name, delay):
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+
+    async def scenario():
+        await processor.initialize()
+        await asyncio.gather(
+            processor.process_update(press(1, 1), handler("a1", 0.05)),
+            processor.process_update(press(2, 1), handler("a2", 0)),
+            processor.process_update(press(3, 2), handler("b1", 0)),
+        )
+
+    asyncio.run(scenario())
+    # a2 ждёт окончания a1, а b1 не ждёт никого
+    assert log.index(("start", "a2")) > log.index(("end", "a1"))
+    assert log.index(("end", "b1")) < log.index(("end", "a1"))
+    assert processor.stats() == {"workers": 4, "busy": 0, "users": 0}
+
+
+def test_workers_bound_concurrency_across_users():
+    processor = PerUserUpdateProcessor(workers=2)
+    running, peak = [0], [0]
+
+    async def handler():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def scenario():
+        await processor.initialize()
+        await asyncio.gather(
+            *(processor.process_update(press(n, n), handler()) for n in range(10))
+        )
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+
+
+def run_load(monkeypatch, tmp_path, workers, users=20):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'load{workers}.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(bot, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(media_cache, "session_factory", TestingSessionLocal)
+
+    recorder = RecordingRequest(latency=0.01)
+    application = bot.build_application(
+        ApplicationBuilder()
+        .token(bot.TOKEN)
+        .request(recorder)
+        .get_updates_request(recorder)
+        .updater(None),
+        concurrent_updates=workers,
+    )
+    hook = TelegramWebhook(url="", secret="s3cret")
+    updates = [
+        for_user(update, 1000 + user, user * len(BUTTONS) + n)
+        for user in range(users)
+        for n, update in enumerate(BUTTONS)
+    ]
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await hook.start(application)
+        started = time.perf_counter()
+        try:
+            # Все нажатия всех пользователей приходят разом, не дожидаясь ответов
+            for update in updates:
+                await hook.feed(update)
+            await application.update_queue.join()
+            return time.perf_counter() - started
+        finally:
+            await hook.stop()
+
+    return asyncio.run(scenario()), recorder, updates
+
+
+def test_many_users_pressing_buttons_at_once(monkeypatch, tmp_path):
+    sequential, _, _ = run_load(monkeypatch, tmp_path, workers=1)
+    concurrent, recorder, updates = run_load(monkeypatch, tmp_path, workers=16)
+
+    assert concurrent < sequential / 3
+    answered = [
+        params["callback_query_id"]
+        for _, name, params in recorder.calls
+        if name == "answerCallbackQuery"
+    ]
+    assert sorted(answered) == sorted(u["callback_query"]["id"] for u in updates)
+    # Нажатия одного пользователя обработаны в том порядке, в каком пришли
+    for user in range(20):
+        mine = [
+            u["callback_query"]["id"]
+            for u in updates
+            if u["callback_query"]["from"]["id"] == 1000 + user
+        ]
+        assert [cq for cq in answered if cq in mine] == mine
@@ -0,0 +1,103 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from telegram.error import BadRequest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from telegram_bot.media import MediaCache, edit_screen
+
+
+class FakeBot:
+    token = "123:abc"
+
+    def __init__(self, stale=()):
+        self.sent = []
+        self.stale = set(stale)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if photo in self.stale:
+            raise BadRequest("Wrong file identifier/http url specified")
+        self.sent.append(photo)
+        file_id = photo if isinstance(photo, str) else f"file-{len(self.sent)}"
+        sizes = [SimpleNamespace(file_id="thumb"), SimpleNamespace(file_id=file_id)]
+        return SimpleNamespace(photo=sizes)
+
+
+class FakeQuery:
+    def __init__(self, photo):
+        self.message = SimpleNamespace(photo=photo)
+        self.calls = []
+
+    async def edit_message_caption(self, caption, **kwargs):
+        self.calls.append(("caption", caption))
+
+    async def edit_message_text(self, text, **kwargs):
+        self.calls.append(("text", text))
+
+
+def setup_test_db(monkeypatch, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'media.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"\x89PNG fake logo")
+    return TestingSessionLocal, logo
+
+
+def test_logo_is_uploaded_once_and_reused_after_restart(monkeypatch, tmp_path):
+    TestingSessionLocal, logo = setup_test_db(monkeypatch, tmp_path)
+    bot = FakeBot()
+
+    async def scenario():
+        cache = MediaCache(TestingSessionLocal)
+        await cache.send_photo(bot, 1, logo, caption="menu")
+        await cache.send_photo(bot, 2, logo, caption="menu")
+        # Новый процесс: память пуста, file_id берётся из БД
+        restarted = MediaCache(TestingSessionLocal)
+        await restarted.send_photo(bot, 3, logo, caption="menu")
+        await write_coalescer.stop()
+        return cache.stats(), restarted.stats()
+
+    first, restarted = asyncio.run(scenario())
+    assert bot.sent == [b"\x89PNG fake logo", "file-1", "file-1"]
+    assert first == {"uploads": 1, "reused": 1}
+    assert restarted == {"uploads": 0, "reused": 1}
+
+
+def test_rejected_file_id_is_uploaded_again(monkeypatch, tmp_path):
+    TestingSessionLocal, logo = setup_test_db(monkeypatch, tmp_path)
+
+    async def scenario():
+        cache = MediaCache(TestingSessionLocal)
+        await cache.send_photo(FakeBot(), 1, logo)
+        bot = FakeBot(stale={"file-1"})
+        await cache.send_photo(bot, 1, logo)
+        await write_coalescer.stop()
+        return bot.sent, await MediaCache(TestingSessionLocal).get(await cache.key(bot, logo))
+
+    sent, stored = asyncio.run(scenario())
+    assert sent == [b"\x89PNG fake logo"]
+    assert stored == "file-1"
+
+
+def test_edit_screen_keeps_photo_and_edits_caption():
+    photo_query = FakeQuery(photo=[object()])
+    text_query = FakeQuery(photo=())
+
+    asyncio.run(edit_screen(photo_query, "menu"))
+    asyncio.run(edit_screen(text_query, "menu"))
+
+    assert photo_query.calls == [("caption", "menu")]
+    assert text_query.calls == [("text", "menu")]
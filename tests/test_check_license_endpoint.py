@@ -14,6 +14,7 @@ from server.db.base_class import Base
 from server.models.license import License
 from server.models.user import User
 import server.api.license_router as license_router
+from server.services.license_cache import LicenseStatusCache, license_status_cache
 
 app = FastAPI()
 app.include_router(license_router.router, prefix="/api")
@@ -30,6 +31,7 @@ def setup_test_db():
             await conn.run_sync(Base.metadata.create_all)
 
     asyncio.run(init_models())
+    license_status_cache.clear()
     return TestingSessionLocal
 
 
@@ -54,6 +56,7 @@ def test_check_license_returns_user(monkeypatch):
     seed_db(TestingSessionLocal)
 
     monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
 
     with TestClient(app) as client:
         response = client.get("/api/check_license", params={"license_key": "abc"})
@@ -62,3 +65,85 @@ def test_check_license_returns_user(monkeypatch):
     data = response.json()
     assert data["status"] == "active"
     assert data["user_id"] == 123
+
+
+def test_check_license_is_cached_until_invalidated(monkeypatch):
+    TestingSessionLocal = setup_test_db()
+    seed_db(TestingSessionLocal)
+
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+    hits, misses = license_status_cache.hits, license_status_cache.misses
+
+    with TestClient(app) as client:
+        first = client.get("/api/check_license", params={"license_key": "abc"})
+        second = client.get("/api/check_license", params={"license_key": "abc"})
+
+        async def deactivate():
+            async with TestingSessionLocal() as db:
+                license = await license_router.license_service.get_license_by_key(db, "abc")
+                license.is_active = False
+                await db.commit()
+
+        asyncio.run(deactivate())
+        stale = client.get("/api/check_license", params={"license_key": "abc"})
+        license_status_cache.invalidate("abc")
+        fresh = client.get("/api/check_license", params={"license_key": "abc"})
+
+    assert first.json() == second.json()
+    assert stale.json()["status"] == "active"
+    assert fresh.json()["status"] == "inactive"
+    assert license_status_cache.hits - hits == 2
+    assert license_status_cache.misses - misses == 2
+
+
+def test_license_status_cache_evicts_least_recently_used():
+    cache = LicenseStatusCache(ttl=60, max_size=2)
+    cache.set("a", {"status": "active"})
+    cache.set("b", {"status": "active"})
+    assert cache.get("a") is not None
+    cache.set("c", {"status": "inactive"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"status": "active"}
+    assert cache.stats()["size"] == 2
+
+
+def test_license_status_cache_respects_expiry():
+    cache = LicenseStatusCache(ttl=60, max_size=10)
+    cache.set(
+        "expired",
+        {"status": "active"},
+        valid_until=datetime.datetime.utcnow() - datetime.timedelta(seconds=1),
+    )
+    assert cache.get("expired") is None
+
+
+def test_check_licenses_batch_matches_single_payload(monkeypatch):
+    TestingSessionLocal = setup_test_db()
+    seed_db(TestingSessionLocal)
+
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+
+    with TestClient(app) as client:
+        single = client.get("/api/check_license", params={"license_key": "abc"}).json()
+        license_status_cache.clear()
+        response = client.post(
+            "/api/check_licenses", json={"license_keys": ["abc", "missing", "abc"]}
+        )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results == {"abc": single, "missing": {"status": "not_found", "valid": False}}
+
+
+def test_check_licenses_rejects_oversized_batch(monkeypatch):
+    monkeypatch.setattr(license_router, "LICENSE_BATCH_MAX_SIZE", 2)
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/check_licenses", json={"license_keys": ["a", "b", "c"]}
+        )
+
+    assert response.status_code == 413
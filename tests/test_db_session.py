@@ -0,0 +1,30 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.session import build_engine
+
+
+async def read_pragmas(engine):
+    async with engine.connect() as conn:
+        journal = (await conn.execute(text("PRAGMA journal_mode"))).scalar_one()
+        busy = (await conn.execute(text("PRAGMA busy_timeout"))).scalar_one()
+    await engine.dispose()
+    return journal.lower(), busy
+
+
+def test_production_profile_enables_wal(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'prod.db'}"
+    journal, busy = asyncio.run(read_pragmas(build_engine(url, profile="production")))
+    assert journal == "wal"
+    assert busy == 5000
+
+
+def test_default_profile_keeps_rollback_journal(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'plain.db'}"
+    journal, _ = asyncio.run(read_pragmas(build_engine(url, profile="default")))
+    assert journal == "delete"
@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI
+
+from server.db.base_class import Base
+from server.models.lease_revocation import LeaseRevocation
+from server.models.license import License
+from server.models.user import User
+import server.api.license_router as license_router
+from server.services import lease_service
+
+app = FastAPI()
+app.include_router(license_router.router, prefix="/api")
+
+
+def setup_test_db(days_left=30):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", connect_args={"check_same_thread": False}
+    )
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            user = User(telegram_id=123)
+            license = License(
+                license_key="abc",
+                user=user,
+                is_active=True,
+                next_charge_at=datetime.datetime.utcnow()
+                + datetime.timedelta(days=days_left),
+            )
+            db.add_all([user, license])
+            await db.commit()
+
+    asyncio.run(init_models())
+    return TestingSessionLocal
+
+
+def test_lease_is_capped_by_next_charge_and_verifiable(monkeypatch):
+    monkeypatch.setenv("LICENSE_LEASE_SECRET", "test-secret")
+    monkeypatch.setattr(lease_service, "LEASE_TTL", 7 * 24 * 3600)
+    TestingSessionLocal = setup_test_db(days_left=1)
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+
+    with TestClient(app) as client:
+        lease = client.get("/api/license_lease", params={"license_key": "abc"}).json()
+        verified = client.post("/api/verify_lease", json={"lease": lease["lease"]}).json()
+        tampered = client.post(
+            "/api/verify_lease", json={"lease": lease["lease"][:-2] + "xx"}
+        ).json()
+
+    assert lease["status"] == "active"
+    assert lease["expires_at"] <= time.time() + 24 * 3600 + 1
+    assert verified == {
+        "valid": True,
+        "license_key": "abc",
+        "user_id": 123,
+        "expires_at": lease["expires_at"],
+    }
+    assert tampered == {"valid": False}
+
+
+def test_revoked_lease_is_listed_and_rejected(monkeypatch):
+    monkeypatch.setenv("LICENSE_LEASE_SECRET", "test-secret")
+    TestingSessionLocal = setup_test_db()
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+
+    with TestClient(app) as client:
+        lease = client.get("/api/license_lease", params={"license_key": "abc"}).json()
+        before = client.get("/api/lease_revocations", params={"since": 0}).json()
+
+        async def revoke():
+            async with TestingSessionLocal() as db:
+                await lease_service.revoke(db, "abc")
+                await db.commit()
+
+        asyncio.run(revoke())
+        after = client.get("/api/lease_revocations", params={"since": 0}).json()
+        verified = client.post("/api/verify_lease", json={"lease": lease["lease"]}).json()
+
+    assert before["revoked"] == []
+    assert [r["license_key"] for r in after["revoked"]] == ["abc"]
+    assert verified == {"valid": False, "status": "revoked"}
+
+
+def test_missing_lease_secret_is_503(monkeypatch):
+    monkeypatch.delenv("LICENSE_LEASE_SECRET", raising=False)
+    TestingSessionLocal = setup_test_db()
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+
+    with TestClient(app) as client:
+        lease = client.get("/api/license_lease", params={"license_key": "abc"})
+        verified = client.post("/api/verify_lease", json={"lease": "payload.signature"})
+
+    assert lease.status_code == 503
+    assert verified.status_code == 503
+    assert "LICENSE_LEASE_SECRET" in lease.json()["detail"]
+
+
+def test_lease_reissued_in_the_second_of_revocation_is_valid(monkeypatch):
+    monkeypatch.setenv("LICENSE_LEASE_SECRET", "test-secret")
+    TestingSessionLocal = setup_test_db()
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+    second = int(time.time())
+    revoked_at = datetime.datetime.utcfromtimestamp(second + 0.7)
+
+    async def revoke():
+        async with TestingSessionLocal() as db:
+            db.add(LeaseRevocation(license_key="abc", revoked_at=revoked_at))
+            await db.commit()
+
+    asyncio.run(revoke())
+    # Узел увидел отзыв и тут же запросил новую аренду — в ту же секунду
+    monkeypatch.setattr(lease_service.time, "time", lambda: second + 0.9)
+    with TestClient(app) as client:
+        lease = client.get("/api/license_lease", params={"license_key": "abc"}).json()
+        verified = client.post("/api/verify_lease", json={"lease": lease["lease"]}).json()
+
+    assert verified["valid"] is True
+
+
+def test_lease_revocations_rejects_out_of_range_since(monkeypatch):
+    TestingSessionLocal = setup_test_db()
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+
+    with TestClient(app) as client:
+        responses = [
+            client.get("/api/lease_revocations", params={"since": since})
+            for since in (10**15, -1)
+        ]
+
+    assert [response.status_code for response in responses] == [400, 400]
@@ -0,0 +1,156 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base import Base
+from server.models.license import License
+from server.models.outbox import TelegramOutbox
+from server.models.stats_rollup import StatsRollup
+from server.models.user import User
+from server.services import expiry_service
+from server.services.expiry_service import LicenseSweeper
+from server.services.license_cache import license_status_cache
+
+NOW = datetime.datetime(2026, 10, 18, 12, 0)
+
+
+def setup_test_db(tmp_path, licenses):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sweep.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            for i, (key, active, delta) in enumerate(licenses):
+                user = User(telegram_id=1000 + i)
+                db.add_all(
+                    [
+                        user,
+                        License(
+                            license_key=key,
+                            user=user,
+                            is_active=active,
+                            next_charge_at=NOW + delta,
+                        ),
+                    ]
+                )
+            await db.commit()
+
+    asyncio.run(init_models())
+    license_status_cache.clear()
+    return TestingSessionLocal
+
+
+def outbox(SessionLocal):
+    async def scenario():
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(TelegramOutbox.chat_id, TelegramOutbox.text).order_by(TelegramOutbox.id)
+            )
+            return result.all()
+
+    return asyncio.run(scenario())
+
+
+def test_expire_overdue_in_batches(tmp_path):
+    overdue = [(f"old-{i}", True, -datetime.timedelta(hours=i + 1)) for i in range(7)]
+    SessionLocal = setup_test_db(
+        tmp_path,
+        overdue
+        + [
+            ("fresh", True, datetime.timedelta(days=10)),
+            ("off", False, -datetime.timedelta(days=1)),
+        ],
+    )
+    license_status_cache.set("old-0", {"status": "active", "valid": True})
+    statements = []
+
+    async def scenario():
+        async with SessionLocal() as db:
+            sync_engine = db.bind.sync_engine
+            listener = lambda *args: statements.append(args[2])  # noqa: E731
+            event.listen(sync_engine, "before_cursor_execute", listener)
+            expired = await expiry_service.expire_overdue(db, batch_size=3, now=NOW)
+            again = await expiry_service.expire_overdue(db, batch_size=3, now=NOW)
+            event.remove(sync_engine, "before_cursor_execute", listener)
+            active = (
+                await db.execute(select(License.license_key).where(License.is_active.is_(True)))
+            ).scalars().all()
+            rollup = await db.execute(
+                select(StatsRollup.metric, StatsRollup.value).where(StatsRollup.bucket == "")
+            )
+            counts = dict(rollup.all())
+        return expired, again, active, counts
+
+    expired, again, active, counts = asyncio.run(scenario())
+    assert expired == 7
+    assert again == 0
+    assert active == ["fresh"]
+    # Сводка статистики обновляется триггерами
+    assert counts["licenses_active"] == 1
+    assert counts["licenses_inactive"] == 8
+    # 7 строк по 3 за раз — три отдельных UPDATE
+    assert sum(s.lstrip().startswith("UPDATE licenses") for s in statements) == 3
+    assert license_status_cache.get("old-0") is None
+
+
+def test_reminders_sent_once_per_threshold(tmp_path):
+    SessionLocal = setup_test_db(
+        tmp_path,
+        [
+            ("soon", True, datetime.timedelta(hours=12)),
+            ("two-days", True, datetime.timedelta(days=2)),
+            ("later", True, datetime.timedelta(days=5)),
+            ("inactive", False, datetime.timedelta(days=2)),
+        ],
+    )
+    sweeper = LicenseSweeper(session_factory=SessionLocal, batch_size=1, reminder_days=[3, 1])
+
+    assert asyncio.run(sweeper.sweep(now=NOW)) == {"expired": 0, "reminded": 2}
+    messages = outbox(SessionLocal)
+    assert [chat_id for chat_id, _ in messages] == [1000, 1001]
+    # Текст называет оставшееся время, а не сработавший порог
+    assert "менее чем через сутки" in messages[0][1]
+    assert "через 2 дня" in messages[1][1]
+
+    # Повторный проход ничего не дублирует
+    assert asyncio.run(sweeper.sweep(now=NOW))["reminded"] == 0
+
+    # Через сутки «two-days» попадает в порог 1 день, «soon» уже просрочена
+    result = asyncio.run(sweeper.sweep(now=NOW + datetime.timedelta(days=1, hours=1)))
+    assert result == {"expired": 1, "reminded": 1}
+    assert "менее чем через сутки" in outbox(SessionLocal)[-1][1]
+    assert sweeper.stats()["reminded"] == 3
+
+
+def test_renewal_rearms_reminders(tmp_path):
+    SessionLocal = setup_test_db(tmp_path, [("renewed", True, datetime.timedelta(days=2))])
+    sweeper = LicenseSweeper(session_factory=SessionLocal, reminder_days=[3, 1])
+    assert asyncio.run(sweeper.sweep(now=NOW))["reminded"] == 1
+
+    async def renew():
+        async with SessionLocal() as db:
+            license = (await db.execute(select(License))).scalar_one()
+            license.next_charge_at += datetime.timedelta(days=30)
+            await db.commit()
+
+    asyncio.run(renew())
+    later = NOW + datetime.timedelta(days=30)
+    assert asyncio.run(sweeper.sweep(now=later))["reminded"] == 1
+    assert len(outbox(SessionLocal)) == 2
+
+
+def test_reminder_text_counts_whole_days_left():
+    due = NOW + datetime.timedelta(days=3)
+    assert "через 3 дня" in expiry_service.reminder_text(due, NOW)
+    assert "через 2 дня" in expiry_service.reminder_text(due, NOW + datetime.timedelta(hours=1))
+    assert "через 1 день" in expiry_service.reminder_text(due, NOW + datetime.timedelta(days=2))
+    assert "через 5 дней" in expiry_service.reminder_text(NOW + datetime.timedelta(days=5), NOW)
+    assert "менее чем через сутки" in expiry_service.reminder_text(due, due - datetime.timedelta(hours=5))
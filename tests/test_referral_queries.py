@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.user import User
+from server.services.referral_service import (
+    BONUS_DAYS_PER_REFERRAL,
+    claim_referral_bonuses,
+    get_referrals_and_bonus_days,
+)
+
+
+def setup_test_db(url="sqlite+aiosqlite:///:memory:"):
+    engine = create_async_engine(url, connect_args={"check_same_thread": False})
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    return engine, TestingSessionLocal
+
+
+def seed_referrals(TestingSessionLocal, paid, unpaid, claimed=0):
+    async def seed():
+        async with TestingSessionLocal() as db:
+            referrer = User(telegram_id=1)
+            db.add(referrer)
+            await db.flush()
+            tg_id = 100
+            for is_active, count, bonus_claimed in (
+                (True, paid, False),
+                (False, unpaid, False),
+                (True, claimed, True),
+            ):
+                for _ in range(count):
+                    tg_id += 1
+                    invitee = User(
+                        telegram_id=tg_id,
+                        referred_by_id=referrer.id,
+                        referral_bonus_claimed=bonus_claimed,
+                    )
+                    lic = License(license_key=f"lk{tg_id}", user=invitee, is_active=is_active)
+                    db.add_all([invitee, lic])
+            await db.commit()
+            return referrer
+
+    return asyncio.run(seed())
+
+
+async def count_queries(engine, func, *args, **kwargs):
+    queries = {"count": 0}
+
+    def before_cursor_execute(*args2, **kwargs2):
+        queries["count"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = await func(*args, **kwargs)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return queries["count"], result
+
+
+def test_referral_stats_single_query():
+    engine, TestingSessionLocal = setup_test_db()
+    referrer = seed_referrals(TestingSessionLocal, paid=40, unpaid=25, claimed=3)
+
+    async def stats():
+        async with TestingSessionLocal() as db:
+            return await get_referrals_and_bonus_days(db, referrer)
+
+    query_count, result = asyncio.run(count_queries(engine, stats))
+    assert query_count == 1
+    assert result == (3, 40 * BONUS_DAYS_PER_REFERRAL, 3 * BONUS_DAYS_PER_REFERRAL)
+
+
+def test_claim_referral_bonuses_query_count_is_constant():
+    engine, TestingSessionLocal = setup_test_db()
+    referrer = seed_referrals(TestingSessionLocal, paid=60, unpaid=10)
+
+    async def claim():
+        async with TestingSessionLocal() as db:
+            return await claim_referral_bonuses(db, referrer)
+
+    # UPDATE users, SELECT license, INSERT license
+    query_count, processed = asyncio.run(count_queries(engine, claim))
+    assert query_count == 3
+    assert processed == 60
+
+    query_count, processed = asyncio.run(count_queries(engine, claim))
+    assert query_count == 1
+    assert processed == 0
+
+    async def load():
+        async with TestingSessionLocal() as db:
+            lic = (await db.execute(select(License).filter_by(user_id=referrer.id))).scalars().one()
+            return lic, await get_referrals_and_bonus_days(db, referrer)
+
+    lic, stats = asyncio.run(load())
+    expected = datetime.datetime.utcnow() + datetime.timedelta(days=60 * BONUS_DAYS_PER_REFERRAL)
+    assert abs((lic.valid_until - expected).total_seconds()) < 60
+    assert stats == (60, 0, 60 * BONUS_DAYS_PER_REFERRAL)
+
+
+def test_concurrent_claims_do_not_double_count(tmp_path):
+    engine, TestingSessionLocal = setup_test_db(f"sqlite+aiosqlite:///{tmp_path / 'ref.db'}")
+    referrer = seed_referrals(TestingSessionLocal, paid=5, unpaid=0)
+
+    async def claim():
+        async with TestingSessionLocal() as db:
+            return await claim_referral_bonuses(db, referrer)
+
+    async def run():
+        results = await asyncio.gather(*(claim() for _ in range(4)))
+        async with TestingSessionLocal() as db:
+            lic = (await db.execute(select(License).filter_by(user_id=referrer.id))).scalars().one()
+        await engine.dispose()
+        return results, lic
+
+    results, lic = asyncio.run(run())
+    assert sorted(results) == [0, 0, 0, 5]
+    expected = datetime.datetime.utcnow() + datetime.timedelta(days=5 * BONUS_DAYS_PER_REFERRAL)
+    assert abs((lic.valid_until - expected).total_seconds()) < 60
@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import json
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.outbox import TelegramOutbox
+from server.models.user import User
+import server.api.render_router as render_router
+from telegram_bot import notify
+
+app = FastAPI()
+app.include_router(render_router.router, prefix="/api")
+
+FUTURE = datetime.datetime.utcnow() + datetime.timedelta(days=10)
+
+
+class FakeAggregator:
+    def __init__(self):
+        self.events = []
+
+    def record(self, chat_id, license_key, scene, camera, event):
+        self.events.append((chat_id, license_key, scene, camera, event))
+
+
+def setup_test_db(monkeypatch, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'render.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            seeds = ((101, "lk-a", True), (102, "lk-b", True), (103, "lk-off", False))
+            for tg, key, active in seeds:
+                user = User(telegram_id=tg)
+                license = License(
+                    license_key=key, user=user, is_active=active, next_charge_at=FUTURE
+                )
+                db.add_all([user, license])
+            await db.commit()
+
+    asyncio.run(init_models())
+    monkeypatch.setattr(render_router, "ReadSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+    aggregator = FakeAggregator()
+    monkeypatch.setattr(render_router, "render_sessions", aggregator)
+    return engine, TestingSessionLocal, aggregator
+
+
+def outbox_rows(TestingSessionLocal):
+    async def load():
+        async with TestingSessionLocal() as db:
+            result = await db.execute(select(TelegramOutbox).order_by(TelegramOutbox.id))
+            return [(row.chat_id, row.text) for row in result.scalars().all()]
+
+    return asyncio.run(load())
+
+
+def test_json_array_resolves_keys_once_and_groups_raw_logs(monkeypatch, tmp_path):
+    engine, TestingSessionLocal, aggregator = setup_test_db(monkeypatch, tmp_path)
+    selects = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: selects.append(statement)
+        if statement.lstrip().upper().startswith("SELECT")
+        else None,
+    )
+
+    items = [
+        {"license_key": "lk-a", "log": "Render started\nScene: a.max\nView: Cam"},
+        {"license_key": "lk-a", "log": "frame 1 saved"},
+        {"license_key": "lk-a", "log": "frame 2 saved"},
+        {"license_key": "lk-b", "log": "frame 1 saved"},
+        {"license_key": "lk-off", "log": "ignored"},
+        {"license_key": "missing", "log": "ignored"},
+        {"log": "no key"},
+    ]
+    with TestClient(app) as client:
+        response = client.post("/api/render_notify/batch", json=items)
+
+    assert response.status_code == 200
+    statuses = [(r["index"], r["status"]) for r in response.json()["results"]]
+    assert statuses == [
+        (0, "coalesced"),
+        (1, "queued"),
+        (2, "queued"),
+        (3, "queued"),
+        (4, "inactive"),
+        (5, "not_found"),
+        (6, "invalid"),
+    ]
+    assert len(selects) == 1
+    assert aggregator.events == [(101, "lk-a", "a.max", "Cam", "start")]
+    # По одному сообщению на пользователя
+    assert outbox_rows(TestingSessionLocal) == [
+        (101, "frame 1 saved\n\nframe 2 saved"),
+        (102, "frame 1 saved"),
+    ]
+
+
+def test_ndjson_stream_is_processed_in_chunks(monkeypatch, tmp_path):
+    engine, TestingSessionLocal, aggregator = setup_test_db(monkeypatch, tmp_path)
+    monkeypatch.setattr(render_router, "RENDER_STREAM_CHUNK_SIZE", 2)
+
+    lines = [json.dumps({"license_key": "lk-b", "log": f"frame {i}"}) for i in range(5)]
+    lines.insert(2, "{not json")
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/render_notify/batch",
+            content="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == list(range(6))
+    assert [r["status"] for r in results] == [
+        "queued", "queued", "invalid", "queued", "queued", "queued"
+    ]
+    # Три порции — три сообщения одному пользователю
+    assert [chat for chat, _ in outbox_rows(TestingSessionLocal)] == [102, 102, 102]
+
+
+def test_oversized_json_array_is_rejected(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+    monkeypatch.setattr(render_router, "RENDER_BATCH_MAX_SIZE", 2)
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/render_notify/batch",
+            json=[{"license_key": "lk-a", "log": "x"}] * 3,
+        )
+        not_a_list = client.post("/api/render_notify/batch", json={"license_key": "lk-a"})
+    assert response.status_code == 413
+    assert not_a_list.status_code == 400
+
+
+def test_failed_outbox_write_reports_error(monkeypatch, tmp_path):
+    engine, TestingSessionLocal, aggregator = setup_test_db(monkeypatch, tmp_path)
+
+    async def broken_queue(messages):
+        return 0
+
+    monkeypatch.setattr(render_router, "queue_telegram_messages", broken_queue)
+    items = [
+        {"license_key": "lk-a", "log": "Render started\nScene: a.max\nView: Cam"},
+        {"license_key": "lk-a", "log": "frame 1 saved"},
+        {"license_key": "lk-off", "log": "ignored"},
+    ]
+    with TestClient(app) as client:
+        response = client.post("/api/render_notify/batch", json=items)
+
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["coalesced", "error", "inactive"]
+    assert results[1]["error"]
@@ -0,0 +1,213 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.license import License
+from server.models.render_event import RenderEvent
+from server.models.render_rollup import RenderRollup
+from server.models.user import User
+import server.api.render_router as render_router
+from server.services import render_events
+from server.services.render_events import RenderEventRecorder
+
+DAY = datetime.datetime(2026, 10, 10)
+
+
+def setup_test_db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'events.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    return TestingSessionLocal
+
+
+def add_events(SessionLocal, rows):
+    async def scenario():
+        async with SessionLocal() as db:
+            db.add_all(
+                RenderEvent(license_key=key, scene=scene, camera="cam", event=event, created_at=at)
+                for key, scene, event, at in rows
+            )
+            await db.commit()
+
+    asyncio.run(scenario())
+
+
+def rollup_rows(SessionLocal, period):
+    async def scenario():
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(
+                    RenderRollup.bucket,
+                    RenderRollup.license_key,
+                    RenderRollup.scene,
+                    RenderRollup.started,
+                    RenderRollup.finished,
+                    RenderRollup.render_seconds,
+                )
+                .where(RenderRollup.period == period)
+                .order_by(RenderRollup.bucket, RenderRollup.license_key)
+            )
+            return result.all()
+
+    return asyncio.run(scenario())
+
+
+def run_rollup(SessionLocal):
+    async def scenario():
+        async with SessionLocal() as db:
+            return await render_events.rollup(db)
+
+    return asyncio.run(scenario())
+
+
+def test_recorder_writes_buffer_in_one_batch(tmp_path):
+    SessionLocal = setup_test_db(tmp_path)
+    recorder = RenderEventRecorder(session_factory=SessionLocal)
+
+    async def scenario():
+        for i in range(50):
+            recorder.record("lk-a", "start" if i % 2 else None, f"scene{i}.max")
+        written = await recorder.flush()
+        async with SessionLocal() as db:
+            count = await db.scalar(select(func.count(RenderEvent.id)))
+            logs = await db.scalar(
+                select(func.count(RenderEvent.id)).where(RenderEvent.event == "log")
+            )
+        return written, count, logs
+
+    assert asyncio.run(scenario()) == (50, 50, 25)
+    assert recorder.stats() == {"recorded": 50, "written": 50, "dropped": 0, "buffered": 0}
+
+
+def test_rollup_pairs_durations_and_is_incremental(tmp_path):
+    SessionLocal = setup_test_db(tmp_path)
+    add_events(
+        SessionLocal,
+        [
+            ("lk-a", "room.max", "start", DAY.replace(hour=9, minute=50)),
+            ("lk-a", "room.max", "log", DAY.replace(hour=9, minute=55)),
+            # end через 20 минут в следующем часе — длительность идёт в час end
+            ("lk-a", "room.max", "end", DAY.replace(hour=10, minute=10)),
+            ("lk-b", None, "start", DAY.replace(hour=10, minute=30)),
+        ],
+    )
+    assert run_rollup(SessionLocal) == 3
+
+    hours = rollup_rows(SessionLocal, "hour")
+    assert hours == [
+        ("2026-10-10 09", "lk-a", "room.max", 1, 0, 0.0),
+        ("2026-10-10 10", "lk-a", "room.max", 0, 1, 1200.0),
+        ("2026-10-10 10", "lk-b", "", 1, 0, 0.0),
+    ]
+
+    # Повторный прогон пересчитывает последний час, а не удваивает его
+    add_events(SessionLocal, [("lk-b", None, "end", DAY.replace(hour=11, minute=0))])
+    run_rollup(SessionLocal)
+    run_rollup(SessionLocal)
+    days = rollup_rows(SessionLocal, "day")
+    assert days == [
+        ("2026-10-10", "lk-a", "room.max", 1, 1, 1200.0),
+        ("2026-10-10", "lk-b", "", 1, 1, 1800.0),
+    ]
+
+    async def summaries():
+        async with SessionLocal() as db:
+            user = await render_events.user_summary(db, "lk-a", today=DAY.date())
+            admin = await render_events.admin_summary(db, today=DAY.date())
+        return user, admin
+
+    user, admin = asyncio.run(summaries())
+    assert (user["started"], user["finished"], user["hours"]) == (1, 1, 0.3)
+    assert user["scenes"][0]["scene"] == "room.max"
+    assert admin["daily"] == [
+        {"day": "2026-10-10", "started": 2, "finished": 2, "hours": 0.8, "licenses": 2}
+    ]
+
+
+def test_rollup_counts_events_written_late_into_past_hour(tmp_path):
+    SessionLocal = setup_test_db(tmp_path)
+    add_events(SessionLocal, [("lk-a", "room.max", "start", DAY.replace(hour=10, minute=5))])
+    run_rollup(SessionLocal)
+
+    # Повтор неудачного flush: событие 9:58 попадает в таблицу после сводки за 10 часов
+    add_events(
+        SessionLocal,
+        [
+            ("lk-b", "hall.max", "start", DAY.replace(hour=9, minute=58)),
+            ("lk-a", "room.max", "end", DAY.replace(hour=10, minute=20)),
+        ],
+    )
+    run_rollup(SessionLocal)
+
+    assert rollup_rows(SessionLocal, "hour") == [
+        ("2026-10-10 09", "lk-b", "hall.max", 1, 0, 0.0),
+        ("2026-10-10 10", "lk-a", "room.max", 1, 1, 900.0),
+    ]
+    assert [row[3] for row in rollup_rows(SessionLocal, "day")] == [1, 1]
+
+
+def test_prune_deletes_old_events_in_batches(tmp_path):
+    SessionLocal = setup_test_db(tmp_path)
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=40)
+    fresh = datetime.datetime.utcnow()
+    add_events(
+        SessionLocal,
+        [("lk-a", "s", "log", old)] * 7 + [("lk-a", "s", "log", fresh)] * 2,
+    )
+
+    async def scenario():
+        async with SessionLocal() as db:
+            deleted = await render_events.prune(db, retention_days=30, batch_size=3)
+            left = await db.scalar(select(func.count(RenderEvent.id)))
+        return deleted, left
+
+    assert asyncio.run(scenario()) == (7, 2)
+
+
+def test_render_notify_records_known_licenses(monkeypatch, tmp_path):
+    SessionLocal = setup_test_db(tmp_path)
+
+    async def seed():
+        async with SessionLocal() as db:
+            user = User(telegram_id=101)
+            db.add_all([user, License(license_key="lk-a", user=user, is_active=False)])
+            await db.commit()
+
+    asyncio.run(seed())
+    recorder = RenderEventRecorder(session_factory=SessionLocal)
+    monkeypatch.setattr(render_router, "ReadSessionLocal", SessionLocal)
+    monkeypatch.setattr(render_router, "render_event_recorder", recorder)
+
+    app = FastAPI()
+    app.include_router(render_router.router, prefix="/api")
+    with TestClient(app) as client:
+        client.post(
+            "/api/render_notify",
+            json={"license_key": "lk-a", "log": "end", "event": "end", "scene": "a.max"},
+        )
+        client.post(
+            "/api/render_notify/batch",
+            json=[
+                {"license_key": "lk-a", "log": "start", "event": "start"},
+                {"license_key": "missing", "log": "start", "event": "start"},
+            ],
+        )
+
+    assert [(e["license_key"], e["event"], e["scene"]) for e in recorder._buffer] == [
+        ("lk-a", "end", "a.max"),
+        ("lk-a", "start", None),
+    ]
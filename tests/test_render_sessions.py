@@ -0,0 +1,136 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from telegram.error import NetworkError
+
+from server.services.render_sessions import RenderSessionAggregator, parse_render_log
+from telegram_bot import notify
+from telegram_bot.outbox import NotificationWorker
+
+
+class FakeBot:
+    def __init__(self, send_delay=0.0, edit_error=None):
+        self.sent = []
+        self.edits = []
+        self.sent_at = []
+        self.send_delay = send_delay
+        self.edit_error = edit_error
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.send_delay)
+        self.sent.append((chat_id, text))
+        self.sent_at.append(time.monotonic())
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        if self.edit_error is not None:
+            raise self.edit_error
+        self.edits.append((chat_id, message_id, text))
+
+
+class NoLimit:
+    async def acquire_chat_slot(self, chat_id):
+        pass
+
+
+def test_parse_render_log_reads_maxscript_format():
+    log = (
+        "🎬 Render finished\n⏰ Time: 10:00:00\n📅 Date: 01.01.2026\n"
+        "🗜 Scene: shot_010.max\n📷 View: Camera001"
+    )
+    assert parse_render_log(log) == ("end", "shot_010.max", "Camera001")
+
+
+def test_sequence_render_is_coalesced_into_one_edited_message():
+    bot = FakeBot()
+    aggregator = RenderSessionAggregator(
+        bot=bot, rate_limiter=NoLimit(), edit_interval=0.05, idle_timeout=0.3
+    )
+
+    async def scenario():
+        for _ in range(100):
+            aggregator.record(1, "lk", "shot.max", "Cam", "start")
+            aggregator.record(1, "lk", "shot.max", "Cam", "end")
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+
+    assert len(bot.sent) == 1
+    assert len(bot.edits) < 20
+    assert "Frames done: 100" in bot.edits[-1][2]
+    assert bot.edits[-1][2].startswith("🏁 Render finished")
+    stats = aggregator.stats()
+    assert stats["events"] == 200
+    assert stats["bot_api_calls"] == len(bot.sent) + len(bot.edits)
+    assert stats["active_sessions"] == 0
+
+
+def test_idle_expiry_waits_for_message_being_sent():
+    # Отправка первого сообщения длиннее, чем ожидание простоя
+    bot = FakeBot(send_delay=0.2)
+    aggregator = RenderSessionAggregator(
+        bot=bot, rate_limiter=NoLimit(), edit_interval=0.01, idle_timeout=0.05
+    )
+
+    async def scenario():
+        aggregator.record(1, "lk", "shot.max", "Cam", "start")
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+
+    assert len(bot.sent) == 1
+    assert bot.edits and bot.edits[-1][1] == 1
+    assert bot.edits[-1][2].startswith("🏁 Render finished")
+    assert aggregator.stats()["active_sessions"] == 0
+
+
+def test_live_messages_share_per_chat_limit_with_outbox():
+    bot = FakeBot()
+    worker = NotificationWorker(bot=bot, global_rate=1000, per_chat_interval=0.2)
+    aggregator = RenderSessionAggregator(
+        bot=bot, rate_limiter=worker, edit_interval=0.01, idle_timeout=5
+    )
+
+    async def scenario():
+        aggregator.record(1, "lk", "a.max", "Cam", "start")
+        aggregator.record(1, "lk", "b.max", "Cam", "start")
+        await asyncio.sleep(0.35)
+        for session in aggregator.sessions.values():
+            session.idle_task.cancel()
+
+    asyncio.run(scenario())
+
+    assert len(bot.sent) == 2
+    assert bot.sent_at[1] - bot.sent_at[0] >= 0.19
+    # Очередь outbox тоже подождёт этот чат
+    assert worker._chat_next[1] > bot.sent_at[1]
+
+
+def test_final_update_falls_back_to_outbox(monkeypatch):
+    queued = []
+
+    async def fake_queue(messages):
+        queued.extend(messages)
+        return len(messages)
+
+    monkeypatch.setattr(notify, "queue_telegram_messages", fake_queue)
+    bot = FakeBot(edit_error=NetworkError("connection reset"))
+    aggregator = RenderSessionAggregator(
+        bot=bot, rate_limiter=NoLimit(), edit_interval=0.01, idle_timeout=0.1
+    )
+
+    async def scenario():
+        aggregator.record(1, "lk", "shot.max", "Cam", "end")
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+
+    assert len(bot.sent) == 1
+    assert [chat_id for chat_id, _ in queued] == [1]
+    assert queued[0][1].startswith("🏁 Render finished")
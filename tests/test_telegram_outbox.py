@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from telegram.error import RetryAfter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.models.outbox import TelegramOutbox
+from telegram_bot import notify
+from telegram_bot.outbox import NotificationWorker
+
+
+class FakeBot:
+    def __init__(self, flood_once=False):
+        self.sent = []
+        self.flood_once = flood_once
+
+    async def send_message(self, chat_id, text):
+        if self.flood_once:
+            self.flood_once = False
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+def setup_test_db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    return TestingSessionLocal
+
+
+async def drain(worker, timeout=5.0):
+    await worker.start()
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (await worker.metrics())["depth"]:
+            assert asyncio.get_running_loop().time() < deadline, "outbox was not drained"
+            await asyncio.sleep(0.02)
+    finally:
+        await worker.stop()
+
+
+def test_queued_messages_survive_until_worker_delivers_them(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+
+    async def scenario():
+        for i in range(3):
+            await notify.send_telegram_message(chat_id=1, text=f"a{i}")
+        for i in range(2):
+            await notify.send_telegram_message(chat_id=2, text=f"b{i}")
+
+        bot = FakeBot()
+        worker = NotificationWorker(
+            session_factory=TestingSessionLocal,
+            bot=bot,
+            workers=2,
+            global_rate=1000,
+            per_chat_interval=0.01,
+            poll_interval=0.01,
+        )
+        await drain(worker)
+        return bot, await worker.metrics()
+
+    bot, metrics = asyncio.run(scenario())
+
+    assert [text for chat, text in bot.sent if chat == 1] == ["a0", "a1", "a2"]
+    assert [text for chat, text in bot.sent if chat == 2] == ["b0", "b1"]
+    assert metrics["sent"] == 5
+    assert metrics["depth"] == 0
+    assert metrics["send_latency_ms"]["samples"] == 5
+
+
+def test_retry_after_reschedules_without_losing_message(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+
+    async def scenario():
+        await notify.send_telegram_message(chat_id=7, text="hello")
+        bot = FakeBot(flood_once=True)
+        worker = NotificationWorker(
+            session_factory=TestingSessionLocal,
+            bot=bot,
+            global_rate=1000,
+            per_chat_interval=0.01,
+            poll_interval=0.01,
+        )
+        await drain(worker)
+        async with TestingSessionLocal() as db:
+            row = await db.get(TelegramOutbox, 1)
+        return bot, worker, row
+
+    bot, worker, row = asyncio.run(scenario())
+
+    assert bot.sent == [(7, "hello")]
+    assert worker.retry_after == 1
+    assert row.status == "sent"
+    assert row.attempts == 1
+
+
+def test_rescheduled_message_keeps_its_place_in_chat(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+
+    class FlakyBot(FakeBot):
+        async def send_message(self, chat_id, text):
+            if text == "m1" and not self.flood_once:
+                # Первая попытка m1 падает — строка уходит в backoff с not_before в будущем
+                self.flood_once = True
+                raise ConnectionError("network down")
+            self.sent.append((chat_id, text))
+
+    async def scenario():
+        await notify.send_telegram_message(chat_id=5, text="m1")
+        await notify.send_telegram_message(chat_id=5, text="m2")
+        await notify.send_telegram_message(chat_id=6, text="other")
+        bot = FlakyBot()
+        worker = NotificationWorker(
+            session_factory=TestingSessionLocal,
+            bot=bot,
+            workers=2,
+            global_rate=1000,
+            per_chat_interval=0.01,
+            poll_interval=0.01,
+        )
+        await drain(worker)
+        return bot
+
+    bot = asyncio.run(scenario())
+
+    assert [text for chat, text in bot.sent if chat == 5] == ["m1", "m2"]
+    # Отложенное сообщение не задерживает другие чаты
+    assert bot.sent[0] == (6, "other")
+
+
+def test_message_stuck_in_sending_blocks_chat_until_recovered(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(tmp_path)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+
+    async def scenario():
+        await notify.send_telegram_message(chat_id=5, text="m1")
+        await notify.send_telegram_message(chat_id=5, text="m2")
+        async with TestingSessionLocal() as db:
+            # m1 заявил процесс, который упал сразу после этого
+            row = await db.get(TelegramOutbox, 1)
+            row.status = "sending"
+            row.claimed_at = datetime.datetime.utcnow()
+            row.attempts = 1
+            await db.commit()
+
+        bot = FakeBot()
+        worker = NotificationWorker(
+            session_factory=TestingSessionLocal,
+            bot=bot,
+            global_rate=1000,
+            per_chat_interval=0.01,
+            poll_interval=0.01,
+            stale_seconds=0.3,
+        )
+        await worker.start()
+        await asyncio.sleep(0.15)
+        early = list(bot.sent)
+        await worker.stop()
+        await drain(worker)
+        return early, bot
+
+    early, bot = asyncio.run(scenario())
+
+    # Пока m1 «отправляется», m2 его не обгоняет
+    assert early == []
+    assert bot.sent == [(5, "m1"), (5, "m2")]
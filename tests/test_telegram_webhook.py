@@ -0,0 +1,139 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from telegram.ext import ApplicationBuilder
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from telegram_bot import bot, webhook
+from telegram_bot.harness import RecordingRequest, for_user, replay
+from telegram_bot.media import media_cache
+from telegram_bot.webhook import SECRET_HEADER, TelegramWebhook
+
+UPDATES = json.loads(
+    (Path(__file__).resolve().parents[1] / "benchmarks" / "telegram_updates.json").read_text(
+        encoding="utf-8"
+    )
+)
+
+
+def setup_test_bot(monkeypatch, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    monkeypatch.setattr(bot, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(media_cache, "session_factory", TestingSessionLocal)
+
+    recorder = RecordingRequest()
+    application = bot.build_application(
+        ApplicationBuilder()
+        .token(bot.TOKEN)
+        .request(recorder)
+        .get_updates_request(recorder)
+        .updater(None)
+    )
+    hook = TelegramWebhook(url="", secret="s3cret")
+    monkeypatch.setattr(webhook, "telegram_webhook", hook)
+    app = FastAPI()
+    app.include_router(webhook.router)
+    return app, hook, application, recorder
+
+
+def test_webhook_runs_bot_handlers(monkeypatch, tmp_path):
+    app, hook, application, recorder = setup_test_bot(monkeypatch, tmp_path)
+    updates = [for_user(update, 777, n) for n, update in enumerate(UPDATES)]
+
+    async def scenario():
+        await hook.start(application)
+        try:
+            return await replay(app, recorder, updates, "s3cret")
+        finally:
+            await hook.stop()
+            await write_coalescer.stop()
+
+    timings = asyncio.run(scenario())
+    methods = [name for _, name, _ in recorder.calls]
+    assert len(timings) == len(UPDATES)
+    assert methods[:2] == ["getMe", "sendPhoto"]
+    # Кнопки меню редактируют подпись того же сообщения, новых фото нет
+    assert methods.count("sendPhoto") == 1
+    assert methods.count("editMessageCaption") == 3
+    assert hook.stats()["received"] == len(UPDATES)
+
+
+def test_webhook_rejects_wrong_secret_and_unstarted_bot(monkeypatch, tmp_path):
+    app, hook, application, recorder = setup_test_bot(monkeypatch, tmp_path)
+
+    async def post(secret):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bot.test") as client:
+            return await client.post(
+                "/telegram/webhook", json=UPDATES[0], headers={SECRET_HEADER: secret}
+            )
+
+    async def scenario():
+        before_start = await post("s3cret")
+        await hook.start(application)
+        try:
+            return before_start, await post("wrong"), await post("")
+        finally:
+            await hook.stop()
+
+    before_start, wrong, missing = asyncio.run(scenario())
+    assert before_start.status_code == 404
+    assert wrong.status_code == 403
+    assert missing.status_code == 403
+    assert hook.stats()["rejected"] == 2
+    assert hook.received == 0
+
+
+def test_restart_registers_new_secret_for_same_url(monkeypatch, tmp_path):
+    app, hook, application, recorder = setup_test_bot(monkeypatch, tmp_path)
+    url = "https://license.example.com/telegram/webhook"
+
+    async def scenario():
+        for secret in ("old-secret", "new-secret"):
+            hook.url, hook.secret = url, secret
+            await hook.start(application)
+            await hook.stop()
+
+    asyncio.run(scenario())
+    registered = [params for _, name, params in recorder.calls if name == "setWebhook"]
+    # getWebhookInfo не показывает секрет: после смены секрета вебхук ставится заново
+    assert [params["secret_token"] for params in registered] == ["old-secret", "new-secret"]
+    assert all(params["url"] == url for params in registered)
+
+
+def test_second_process_cannot_start_bot(monkeypatch, tmp_path):
+    app, hook, application, recorder = setup_test_bot(monkeypatch, tmp_path)
+    lock_file = str(tmp_path / "bot.lock")
+    hook = TelegramWebhook(url="", secret="s3cret", lock_file=lock_file)
+    # Второй воркер uvicorn открывает тот же файл блокировки
+    other_worker = TelegramWebhook(url="", secret="s3cret", lock_file=lock_file)
+
+    async def scenario():
+        await hook.start(application)
+        try:
+            with pytest.raises(RuntimeError, match="одним воркером"):
+                await other_worker.start(application)
+        finally:
+            await hook.stop()
+        # После остановки первого бот может запустить другой процесс
+        await other_worker.start(application)
+        await other_worker.stop()
+
+    asyncio.run(scenario())
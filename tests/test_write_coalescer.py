@@ -0,0 +1,134 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import WriteCoalescer
+from server.models.user import User
+from server.services import user_service
+
+
+def setup_test_db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writes.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    commits = []
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+    return TestingSessionLocal, commits
+
+
+async def count_users(TestingSessionLocal):
+    async with TestingSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(User))).scalar_one()
+
+
+def test_concurrent_writes_share_one_commit(tmp_path):
+    TestingSessionLocal, commits = setup_test_db(tmp_path)
+    coalescer = WriteCoalescer(TestingSessionLocal, window=0.01)
+
+    async def scenario():
+        users = await asyncio.gather(
+            *(
+                coalescer.submit(lambda db, tg=tg: user_service.ensure_user(db, tg))
+                for tg in range(1, 51)
+            )
+        )
+        await coalescer.stop()
+        return users, await count_users(TestingSessionLocal)
+
+    users, total = asyncio.run(scenario())
+    assert [user.telegram_id for user in users] == list(range(1, 51))
+    assert all(user.referral_code for user in users)
+    assert total == 50
+    assert len(commits) <= 3
+    assert coalescer.stats()["operations"] == 50
+
+
+def test_failing_operation_does_not_fail_its_batch(tmp_path):
+    TestingSessionLocal, commits = setup_test_db(tmp_path)
+    coalescer = WriteCoalescer(TestingSessionLocal, window=0.01)
+
+    async def broken(db):
+        db.add(User(telegram_id=2))
+        raise ValueError("broken")
+
+    async def duplicate(db):
+        # Конфликтует с пользователем из первой операции того же пакета
+        db.add(User(telegram_id=1))
+
+    async def scenario():
+        results = await asyncio.gather(
+            coalescer.submit(lambda db: user_service.ensure_user(db, 1)),
+            coalescer.submit(broken),
+            coalescer.submit(duplicate),
+            coalescer.submit(lambda db: user_service.ensure_user(db, 3)),
+            return_exceptions=True,
+        )
+        await coalescer.stop()
+        async with TestingSessionLocal() as db:
+            result = await db.execute(select(User.telegram_id).order_by(User.telegram_id))
+            stored = result.scalars().all()
+        return results, stored
+
+    results, stored = asyncio.run(scenario())
+    assert results[0].telegram_id == 1
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], IntegrityError)
+    assert results[3].telegram_id == 3
+    assert stored == [1, 3]
+    assert len(commits) == 1
+    assert coalescer.stats()["replays"] == 2
+
+
+def test_zero_window_commits_each_write(tmp_path):
+    TestingSessionLocal, commits = setup_test_db(tmp_path)
+    coalescer = WriteCoalescer(TestingSessionLocal, window=0)
+
+    async def broken(db):
+        raise ValueError("broken")
+
+    async def scenario():
+        await asyncio.gather(
+            *(
+                coalescer.submit(lambda db, tg=tg: user_service.ensure_user(db, tg))
+                for tg in range(1, 6)
+            )
+        )
+        with pytest.raises(ValueError):
+            await coalescer.submit(broken)
+        return await count_users(TestingSessionLocal)
+
+    assert asyncio.run(scenario()) == 5
+    assert len(commits) == 5
+
+
+def test_stop_commits_batch_the_writer_is_collecting(tmp_path):
+    TestingSessionLocal, commits = setup_test_db(tmp_path)
+    coalescer = WriteCoalescer(TestingSessionLocal, window=0.5)
+
+    async def scenario():
+        pending = asyncio.create_task(
+            coalescer.submit(lambda db: user_service.ensure_user(db, 42))
+        )
+        # Писатель уже забрал операцию и ждёт попутчиков в окне
+        await asyncio.sleep(0.05)
+        await coalescer.stop()
+        user = await asyncio.wait_for(pending, timeout=2)
+        return user, await count_users(TestingSessionLocal)
+
+    user, total = asyncio.run(scenario())
+    assert user.telegram_id == 42
+    assert total == 1
+    assert len(commits) == 1
@@ -0,0 +1,150 @@
+import asyncio
+import datetime
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from server.models.license import License
+from server.models.user import User
+import server.api.license_router as license_router
+import server.api.payment_router as payment_router
+from server.services import yookassa_client
+from server.services.license_cache import license_status_cache
+
+FAKE_DELAY = 0.5
+
+fake_yookassa = FastAPI()
+fake_requests = []
+
+
+@fake_yookassa.post("/v3/payments")
+async def fake_create_payment(request: Request):
+    fake_requests.append(
+        (request.headers.get("Idempotence-Key"), request.headers.get("Authorization"))
+    )
+    await asyncio.sleep(FAKE_DELAY)
+    return {
+        "id": "fake-payment",
+        "status": "pending",
+        "confirmation": {"type": "redirect", "confirmation_url": "https://pay.example/1"},
+    }
+
+
+class FakeYooKassaServer:
+    def __enter__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(
+            fake_yookassa, host="127.0.0.1", port=self.port, log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}/v3"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def setup_test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", connect_args={"check_same_thread": False}
+    )
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with TestingSessionLocal() as db:
+            user = User(telegram_id=123)
+            db.add_all(
+                [
+                    user,
+                    License(
+                        license_key="abc",
+                        user=user,
+                        is_active=True,
+                        next_charge_at=datetime.datetime.utcnow()
+                        + datetime.timedelta(days=30),
+                    ),
+                ]
+            )
+            await db.commit()
+
+    asyncio.run(init_models())
+    license_status_cache.clear()
+    return TestingSessionLocal
+
+
+def test_payment_creation_does_not_block_other_endpoints(monkeypatch):
+    TestingSessionLocal = setup_test_db()
+    monkeypatch.setattr(license_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(license_router, "ReadSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(payment_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(license_status_cache, "ttl", 0)
+    monkeypatch.setenv("YOOKASSA_SHOP_ID", "shop")
+    monkeypatch.setenv("YOOKASSA_SECRET_KEY", "secret")
+    monkeypatch.setattr(yookassa_client, "_client", None)
+
+    app = FastAPI()
+    app.include_router(license_router.router, prefix="/api")
+    app.include_router(payment_router.router)
+
+    async def scenario(base_url):
+        monkeypatch.setattr(yookassa_client, "YOOKASSA_API_URL", base_url)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+
+            async def create_payment(telegram_id):
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/create_payment", json={"telegram_id": telegram_id}
+                )
+                return response, time.perf_counter() - started
+
+            async def check_licenses():
+                await asyncio.sleep(0.05)
+                latencies = []
+                for _ in range(5):
+                    started = time.perf_counter()
+                    response = await client.get(
+                        "/api/check_license", params={"license_key": "abc"}
+                    )
+                    assert response.json()["status"] == "active"
+                    latencies.append(time.perf_counter() - started)
+                return latencies
+
+            payments, latencies = await asyncio.gather(
+                asyncio.gather(*(create_payment(123 + i) for i in range(3))), check_licenses()
+            )
+        await yookassa_client.close_client()
+        return payments, latencies
+
+    with FakeYooKassaServer() as base_url:
+        payments, latencies = asyncio.run(scenario(base_url))
+
+    for response, elapsed in payments:
+        assert response.status_code == 200
+        assert response.json() == {"confirmation_url": "https://pay.example/1"}
+        assert elapsed >= FAKE_DELAY
+    # check_license отвечает, пока платежи ещё «висят» в ЮKassa
+    assert max(latencies) < FAKE_DELAY / 2
+    assert sum(latencies) < FAKE_DELAY
+    assert len({key for key, _ in fake_requests}) == 3
+    assert all(auth.startswith("Basic ") for _, auth in fake_requests)
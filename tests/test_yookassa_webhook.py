@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import sys
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI
+
+from server.db.base_class import Base
+from server.db.write_coalescer import write_coalescer
+from server.models.license import License
+from server.models.outbox import TelegramOutbox
+from server.models.payment import Payment
+from server.models.user import User
+import server.api.payment_router as payment_router
+from server.services import payment_service
+from telegram_bot import notify
+
+app = FastAPI()
+app.include_router(payment_router.router)
+
+
+def setup_test_db(monkeypatch, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'payments.db'}")
+    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def init_models():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_models())
+    monkeypatch.setattr(payment_router, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(write_coalescer, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(payment_service, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(notify, "SessionLocal", TestingSessionLocal)
+    return TestingSessionLocal
+
+
+def succeeded_event(payment_id="pay-1", telegram_id=555):
+    return {
+        "event": "payment.succeeded",
+        "object": {
+            "id": payment_id,
+            "status": "succeeded",
+            "amount": {"value": "49.00", "currency": "RUB"},
+            "metadata": {"telegram_id": telegram_id},
+        },
+    }
+
+
+def test_redelivered_webhook_extends_license_once(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(monkeypatch, tmp_path)
+
+    with TestClient(app) as client:
+        for _ in range(3):
+            response = client.post("/api/yookassa_webhook", json=succeeded_event())
+            assert response.status_code == 200
+
+    async def load():
+        async with TestingSessionLocal() as db:
+            payments = (await db.execute(select(Payment))).scalars().all()
+            license = (
+                await db.execute(select(License).join(User).filter(User.telegram_id == 555))
+            ).scalars().one()
+            outbox = (await db.execute(select(TelegramOutbox))).scalars().all()
+        return payments, license, outbox
+
+    payments, license, outbox = asyncio.run(load())
+
+    assert len(payments) == 1
+    assert payments[0].status == "succeeded"
+    assert payments[0].processed_at is not None
+    assert str(payments[0].amount_value) == "49.00"
+    days = (license.next_charge_at - datetime.datetime.utcnow()).days
+    assert 29 <= days <= 30
+    assert [row.chat_id for row in outbox] == [555]
+
+
+def test_unprocessed_payment_is_applied_by_processor(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(monkeypatch, tmp_path)
+
+    async def scenario():
+        async with TestingSessionLocal() as db:
+            await payment_service.record_webhook_event(db, succeeded_event("pay-2"), 555)
+            await db.commit()
+        first = await payment_service.process_pending_payments()
+        second = await payment_service.process_pending_payments()
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_non_payment_events_are_ignored(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/yookassa_webhook", json={"event": "refund.succeeded", "object": {"id": "r"}}
+        )
+
+    assert response.json() == {"status": "ignored: refund.succeeded"}
+
+
+class FakeYooKassaClient:
+    def __init__(self):
+        self.calls = 0
+        self.keys = []
+
+    async def create_payment(self, params, idempotence_key):
+        self.calls += 1
+        self.keys.append(idempotence_key)
+        await asyncio.sleep(0.05)
+        return {
+            "id": f"created-{self.calls}",
+            "status": "pending",
+            "amount": params["amount"],
+            "description": params["description"],
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"https://pay.example/{self.calls}",
+            },
+        }
+
+
+def test_repeated_clicks_reuse_pending_payment(monkeypatch, tmp_path):
+    TestingSessionLocal = setup_test_db(monkeypatch, tmp_path)
+    fake = FakeYooKassaClient()
+    monkeypatch.setattr(payment_router.yookassa_client, "get_client", lambda: fake)
+
+    async def click_many():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            return await asyncio.gather(
+                *(client.post("/api/create_payment", json={"telegram_id": 777}) for _ in range(3))
+            )
+
+    responses = asyncio.run(click_many())
+    assert [r.json() for r in responses] == [{"confirmation_url": "https://pay.example/1"}] * 3
+    assert fake.calls == 1
+
+    # После оплаты ссылка больше не переиспользуется
+    with TestClient(app) as client:
+        client.post("/api/yookassa_webhook", json=succeeded_event("created-1", 777))
+        response = client.post("/api/create_payment", json={"telegram_id": 777})
+    assert response.json() == {"confirmation_url": "https://pay.example/2"}
+    assert fake.calls == 2
+
+    # Устаревшая ссылка (TTL истёк) тоже не отдаётся повторно
+    monkeypatch.setattr(payment_service, "PAYMENT_LINK_TTL", 0)
+    with TestClient(app) as client:
+        response = client.post("/api/create_payment", json={"telegram_id": 777})
+    assert response.json() == {"confirmation_url": "https://pay.example/3"}
+
+    async def statuses():
+        async with TestingSessionLocal() as db:
+            rows = (await db.execute(select(Payment).order_by(Payment.id))).scalars().all()
+        return [(p.payment_id, p.status, p.confirmation_url) for p in rows]
+
+    assert asyncio.run(statuses()) == [
+        ("created-1", "succeeded", "https://pay.example/1"),
+        ("created-2", "pending", "https://pay.example/2"),
+        ("created-3", "pending", "https://pay.example/3"),
+    ]
+
+
+def test_create_payment_uses_client_idempotence_key(monkeypatch, tmp_path):
+    setup_test_db(monkeypatch, tmp_path)
+    fake = FakeYooKassaClient()
+    monkeypatch.setattr(payment_router.yookassa_client, "get_client", lambda: fake)
+
+    with TestClient(app) as client:
+        bad = client.post("/api/create_payment", json={"telegram_id": 5, "idempotence_key": 7})
+        response = client.post(
+            "/api/create_payment", json={"telegram_id": 5, "idempotence_key": "press-1"}
+        )
+
+    assert bad.status_code == 400
+    assert response.status_code == 200
+    # Повтор бота с тем же ключом ЮKassa распознает как тот же платёж
+    assert fake.keys == ["press-1"]